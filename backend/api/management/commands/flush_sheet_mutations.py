@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.sheet_outbox import flush_pending, outbox_stats, requeue_failed
+
+
+class Command(BaseCommand):
+    help = "Apply queued Google Sheets writes (SheetMutation outbox) in coalesced batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help="Keep running and flush every N seconds (0 = flush once and exit)",
+        )
+        parser.add_argument('--limit', type=int, default=None, help="Mutations claimed per flush")
+        parser.add_argument(
+            '--requeue-failed',
+            action='store_true',
+            help="Put FAILED mutations back in the queue first (check the sheet before doing this)",
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        if options['requeue_failed']:
+            self.stdout.write(f"Requeued {requeue_failed()} failed mutations")
+
+        while True:
+            try:
+                result = flush_pending(options['limit'])
+                if result['busy']:
+                    if not interval:
+                        self.stdout.write("Another process is flushing the outbox, it will apply the queue")
+                elif result['claimed'] or not interval:
+                    self.stdout.write(
+                        f"Flushed {result['claimed']} mutations: {result['applied']} applied, "
+                        f"{result['conflicts']} conflicts, {result['retrying']} retrying, "
+                        f"{result['failed']} failed ({outbox_stats()['counts']})"
+                    )
+            except Exception as e:
+                if not interval:
+                    raise
+                self.stderr.write(f"Sheet outbox flush failed: {e}")
+
+            if not interval:
+                return
+            time.sleep(interval)
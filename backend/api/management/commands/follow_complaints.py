@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.services.complaint_follower import ComplaintFollower
+
+
+class Command(BaseCommand):
+    help = "Keep processing newly CLOSED Tracking complaints (technician stock reduction) on an interval"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=30, help="Seconds between ticks when all is well")
+        parser.add_argument('--batch-size', type=int, default=20, help="Complaints processed per batch")
+        parser.add_argument(
+            '--max-backoff',
+            type=int,
+            default=600,
+            help="Longest wait between ticks after failures or 429s",
+        )
+        parser.add_argument('--bulk', action='store_true', help="Use the grouped bulk mode")
+        parser.add_argument('--once', action='store_true', help="Run a single tick and exit")
+
+    def handle(self, *args, **options):
+        # Complaints from COMPLAINT_PROCESSING_SINCE_DATE on, examined from the intake watermark
+        follower = ComplaintFollower(
+            interval=options['interval'],
+            batch_size=options['batch_size'],
+            max_backoff=options['max_backoff'],
+            bulk=options['bulk'] or getattr(settings, 'COMPLAINT_PROCESSING_BULK', False),
+        )
+
+        try:
+            while True:
+                if follower.acquire_lease():
+                    metrics = follower.tick()
+                    if metrics.get('failure'):
+                        self.stderr.write(f"Tick failed: {metrics['failure']}")
+                    elif metrics['backlog'] or options['once']:
+                        self.stdout.write(
+                            f"Backlog {metrics['backlog']}: {metrics['processed']} processed, "
+                            f"{metrics['errors']} errors in {metrics['tick_seconds']}s"
+                        )
+                else:
+                    self.stderr.write("Another follow_complaints process holds the lease, waiting")
+
+                if options['once']:
+                    return
+                time.sleep(follower.delay)
+        finally:
+            follower.release_lease()
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.processing_jobs import resume_job, run_due_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued complaint processing jobs, and resume jobs whose worker was interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help="Keep running and look for due jobs every N seconds (0 = run what is due and exit)",
+        )
+        parser.add_argument(
+            '--resume',
+            type=int,
+            metavar='JOB_ID',
+            help="Put a FAILED job back in the queue first; it continues from its last checkpoint",
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        if options['resume'] is not None:
+            if resume_job(options['resume']):
+                self.stdout.write(f"Job {options['resume']} requeued")
+            else:
+                self.stderr.write(f"Job {options['resume']} is not a failed job")
+
+        while True:
+            try:
+                count = run_due_jobs()
+                if count or not interval:
+                    self.stdout.write(f"Ran {count} processing jobs")
+            except Exception as e:
+                if not interval:
+                    raise
+                self.stderr.write(f"Processing job run failed: {e}")
+
+            if not interval:
+                return
+            time.sleep(interval)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from api.services.sheets_standin import FaultInjector, build_synthetic_workbook, make_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local stand-in for the Google Sheets API with synthetic Tracking / Mrp List / "
+        "Technician Stocks data. Point the app at it with GOOGLE_SHEETS_STANDIN_URL=http://HOST:PORT"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--tracking-rows', type=int, default=5000, help="Data rows in \"Tracking\"")
+        parser.add_argument('--products', type=int, default=800, help="Products in \"Mrp List\"")
+        parser.add_argument('--technicians', type=int, default=40)
+        parser.add_argument('--seed', type=int, default=1, help="Seed for the synthetic data and fault injection")
+        parser.add_argument('--latency-ms', type=float, default=0, help="Added to every call")
+        parser.add_argument('--jitter-ms', type=float, default=0, help="Random extra latency, 0..N ms")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Share of calls answered with 503 (0-1)")
+        parser.add_argument('--quota-per-minute', type=int, default=0, help="Answer 429 above N calls per minute (0 = no quota)")
+
+    def handle(self, *args, **options):
+        workbook = build_synthetic_workbook(
+            tracking_rows=options['tracking_rows'],
+            products=options['products'],
+            technicians=options['technicians'],
+            seed=options['seed'],
+        )
+        faults = FaultInjector(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            quota_per_minute=options['quota_per_minute'],
+            seed=options['seed'],
+        )
+        server = make_server(workbook, options['host'], options['port'], faults)
+
+        sizes = ", ".join(f"{title}: {len(rows) - 1} rows" for title, rows in workbook.sheets.items())
+        self.stdout.write(f"Sheets stand-in on http://{options['host']}:{options['port']} ({sizes})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.tracking_mirror import sync_tracking_rows
+from api.services.tracking_snapshot import tracking_snapshot
+
+
+class Command(BaseCommand):
+    help = "Mirror the Google Sheets \"Tracking\" worksheet into the TrackingRow table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help="Keep running and re-sync every N seconds (0 = sync once and exit)",
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            try:
+                # max_age=0 -> revision check every cycle; the sheet is only
+                # re-downloaded when it actually changed
+                rows = tracking_snapshot.get_rows(max_age=0)
+                result = sync_tracking_rows(rows, revision=tracking_snapshot.stats()['revision'])
+                self.stdout.write(
+                    f"Synced {result['total']} rows: {result['upserted']} upserted, "
+                    f"{result['deleted']} deleted in {result['duration']}s"
+                )
+            except Exception as e:
+                if not interval:
+                    raise
+                self.stderr.write(f"Tracking sync failed: {e}")
+
+            if not interval:
+                return
+            time.sleep(interval)
@@ -8,8 +8,73 @@ import threading
 from django.utils import timezone
 from django.conf import settings
 
+from .services.read_policy import begin_request, served_state
+from .services.sheets_client import sheets_deadline
+from .services.sheets_quota import quota_scope, set_scope
+
 logger = logging.getLogger('api.middleware')
 
+
+class SheetsStalenessMiddleware:
+    """
+    Tells clients how fresh the Google Sheets data behind a response is:
+    X-Data-Stale: true when a cached copy was served past its freshness
+    window (Sheets slow/down, refresh running in the background), and
+    X-Data-Age: age in seconds of the oldest Sheets data the request used.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        begin_request()
+        response = self.get_response(request)
+
+        stale, age = served_state()
+        response['X-Data-Stale'] = 'true' if stale else 'false'
+        if age is not None:
+            response['X-Data-Age'] = str(int(age))
+        return response
+
+
+class SheetsDeadlineMiddleware:
+    """
+    Gives each request a GOOGLE_SHEETS_REQUEST_DEADLINE second budget for all
+    of its Google Sheets calls, so a slow Sheets API fails the request with
+    SheetsTimeout before the gunicorn worker is killed. Thread-safe (no
+    signals), so it works with threaded workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.seconds = getattr(settings, 'GOOGLE_SHEETS_REQUEST_DEADLINE', 0)
+
+    def __call__(self, request):
+        if not self.seconds:
+            return self.get_response(request)
+        with sheets_deadline(self.seconds):
+            return self.get_response(request)
+
+
+class SheetsQuotaMiddleware:
+    """
+    Attributes the Google Sheets calls a request makes to its view in the
+    quota counters (sheets_quota.stats(), shown by the health endpoint).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with quota_scope(None):
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        set_scope(match.view_name if match else getattr(view_func, '__name__', request.path))
+        return None
+
+
 class MemoryAndPerformanceMiddleware:
     """
     Enhanced middleware to monitor memory usage, request timing, network connectivity,
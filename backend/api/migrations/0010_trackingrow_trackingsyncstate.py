@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-17 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_fix_product_id_issue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('row_count', models.IntegerField(default=0)),
+                ('revision', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Tracking Sync State',
+                'verbose_name_plural': 'Tracking Sync State',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrackingRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sheet_row', models.PositiveIntegerField(unique=True)),
+                ('complaint_no', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('complaint_date', models.DateField(blank=True, null=True)),
+                ('technician', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(blank=True, max_length=50)),
+                ('cc_remarks', models.CharField(blank=True, max_length=100)),
+                ('district', models.CharField(blank=True, max_length=100)),
+                ('product_code', models.CharField(blank=True, max_length=100)),
+                ('mrp', models.CharField(blank=True, max_length=50)),
+                ('values', models.JSONField(default=list)),
+                ('row_hash', models.CharField(max_length=40)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Tracking Row',
+                'verbose_name_plural': 'Tracking Rows',
+                'ordering': ['sheet_row'],
+                'indexes': [models.Index(fields=['technician', 'status'], name='tracking_tech_status_idx'), models.Index(fields=['cc_remarks'], name='tracking_cc_remarks_idx'), models.Index(fields=['complaint_date'], name='tracking_date_idx')],
+            },
+        ),
+    ]
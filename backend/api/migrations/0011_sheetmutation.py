@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-17 23:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_trackingrow_trackingsyncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetMutation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('company_stock', 'Company stock change'), ('technician_stock', 'Technician stock change'), ('tracking_cells', 'Tracking cells')], max_length=20)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('APPLYING', 'Applying'), ('APPLIED', 'Applied'), ('CONFLICT', 'Conflict'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('spare_id', models.CharField(blank=True, max_length=100)),
+                ('technician_name', models.CharField(blank=True, max_length=100)),
+                ('complaint_no', models.CharField(blank=True, max_length=100)),
+                ('quantity', models.IntegerField(default=0)),
+                ('cells', models.JSONField(blank=True, default=dict)),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('applied_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Sheet Mutation',
+                'verbose_name_plural': 'Sheet Mutations',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='sheet_mutation_due_idx')],
+            },
+        ),
+    ]
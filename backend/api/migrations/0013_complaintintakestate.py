@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_processingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintIntakeState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watermark_date', models.DateField(blank=True, null=True)),
+                ('watermark_row', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Complaint Intake State',
+                'verbose_name_plural': 'Complaint Intake State',
+            },
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='full_scan',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='intake_watermark',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_sharedcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SharedLease',
+            fields=[
+                ('key', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('holder', models.CharField(max_length=100)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Shared Lease',
+                'verbose_name_plural': 'Shared Leases',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_sharedlease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sheetmutation',
+            name='write_plan',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_sheetmutation_write_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sheetmutation',
+            name='group',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
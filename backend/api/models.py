@@ -264,4 +264,234 @@ class SalesRequestProduct(models.Model):
         verbose_name_plural = 'Sales Request Products'
     
     def __str__(self):
-        return f"{self.product_name} x {self.quantity}"
\ No newline at end of file
+        return f"{self.product_name} x {self.quantity}"
+
+
+class TrackingRow(models.Model):
+    """
+    Postgres mirror of one row of the "Tracking" Google Sheet.
+    Kept up to date by the sync_tracking management command so list
+    endpoints can run indexed queries instead of scanning the whole sheet.
+    """
+    sheet_row = models.PositiveIntegerField(unique=True)  # 1-based row number in the sheet
+    complaint_no = models.CharField(max_length=100, blank=True, db_index=True)
+    complaint_date = models.DateField(null=True, blank=True)  # parsed from complaint_no (DDMMYY)
+
+    # Normalised (strip + upper) copies of the columns we filter on
+    technician = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=50, blank=True)
+    cc_remarks = models.CharField(max_length=100, blank=True)
+
+    district = models.CharField(max_length=100, blank=True)
+    product_code = models.CharField(max_length=100, blank=True)
+    mrp = models.CharField(max_length=50, blank=True)
+
+    # Full raw row, so views can format responses exactly like the sheet path
+    values = models.JSONField(default=list)
+    row_hash = models.CharField(max_length=40)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['sheet_row']
+        indexes = [
+            models.Index(fields=['technician', 'status'], name='tracking_tech_status_idx'),
+            models.Index(fields=['cc_remarks'], name='tracking_cc_remarks_idx'),
+            models.Index(fields=['complaint_date'], name='tracking_date_idx'),
+        ]
+        verbose_name = 'Tracking Row'
+        verbose_name_plural = 'Tracking Rows'
+
+    def __str__(self):
+        return f"{self.sheet_row}: {self.complaint_no} ({self.status})"
+
+
+class TrackingSyncState(models.Model):
+    """Single-row bookkeeping for the Tracking mirror (last successful sync)"""
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    row_count = models.IntegerField(default=0)
+    revision = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        verbose_name = 'Tracking Sync State'
+        verbose_name_plural = 'Tracking Sync State'
+
+    def __str__(self):
+        return f"Tracking sync: {self.row_count} rows at {self.last_synced_at}"
+
+
+class ComplaintIntakeState(models.Model):
+    """
+    Single-row intake watermark for complaint processing: every CLOSED
+    Tracking complaint dated up to watermark_date, and every row up to
+    watermark_row, had been looked at by the last completed run.
+    """
+    watermark_date = models.DateField(null=True, blank=True)
+    watermark_row = models.PositiveIntegerField(default=0)  # last sheet row examined
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Complaint Intake State'
+        verbose_name_plural = 'Complaint Intake State'
+
+    def __str__(self):
+        return f"Complaint intake: up to {self.watermark_date} / row {self.watermark_row}"
+
+
+class SharedCounter(models.Model):
+    """
+    Named counter shared by every worker (e.g. the version of a cached
+    Sheets value). Bumped with an UPDATE ... SET value = value + 1, so
+    concurrent bumps are never lost. See api.services.read_policy.
+    """
+    key = models.CharField(max_length=200, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Shared Counter'
+        verbose_name_plural = 'Shared Counters'
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+class SharedLease(models.Model):
+    """
+    Named lease held by one worker at a time until it is released or
+    expires_at passes (e.g. "this worker is fetching the company stock").
+    Taken with a conditional UPDATE / unique INSERT, so two workers can
+    never both hold it. See api.services.read_policy.acquire_lease().
+    """
+    key = models.CharField(max_length=200, primary_key=True)
+    holder = models.CharField(max_length=100)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Shared Lease'
+        verbose_name_plural = 'Shared Leases'
+
+    def __str__(self):
+        return f"{self.key} held by {self.holder} until {self.expires_at}"
+
+
+class SheetMutation(models.Model):
+    """
+    Outbox of Google Sheets writes. Views record the change here in the same
+    DB transaction as the business change; api.services.sheet_outbox applies
+    pending rows to the sheets in coalesced batches, with retries.
+    """
+    COMPANY_STOCK = 'company_stock'        # "Mrp List" qty of spare_id changes by quantity
+    TECHNICIAN_STOCK = 'technician_stock'  # "Technician Stocks" qty of (technician_name, spare_id)
+    TRACKING_CELLS = 'tracking_cells'      # cells of complaint_no's "Tracking" row
+
+    KIND_CHOICES = [
+        (COMPANY_STOCK, 'Company stock change'),
+        (TECHNICIAN_STOCK, 'Technician stock change'),
+        (TRACKING_CELLS, 'Tracking cells'),
+    ]
+
+    PENDING = 'PENDING'
+    APPLYING = 'APPLYING'
+    APPLIED = 'APPLIED'
+    CONFLICT = 'CONFLICT'    # the sheet no longer allows it (spare/complaint missing, stock < 0)
+    FAILED = 'FAILED'        # gave up after retries, or interrupted mid-flush
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (APPLYING, 'Applying'),
+        (APPLIED, 'Applied'),
+        (CONFLICT, 'Conflict'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+
+    spare_id = models.CharField(max_length=100, blank=True)
+    technician_name = models.CharField(max_length=100, blank=True)  # sheet name, as in "Technician Stocks" column D
+    complaint_no = models.CharField(max_length=100, blank=True)
+    quantity = models.IntegerField(default=0)                        # signed stock change
+    cells = models.JSONField(default=dict, blank=True)               # 1-based column -> value (Tracking)
+    source = models.CharField(max_length=100, blank=True)            # e.g. "courier:CR-12", "sales_request:5"
+    group = models.CharField(max_length=100, blank=True)             # applied or refused together (a stock transfer)
+    # Stock cell value before/after the flush that sent it, saved before sending:
+    # a retry compares the sheet with it instead of adding `quantity` again
+    write_plan = models.JSONField(null=True, blank=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='sheet_mutation_due_idx'),
+        ]
+        verbose_name = 'Sheet Mutation'
+        verbose_name_plural = 'Sheet Mutations'
+
+    def __str__(self):
+        target = self.complaint_no or f"{self.technician_name or 'company'}/{self.spare_id}"
+        return f"{self.kind} {target} ({self.status})"
+
+
+class ProcessingJob(models.Model):
+    """
+    One complaint processing run (POST /api/complaints/process/). The
+    complaints to process are listed when the job starts; a worker works
+    through them in chunks and records `position` after each, so an
+    interrupted job resumes at the first unfinished chunk.
+    See api.services.processing_jobs.
+    """
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='processing_jobs'
+    )
+
+    # Parameters of process_complaints()
+    since_date = models.DateField(null=True, blank=True)
+    technician_filter = models.CharField(max_length=100, blank=True)
+    bulk = models.BooleanField(default=False)
+    full_scan = models.BooleanField(default=False)  # ignore the intake watermark
+
+    # Checkpoint: the planned complaints and how many of them are done
+    complaints = models.JSONField(default=list, blank=True)
+    total_count = models.PositiveIntegerField(null=True, blank=True)  # None until planned
+    position = models.PositiveIntegerField(default=0)
+    intake_watermark = models.JSONField(null=True, blank=True)  # saved to ComplaintIntakeState on completion
+
+    processed_count = models.PositiveIntegerField(default=0)
+    stock_reduced_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    last_error = models.TextField(blank=True)  # why the job failed or last stopped
+
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'heartbeat_at'], name='processing_job_due_idx'),
+        ]
+        verbose_name = 'Processing Job'
+        verbose_name_plural = 'Processing Jobs'
+
+    def __str__(self):
+        return f"Processing job {self.id} ({self.status}, {self.position}/{self.total_count or '?'})"
@@ -0,0 +1,146 @@
+# E:\study\techfix\backend\api\services\complaint_follower.py
+"""
+Continuous complaint processing (`manage.py follow_complaints`).
+
+Instead of an admin pressing "process" with a since date, the follower
+looks at the Tracking sheet every few seconds and sends newly CLOSED
+complaints through ComplaintProcessor in small batches. Each tick only
+examines the rows after the intake watermark, so a quiet tick costs one
+revalidation of the Tracking snapshot.
+
+Backing off:
+- Between batches the follower waits while this process's Sheets quota
+  bucket is nearly empty. The stock writes queued by each batch are
+  flushed by the outbox in this process, and need that quota.
+- After a tick that hit a 429 or failed, the next tick waits twice as
+  long, up to --max-backoff.
+
+Lag metrics (backlog, age of the oldest unprocessed complaint, snapshot
+and outbox age, tick timings) are kept in the shared cache for the
+health and processing-status endpoints.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .read_policy import acquire_lease, new_lease_holder, release_lease
+from .sheet_outbox import outbox_stats
+from .sheet_records import parse_complaint_date
+from .sheets_quota import sheets_quota
+from .tracking_snapshot import tracking_snapshot
+
+logger = logging.getLogger(__name__)
+
+_STATUS_KEY = "complaint_follower:status"
+_LEASE_KEY = "complaint_follower:lease"
+
+# Below this share of the quota burst, wait before the next batch
+_MIN_HEADROOM = 0.2
+
+
+def follower_status():
+    """Last published metrics of the running follower, or None"""
+    return caches['shared'].get(_STATUS_KEY)
+
+
+class ComplaintFollower:
+
+    def __init__(self, interval=30, batch_size=20, max_backoff=600, bulk=False):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.bulk = bulk
+        self.failures = 0
+        self.delay = interval
+        self._lease_holder = new_lease_holder()
+
+    # -----------------------
+    # LEASE
+    # -----------------------
+
+    def acquire_lease(self):
+        """
+        One follower at a time - stock reductions are not idempotent. A
+        SharedLease row, renewed before every batch; it lapses if its holder
+        stops renewing it.
+        """
+        return acquire_lease(_LEASE_KEY, self._lease_holder, self.max_backoff + 120)
+
+    def release_lease(self):
+        release_lease(_LEASE_KEY, self._lease_holder)
+
+    # -----------------------
+    # TICKS
+    # -----------------------
+
+    def tick(self):
+        """Process what is new; returns the metrics and sets self.delay for the next tick"""
+        from .complaint_processor import ComplaintProcessor
+
+        start_time = time.time()
+        rate_limited_before = sheets_quota.rate_limited_total()
+        processor = ComplaintProcessor()
+        metrics = {'started_at': timezone.now().isoformat(), 'backlog': None, 'processed': 0, 'errors': 0}
+
+        try:
+            planned = processor.plan_complaints()
+            if processor.errors:
+                raise RuntimeError(processor.errors[-1])
+            metrics['backlog'] = len(planned)
+            metrics['oldest_pending_days'] = _oldest_age_days(planned)
+
+            for start in range(0, len(planned), self.batch_size):
+                if start:
+                    self._wait_for_quota()
+                if not self.acquire_lease():
+                    raise RuntimeError("Lost the follower lease to another process")
+                processor.process_batch(planned[start:start + self.batch_size], self.bulk)
+            processor.save_intake_watermark(planned)
+
+            metrics['processed'] = processor.processed_count
+            metrics['errors'] = len(processor.errors)
+            metrics['stock_reductions'] = len(processor.stock_reductions)
+            self.failures = 0
+        except Exception as e:
+            self.failures += 1
+            metrics['failure'] = str(e)
+            logger.warning(f"Complaint follower tick failed ({self.failures} in a row): {e}")
+
+        rate_limited = sheets_quota.rate_limited_total() - rate_limited_before
+        if self.failures or rate_limited:
+            self.delay = min(self.delay * 2, self.max_backoff)
+        else:
+            self.delay = self.interval
+
+        metrics.update({
+            'tick_seconds': round(time.time() - start_time, 2),
+            'rate_limited': rate_limited,
+            'consecutive_failures': self.failures,
+            'next_tick_in': self.delay,
+            'snapshot_age_seconds': tracking_snapshot.stats()['age_seconds'],
+            'outbox_oldest_pending_age': outbox_stats()['oldest_pending_age'],
+            'quota_headroom': round(sheets_quota.headroom(), 2),
+        })
+        caches['shared'].set(_STATUS_KEY, metrics, self.max_backoff + 300)
+        logger.info(
+            f"[TIMING] Complaint follower tick: backlog {metrics['backlog']}, {metrics['processed']} processed, "
+            f"{metrics['errors']} errors, next in {self.delay}s - Duration: {metrics['tick_seconds']:.2f}s"
+        )
+        return metrics
+
+    def _wait_for_quota(self):
+        waited = 0.0
+        while sheets_quota.headroom() < _MIN_HEADROOM and waited < self.max_backoff:
+            time.sleep(1.0)
+            waited += 1.0
+        if waited:
+            logger.info(f"Complaint follower waited {waited:.0f}s for Sheets quota between batches")
+
+
+def _oldest_age_days(complaints):
+    dates = [parse_complaint_date(c['complaint_no']) for c in complaints]
+    dates = [d.date() for d in dates if d]
+    return (timezone.localdate() - min(dates)).days if dates else None
@@ -1,14 +1,28 @@
 # E:\study\techfix\backend\api\services\complaint_processor.py
 import logging
-from datetime import datetime, timedelta
+import math
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction, models
-from ..models import ProcessedComplaint
-from ..views import get_google_sheets_client
+from ..models import ComplaintIntakeState, ProcessedComplaint
+from .sheet_outbox import record_technician_stock_change
+from .sheet_records import parse_complaint_date
+from .tracking_snapshot import tracking_snapshot
 from courier_api.sheets_sync import SheetsSync
+from courier_api.technician_names import technician_names
 
 logger = logging.getLogger(__name__)
 
+
+def default_since_date():
+    """COMPLAINT_PROCESSING_SINCE_DATE as a date (None when unset)"""
+    since_date = getattr(settings, 'COMPLAINT_PROCESSING_SINCE_DATE', None)
+    return datetime.strptime(since_date, '%Y-%m-%d').date() if since_date else None
+
+
 class ComplaintProcessor:
     """Service to process pending complaints and reduce technician stock"""
     
@@ -17,57 +31,59 @@ class ComplaintProcessor:
         self.processed_count = 0
         self.errors = []
         self.stock_reductions = []
+        self.intake_watermark = None
+        self.timings = {}  # stage -> seconds, see _stage()
     
     def extract_date_from_complaint_no(self, complaint_no):
         """Extract date from complaint number format: PCOTH/DDMMYY/NN"""
-        try:
-            # Skip empty complaint numbers
-            if not complaint_no or not complaint_no.strip():
-                return None
-                
-            complaint_no = complaint_no.strip()
-            parts = complaint_no.split("/")
-            
-            # Only process if it has the expected format with at least 3 parts
-            if len(parts) >= 3:
-                date_str = parts[1]  # DDMMYY format
-                return datetime.strptime(date_str, "%d%m%y")
-            else:
-                # Skip invalid formats silently - don't log errors
-                return None
-                
-        except Exception:
-            # Skip any date parsing issues silently - don't log errors
-            return None
+        # Memoised and shared with the Tracking snapshot; None for empty/invalid numbers
+        return parse_complaint_date(complaint_no)
     
-    def get_new_pending_complaints(self, since_date=None):
-        """Get new pending complaints from Tracking sheet"""
+    def get_new_pending_complaints(self, since_date=None, full_scan=False):
+        """
+        Get new pending complaints from Tracking sheet.
+
+        Without since_date, complaints dated before
+        COMPLAINT_PROCESSING_SINCE_DATE are ignored and only part of the
+        sheet is examined (see ComplaintIntakeState): CLOSED rows dated from
+        COMPLAINT_INTAKE_LOOKBACK_DAYS before the watermark date (complaints
+        closed late), plus rows added after the watermark row.
+        Already-processed complaints are looked up for those rows only.
+        An explicit since_date is honoured as written: every CLOSED row
+        dated from it is examined. full_scan=True examines every CLOSED row.
+        """
         try:
-            logger.info(f"Fetching complaints from Google Sheets since {since_date}")
-            client = get_google_sheets_client()
-            sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
-            rows = sheet.get_all_values()
+            logger.info(f"Fetching complaints from Google Sheets since {since_date or 'the intake watermark'}")
+            # Revalidate the shared snapshot so a processing run never works
+            # from a copy older than the sheet's last edit. Technician Stocks
+            # is read in the same API call as Tracking.
+            with self._stage('fetch'):
+                index, extras = tracking_snapshot.get_index_with(
+                    [SheetsSync.TECHNICIAN_STOCK_PROJECTION], max_age=0
+                )
+                self.sheets_sync.seed_tech_stock_rows(extras[SheetsSync.TECHNICIAN_STOCK_WORKSHEET])
             
-            # Get already processed complaints
-            processed_complaints = set(
-                ProcessedComplaint.objects.values_list('complaint_no', flat=True)
-            )
+            with self._stage('parse'):
+                records = self._intake_candidates(index, since_date, full_scan)
+            since_date = since_date or default_since_date()
+            
+            # Get already processed complaints (of the candidates only)
+            with self._stage('match'):
+                processed_complaints = self._already_processed([r.complaint_no.strip() for r in records])
             logger.info(f"Found {len(processed_complaints)} already processed complaints")
             
+            parse_started = time.perf_counter()
             new_complaints = []
             skipped_count = 0
             
-            for row in rows[1:]:  # Skip header
-                if len(row) < 16:  # Need column P (index 15)
-                    continue
-                
-                complaint_no = row[1].strip()
-                technician_name = row[14].strip()
-                status = row[11].strip().upper()
-                product_code = row[7].strip()
-                part_name = row[9].strip()
-                quantity_str = row[10].strip()
-                column_p_date = row[15].strip() if len(row) > 15 else ""  # Column P
+            for record in records:  # Header already stripped by the snapshot
+                complaint_no = record.complaint_no.strip()
+                technician_name = record.technician.strip()
+                status = record.status_key
+                product_code = record.product_code.strip()
+                part_name = record.part_name.strip()
+                quantity_str = record.quantity.strip()
+                column_p_date = record.district.strip()  # Column P
                 
                 # Skip if already processed
                 if complaint_no in processed_complaints:
@@ -94,7 +110,7 @@ class ComplaintProcessor:
                     try:
                         # Parse date from column P (format: "23-Jul-2025")
                         column_p_parsed = datetime.strptime(column_p_date, "%d-%b-%Y")
-                        if column_p_parsed.date() < since_date:
+                        if since_date and column_p_parsed.date() < since_date:
                             skip_stock_reduction = True
                             logger.info(f"Skipping stock reduction for {complaint_no} - column P date {column_p_date} is before start date {since_date}")
                         else:
@@ -119,11 +135,12 @@ class ComplaintProcessor:
                     'part_name': part_name,
                     'quantity': quantity,
                     'complaint_date': complaint_date,
-                    'row_data': row,
+                    'row_data': record,
                     'skip_stock_reduction': skip_stock_reduction,
                     'column_p_date': column_p_date
                 })
             
+            self._add_timing('parse', time.perf_counter() - parse_started)
             logger.info(f"Found {len(new_complaints)} new pending complaints. Skipped {skipped_count} already processed.")
             return new_complaints
             
@@ -132,27 +149,96 @@ class ComplaintProcessor:
             self.errors.append(f"Failed to fetch complaints: {str(e)}")
             return []
     
+    def _intake_candidates(self, index, since_date, full_scan):
+        """CLOSED records to examine, in sheet order; also proposes the next intake watermark"""
+        records = index.records
+        closed = index.by_status.get('CLOSED', [])
+        state = None if full_scan else ComplaintIntakeState.objects.filter(pk=1).first()
+
+        floor = default_since_date()
+        incremental_start = floor
+        if state and state.watermark_date:
+            lookback = timedelta(days=getattr(settings, 'COMPLAINT_INTAKE_LOOKBACK_DAYS', 30))
+            incremental_start = max(filter(None, [floor, state.watermark_date - lookback]))
+
+        # An explicit date is examined in full; rows before it cannot be
+        # planned, so the rows added after the watermark add nothing
+        window_start = since_date or incremental_start
+        if window_start:
+            positions = set(index.positions_in_date_range(date_from=window_start))
+            if since_date is None and state and state.watermark_row <= len(records) + 1:
+                # Rows added since the last run, whatever their date (pos = sheet row - 2)
+                positions.update(range(max(state.watermark_row - 1, 0), len(records)))
+            elif since_date is None and state:
+                logger.warning(
+                    f"Tracking has {len(records)} rows, fewer than the intake watermark row "
+                    f"{state.watermark_row} - examining the date window only"
+                )
+            closed = sorted(pos for pos in positions if records[pos].status_key == 'CLOSED')
+
+        candidates = [records[pos] for pos in closed]
+        logger.info(
+            f"Complaint intake: {len(candidates)} of {len(records)} Tracking rows examined "
+            f"(window from {window_start or 'the start'})"
+        )
+
+        dates = [r.complaint_date for r in candidates if r.complaint_date]
+        latest = min(max(dates), timezone.localdate()) if dates else None
+        if state and state.watermark_date and (latest is None or latest < state.watermark_date):
+            latest = state.watermark_date
+        self.intake_watermark = {'date': latest.isoformat() if latest else None, 'row': len(records) + 1}
+        if since_date and (floor is None or since_date > floor):
+            # Rows between the default floor and since_date were not looked at
+            self.intake_watermark = None
+        return candidates
+
+    def _already_processed(self, complaint_nos):
+        processed = set()
+        for start in range(0, len(complaint_nos), 1000):
+            processed.update(
+                ProcessedComplaint.objects.filter(complaint_no__in=complaint_nos[start:start + 1000])
+                .values_list('complaint_no', flat=True)
+            )
+        return processed
+
+    def save_intake_watermark(self, planned, watermark=None):
+        """
+        Record what a completed, unfiltered run examined. The date stays
+        at or before any `planned` complaint that is still not recorded (it
+        failed), so the next run looks at it again.
+        """
+        watermark = watermark or self.intake_watermark
+        if not watermark:
+            return
+        watermark_date = date.fromisoformat(watermark['date']) if watermark['date'] else None
+
+        done = self._already_processed([c['complaint_no'] for c in planned])
+        for complaint in planned:
+            complaint_date = parse_complaint_date(complaint['complaint_no'])
+            if complaint['complaint_no'] not in done and complaint_date:
+                watermark_date = min(filter(None, [watermark_date, complaint_date.date()]))
+
+        ComplaintIntakeState.objects.update_or_create(
+            pk=1, defaults={'watermark_date': watermark_date, 'watermark_row': watermark['row']}
+        )
+        logger.info(f"Complaint intake watermark saved: {watermark_date} / row {watermark['row']}")
+    
+    @contextmanager
+    def _stage(self, name):
+        """Add the time spent in the block to self.timings[name]"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_timing(name, time.perf_counter() - started)
+
+    def _add_timing(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+    
     def get_technician_sheet_name(self, technician_name):
-        """Get technician's sheet name from TechnicianStock model"""
+        """Get technician's sheet name from TechnicianStock model (cached mapping, see technician_names)"""
         try:
-            from courier_api.models import TechnicianStock
-            from django.contrib.auth.models import User
-            from django.db.models import Q
-            
-            # Try to find user by username or first_name
-            user = User.objects.filter(
-                Q(username__iexact=technician_name) |
-                Q(first_name__iexact=technician_name)
-            ).first()
-            
-            if user:
-                tech_stock = TechnicianStock.objects.filter(technician=user).first()
-                if tech_stock and tech_stock.sheet_technician_name:
-                    return tech_stock.sheet_technician_name
-            
-            # Fallback: return lowercase version
-            return technician_name.lower().replace(' ', '')
-            
+            return technician_names().resolve(technician_name)
         except Exception as e:
             logger.error(f"Error getting technician sheet name for {technician_name}: {e}")
             return technician_name.lower().replace(' ', '')
@@ -163,8 +249,8 @@ class ComplaintProcessor:
             tech_stock = self.sheets_sync.get_technician_stock(technician_sheet_name)
             
             for item in tech_stock:
-                if item['spare_id'].strip() == product_code.strip():
-                    available_qty = item['qty']
+                if item.spare_id == product_code.strip():
+                    available_qty = item.qty
                     if available_qty >= required_qty:
                         return True, available_qty
                     else:
@@ -177,13 +263,14 @@ class ComplaintProcessor:
             return False, 0
     
     def reduce_technician_stock(self, technician_sheet_name, product_code, quantity):
-        """Reduce stock from technician's sheet"""
+        """Reduce stock from technician's sheet (queued in the outbox, written after the commit)"""
         try:
             # Use negative quantity to reduce stock
-            self.sheets_sync.update_technician_stock(
+            record_technician_stock_change(
                 technician_sheet_name, 
                 product_code, 
-                -quantity
+                -quantity,
+                source="complaint_processor",
             )
             return True
         except Exception as e:
@@ -302,8 +389,181 @@ class ComplaintProcessor:
             logger.exception(f"Error processing complaint {complaint['complaint_no']}: {e}")
             return False
     
-    def process_complaints(self, since_date=None, technician_filter=None):
-        """Main method to process all pending complaints"""
+    # -----------------------
+    # BULK MODE
+    # -----------------------
+
+    def plan_reductions(self, complaints):
+        """
+        Work out, without writing anything, what processing `complaints`
+        does: they are grouped by (technician sheet, product) and stock is
+        checked once per technician against the snapshot already loaded with
+        the complaints, allocating to complaints in order (as the one-by-one
+        run would). Returns a dict with the unsaved ProcessedComplaint
+        `records`, `reductions` {(technician sheet, product): total qty},
+        `stock_reductions`, `insufficient` and `skipped` lists, and the
+        number of `groups` and `technicians`.
+        """
+        with self._stage('match'):
+            sheet_names = {name: self.get_technician_sheet_name(name) for name in {c['technician_name'] for c in complaints}}
+
+        with self._stage('plan'):
+            groups = {}
+            for complaint in complaints:
+                tech_sheet_name = sheet_names[complaint['technician_name']]
+                groups.setdefault((tech_sheet_name, complaint['product_code'].strip()), []).append(complaint)
+
+            available_by_tech = {}
+            records, reductions, stock_reductions, insufficient, skipped = [], {}, [], [], []
+            for (tech_sheet_name, product_code), group in groups.items():
+                if tech_sheet_name not in available_by_tech:
+                    available_by_tech[tech_sheet_name] = {
+                        item.spare_id: item.qty for item in self.sheets_sync.get_technician_stock(tech_sheet_name)
+                    }
+                available = available_by_tech[tech_sheet_name]
+
+                for complaint in group:
+                    complaint_no = complaint['complaint_no']
+                    quantity = complaint['quantity']
+                    record = ProcessedComplaint(
+                        complaint_no=complaint_no,
+                        technician_name=complaint['technician_name'],
+                        product_code=complaint['product_code'],
+                        part_name=complaint['part_name'],
+                        quantity_reduced=0,
+                        stock_reduced=False,
+                    )
+                    records.append(record)
+
+                    if complaint.get('skip_stock_reduction'):
+                        record.processing_notes = (
+                            f"Stock reduction skipped - column P date {complaint.get('column_p_date', '')} is before start date"
+                        )
+                        skipped.append({'complaint_no': complaint_no, 'column_p_date': complaint.get('column_p_date', '')})
+                        continue
+
+                    available_qty = available.get(product_code, 0)
+                    if available_qty < quantity:
+                        record.processing_notes = (
+                            f"Insufficient stock for {product_code}. Available: {available_qty}, Required: {quantity}"
+                        )
+                        insufficient.append({
+                            'complaint_no': complaint_no,
+                            'technician': complaint['technician_name'],
+                            'product_code': product_code,
+                            'available': available_qty,
+                            'required': quantity,
+                        })
+                        continue
+
+                    available[product_code] = available_qty - quantity
+                    reductions[(tech_sheet_name, product_code)] = reductions.get((tech_sheet_name, product_code), 0) + quantity
+                    record.quantity_reduced = quantity
+                    record.stock_reduced = True
+                    record.processing_notes = f"Stock reduced successfully by {quantity}"
+                    stock_reductions.append({
+                        'complaint_no': complaint_no,
+                        'technician': complaint['technician_name'],
+                        'product_code': product_code,
+                        'quantity_reduced': quantity
+                    })
+
+        return {
+            'records': records,
+            'reductions': reductions,
+            'stock_reductions': stock_reductions,
+            'insufficient': insufficient,
+            'skipped': skipped,
+            'groups': len(groups),
+            'technicians': len(available_by_tech),
+        }
+
+    def process_complaints_bulk(self, complaints):
+        """
+        Same outcome as process_single_complaint() for each complaint, as one
+        planned operation (see plan_reductions()): each (technician, product)
+        group's total reduction is one queued stock change, so the outbox
+        applies them all in one batched write, and the ProcessedComplaint
+        rows are written with one bulk_create in the same transaction.
+        """
+        start_time = time.time()
+
+        plan = self.plan_reductions(complaints)
+        records, reductions = plan['records'], plan['reductions']
+        for item in plan['insufficient']:
+            error_msg = (
+                f"Insufficient stock for {item['product_code']}. Available: {item['available']}, Required: {item['required']}"
+            )
+            logger.warning(f"{item['complaint_no']}: {error_msg}")
+            self.errors.append(f"{item['complaint_no']}: {error_msg}")
+
+        try:
+            with transaction.atomic():
+                # Another run may have recorded some of these since they were listed
+                done = set(
+                    ProcessedComplaint.objects.filter(complaint_no__in=[r.complaint_no for r in records])
+                    .values_list('complaint_no', flat=True)
+                )
+                if done:
+                    raise RuntimeError(f"{len(done)} complaints were processed by another run meanwhile, e.g. {min(done)}")
+
+                for (tech_sheet_name, product_code), quantity in reductions.items():
+                    record_technician_stock_change(
+                        tech_sheet_name, product_code, -quantity, source="complaint_processor:bulk"
+                    )
+                ProcessedComplaint.objects.bulk_create(records, batch_size=500)
+        except Exception as e:
+            logger.exception(f"Bulk complaint processing failed, nothing recorded: {e}")
+            self.errors.append(f"Bulk processing failed, nothing recorded: {str(e)}")
+            return False
+
+        self.processed_count += len(records)
+        self.stock_reductions.extend(plan['stock_reductions'])
+        logger.info(
+            f"[TIMING] Bulk processing: {len(records)} complaints in {plan['groups']} groups, "
+            f"{len(reductions)} stock changes - Duration: {time.time() - start_time:.2f}s"
+        )
+        return True
+
+    def plan_complaints(self, since_date=None, technician_filter=None, full_scan=False):
+        """
+        Pending complaints to process, optionally for one technician only.
+        Leaves the next intake watermark in self.intake_watermark (None for
+        a filtered run, which did not look at every technician).
+        """
+        new_complaints = self.get_new_pending_complaints(since_date, full_scan)
+        if technician_filter or self.errors:
+            self.intake_watermark = None
+
+        # Filter by technician if specified
+        if new_complaints and technician_filter:
+            original_count = len(new_complaints)
+            new_complaints = [
+                c for c in new_complaints 
+                if c['technician_name'].lower() == technician_filter.lower()
+            ]
+            logger.info(f"Filtered by technician '{technician_filter}': {original_count} -> {len(new_complaints)} complaints")
+        return new_complaints
+
+    def process_batch(self, complaints, bulk=False):
+        """Process planned complaints; returns False if a bulk batch recorded nothing"""
+        if bulk:
+            return self.process_complaints_bulk(complaints)
+
+        # Process each complaint
+        for i, complaint in enumerate(complaints, 1):
+            logger.info(f"Processing complaint {i}/{len(complaints)}: {complaint['complaint_no']}")
+            self.process_single_complaint(complaint)
+        return True
+
+    def process_complaints(self, since_date=None, technician_filter=None, bulk=False, full_scan=False, dry_run=False):
+        """
+        Main method to process all pending complaints (bulk=True: see
+        process_complaints_bulk; dry_run=True: see dry_run())
+        """
+        if dry_run:
+            return self.dry_run(since_date, technician_filter, bulk, full_scan)
+
         logger.info(f"Starting complaint processing since {since_date}")
         
         # Reset counters
@@ -313,27 +573,17 @@ class ComplaintProcessor:
         
         try:
             # Get new pending complaints
-            new_complaints = self.get_new_pending_complaints(since_date)
+            new_complaints = self.plan_complaints(since_date, technician_filter, full_scan)
             
             if not new_complaints:
                 logger.info(f"No new pending complaints found since {since_date}")
+                self.save_intake_watermark([])
                 return self._get_result()
             
-            # Filter by technician if specified
-            if technician_filter:
-                original_count = len(new_complaints)
-                new_complaints = [
-                    c for c in new_complaints 
-                    if c['technician_name'].lower() == technician_filter.lower()
-                ]
-                logger.info(f"Filtered by technician '{technician_filter}': {original_count} -> {len(new_complaints)} complaints")
-            
             logger.info(f"Found {len(new_complaints)} pending complaints to process since {since_date}")
             
-            # Process each complaint
-            for i, complaint in enumerate(new_complaints, 1):
-                logger.info(f"Processing complaint {i}/{len(new_complaints)}: {complaint['complaint_no']}")
-                self.process_single_complaint(complaint)
+            self.process_batch(new_complaints, bulk)
+            self.save_intake_watermark(new_complaints)
             
             logger.info(f"Processing complete. Processed: {self.processed_count}, Errors: {len(self.errors)}")
             return self._get_result()
@@ -343,6 +593,119 @@ class ComplaintProcessor:
             self.errors.append(f"Critical processing error: {str(e)}")
             return self._get_result()
     
+    # -----------------------
+    # DRY RUN
+    # -----------------------
+
+    def dry_run(self, since_date=None, technician_filter=None, bulk=False, full_scan=False):
+        """
+        What process_complaints() would do, computed against one Tracking
+        snapshot without recording anything: the stock reductions per
+        technician and product, the insufficient-stock failures and the
+        column-P skips. Also reports the Sheets and DB calls the real run
+        would make (reads as measured here, writes from the plan), the
+        queries this dry run made, and per-stage timings (fetch, parse,
+        match, plan).
+        """
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from .sheets_quota import count_calls
+
+        self.processed_count = 0
+        self.errors = []
+        self.stock_reductions = []
+        self.timings = {}
+
+        start_time = time.perf_counter()
+        # Only this thread's calls: other requests and the outbox use the same quota
+        with count_calls() as sheets_calls, CaptureQueriesContext(connection) as queries:
+            complaints = self.plan_complaints(since_date, technician_filter, full_scan)
+            plan = self.plan_reductions(complaints) if complaints and not self.errors else None
+
+        if plan is None:
+            plan = {'records': [], 'reductions': {}, 'stock_reductions': [], 'insufficient': [],
+                    'skipped': [], 'groups': 0, 'technicians': 0}
+        timings = {stage: round(self.timings.get(stage, 0.0), 3) for stage in ('fetch', 'parse', 'match', 'plan')}
+        timings['total'] = round(time.perf_counter() - start_time, 3)
+        logger.info(f"[TIMING] Complaint processing dry run: {len(complaints)} complaints - {timings}")
+
+        return {
+            'success': not self.errors,
+            'dry_run': True,
+            'errors': self.errors,
+            'complaint_count': len(complaints),
+            'reductions': [
+                {'technician': tech_sheet_name, 'product_code': product_code, 'quantity': quantity}
+                for (tech_sheet_name, product_code), quantity in plan['reductions'].items()
+            ],
+            'stock_reductions': plan['stock_reductions'],
+            'insufficient_stock': plan['insufficient'],
+            'skipped_column_p': plan['skipped'],
+            'estimated_calls': self._estimate_calls(
+                complaints, plan, bulk, sum(sheets_calls.values()), len(queries.captured_queries)
+            ),
+            'dry_run_db_queries': len(queries.captured_queries),
+            'timings': timings,
+        }
+
+    def _estimate_calls(self, complaints, plan, bulk, sheets_reads, db_reads):
+        """
+        Calls the real run (a ProcessingJob) would make for this plan. The
+        read side is what this dry run measured: the job plans the same way
+        (each chunk also re-checks what is recorded meanwhile). The write side follows from the plan: the job's claim, plan,
+        per-chunk checkpoint and completion saves, the intake watermark, one
+        ProcessedComplaint row per complaint and one outbox row per queued
+        stock change (a ledger move instead with the stock ledger). Each
+        outbox flush of up to SHEET_OUTBOX_BATCH_SIZE rows is one batchGet
+        and one batchUpdate; with SHEET_OUTBOX_FLUSH_ON_COMMIT every commit
+        that queued rows kicks one, so that count is an upper bound.
+        """
+        from courier_api import stock_ledger
+
+        chunk_size = getattr(settings, 'PROCESSING_JOB_CHUNK_SIZE', 50)
+        batch_size = getattr(settings, 'SHEET_OUTBOX_BATCH_SIZE', 500)
+        chunks = [complaints[start:start + chunk_size] for start in range(0, len(complaints), chunk_size)]
+
+        if bulk:
+            # One stock change per (technician sheet, product) of each chunk, committed with the chunk
+            reduced = {
+                r['complaint_no']: (self.get_technician_sheet_name(r['technician']), r['product_code'])
+                for r in plan['stock_reductions']
+            }
+            per_commit = [
+                len({reduced[c['complaint_no']] for c in chunk if c['complaint_no'] in reduced}) for chunk in chunks
+            ]
+        else:
+            # Each complaint commits its own stock change
+            per_commit = [1] * len(plan['stock_reductions'])
+        stock_changes = sum(per_commit)
+
+        ledger = stock_ledger.ledger_enabled()
+        if ledger or not stock_changes:
+            flushes = 0
+        elif getattr(settings, 'SHEET_OUTBOX_FLUSH_ON_COMMIT', True):
+            flushes = sum(math.ceil(rows / batch_size) for rows in per_commit)
+        else:
+            flushes = math.ceil(stock_changes / batch_size)
+
+        job_saves = 3 + len(chunks) if complaints else 0
+        return {
+            'sheets': {
+                'fetch': sheets_reads,
+                'outbox_flush': 2 * flushes,
+                'total': sheets_reads + 2 * flushes,
+            },
+            'db': {
+                'planning_queries': db_reads,
+                'job_saves': job_saves,
+                'intake_state': 1 if self.intake_watermark else 0,
+                'processed_rows': len(plan['records']),
+                'outbox_rows': 0 if ledger else stock_changes,
+                'ledger_moves': stock_changes if ledger else 0,
+                'outbox_flushes': flushes,
+            },
+        }
+    
     def _get_result(self):
         """Get processing result summary"""
         return {
@@ -0,0 +1,225 @@
+# E:\study\techfix\backend\api\services\processing_jobs.py
+"""
+Complaint processing as a persisted background job (ProcessingJob).
+
+POST /api/complaints/process/ used to run ComplaintProcessor inside the
+HTTP request and went past the gunicorn worker timeout with a few dozen
+complaints. It now only creates a job and returns; the admin app polls the
+job for progress.
+
+A worker claims the job and plans it: the pending complaints are listed
+once (one Tracking read) and stored on the job, with the intake watermark
+to save when the job completes. It then processes them in
+chunks of PROCESSING_JOB_CHUNK_SIZE, saving the position, counters and
+errors after every chunk. Complaints already in ProcessedComplaint are
+dropped from each chunk first, so a chunk that was cut off half-way is
+never applied twice.
+
+Workers are a background thread started after the job is created, and
+`manage.py run_processing_jobs`. A RUNNING job whose heartbeat is older
+than PROCESSING_JOB_STALE_SECONDS lost its worker (deploy, crash, OOM
+kill). The next worker resumes it from its last checkpoint, up to
+PROCESSING_JOB_MAX_ATTEMPTS times. A job that raised is FAILED with the
+error and can be resumed with resume_job() once the cause is fixed.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import ProcessedComplaint, ProcessingJob
+from .read_policy import refresh_in_background
+
+logger = logging.getLogger(__name__)
+
+# Fields of a planned complaint that process_single_complaint() /
+# process_complaints_bulk() use (the rest is not JSON-serialisable)
+_COMPLAINT_FIELDS = (
+    'complaint_no', 'technician_name', 'product_code', 'part_name', 'quantity',
+    'skip_stock_reduction', 'column_p_date',
+)
+
+
+# -----------------------
+# CREATING / POLLING
+# -----------------------
+
+def create_job(requested_by, since_date=None, technician_filter=None, bulk=False, full_scan=False):
+    """Queue a processing run; a background worker starts on it after the commit"""
+    job = ProcessingJob.objects.create(
+        requested_by=requested_by,
+        since_date=since_date,
+        technician_filter=technician_filter or "",
+        bulk=bulk,
+        full_scan=full_scan,
+    )
+    transaction.on_commit(kick)
+    return job
+
+
+def kick():
+    """Run due jobs in a background thread of this process (one at a time)"""
+    refresh_in_background("processing_jobs", run_due_jobs)
+
+
+def resume_job(job_id):
+    """Put a FAILED job back in the queue; it continues from its last checkpoint"""
+    resumed = ProcessingJob.objects.filter(id=job_id, status=ProcessingJob.FAILED).update(
+        status=ProcessingJob.QUEUED, attempts=0, finished_at=None
+    )
+    if resumed:
+        transaction.on_commit(kick)
+    return bool(resumed)
+
+
+def job_status(job):
+    """What the admin app polls"""
+    total = job.total_count
+    return {
+        'success': job.status != ProcessingJob.FAILED,
+        'job_id': job.id,
+        'status': job.status,
+        'total_count': total,
+        'position': job.position,
+        'progress_percent': round(100 * job.position / total) if total else (100 if total == 0 else 0),
+        'processed_count': job.processed_count,
+        'stock_reduced_count': job.stock_reduced_count,
+        'error_count': len(job.errors),
+        'errors': job.errors[-50:],
+        'last_error': job.last_error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+
+
+# -----------------------
+# RUNNING
+# -----------------------
+
+def run_due_jobs():
+    """Run queued and abandoned jobs until none is left. Returns how many were run."""
+    count = 0
+    while True:
+        job = _claim()
+        if job is None:
+            return count
+        run_job(job)
+        count += 1
+
+
+def _claim():
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=getattr(settings, 'PROCESSING_JOB_STALE_SECONDS', 600))
+    max_attempts = getattr(settings, 'PROCESSING_JOB_MAX_ATTEMPTS', 3)
+
+    with transaction.atomic():
+        abandoned = ProcessingJob.objects.filter(status=ProcessingJob.RUNNING, heartbeat_at__lt=stale_before)
+        for job in abandoned.filter(attempts__gte=max_attempts).select_for_update(skip_locked=True):
+            logger.error(f"{job} was interrupted {job.attempts} times, giving up")
+            _fail(job, f"Interrupted {job.attempts} times - resume it once the worker problem is fixed")
+
+        job = (
+            ProcessingJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=ProcessingJob.QUEUED) | Q(status=ProcessingJob.RUNNING, heartbeat_at__lt=stale_before))
+            .order_by('id').first()
+        )
+        if job is None:
+            return None
+        if job.status == ProcessingJob.RUNNING:
+            logger.warning(f"{job} lost its worker, resuming from complaint {job.position}")
+
+        ProcessingJob.objects.filter(id=job.id).update(
+            status=ProcessingJob.RUNNING,
+            attempts=F('attempts') + 1,
+            started_at=job.started_at or now,
+            heartbeat_at=now,
+        )
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """Plan (first run only) and process `job` chunk by chunk"""
+    from .complaint_processor import ComplaintProcessor
+
+    start_time = time.time()
+    chunk_size = getattr(settings, 'PROCESSING_JOB_CHUNK_SIZE', 50)
+    processor = ComplaintProcessor()
+
+    try:
+        if job.total_count is None:
+            _plan(job, processor)
+
+        while job.position < job.total_count:
+            chunk = job.complaints[job.position:job.position + chunk_size]
+            _process_chunk(job, processor, chunk)
+            job.position += len(chunk)
+            job.heartbeat_at = timezone.now()
+            job.save(update_fields=[
+                'position', 'processed_count', 'stock_reduced_count', 'errors', 'heartbeat_at',
+            ])
+            logger.info(f"{job}: chunk of {len(chunk)} done")
+    except Exception as e:
+        logger.exception(f"{job} failed: {e}")
+        _fail(job, str(e))
+        return job
+
+    processor.save_intake_watermark(job.complaints, job.intake_watermark)
+
+    job.status = ProcessingJob.COMPLETED
+    job.finished_at = timezone.now()
+    job.last_error = ""
+    job.save(update_fields=['status', 'finished_at', 'last_error'])
+    logger.info(
+        f"[TIMING] {job}: {job.processed_count} processed, {job.stock_reduced_count} stock reductions, "
+        f"{len(job.errors)} errors - Duration: {time.time() - start_time:.2f}s"
+    )
+    return job
+
+
+def _plan(job, processor):
+    complaints = processor.plan_complaints(job.since_date, job.technician_filter or None, job.full_scan)
+    if processor.errors:
+        # Fetching failed - do not record an empty plan as a finished job
+        raise RuntimeError(processor.errors[-1])
+
+    job.complaints = [{field: c.get(field) for field in _COMPLAINT_FIELDS} for c in complaints]
+    job.total_count = len(job.complaints)
+    job.intake_watermark = processor.intake_watermark
+    job.position = 0
+    job.heartbeat_at = timezone.now()
+    job.save(update_fields=['complaints', 'total_count', 'intake_watermark', 'position', 'heartbeat_at'])
+    logger.info(f"{job}: planned {job.total_count} complaints since {job.since_date or 'the intake watermark'}")
+
+
+def _process_chunk(job, processor, chunk):
+    # A chunk the previous worker was cut off in may be partly recorded already
+    done = set(
+        ProcessedComplaint.objects.filter(complaint_no__in=[c['complaint_no'] for c in chunk])
+        .values_list('complaint_no', flat=True)
+    )
+    todo = [c for c in chunk if c['complaint_no'] not in done]
+    if not todo:
+        return
+
+    processor.processed_count = 0
+    processor.errors = []
+    processor.stock_reductions = []
+    if not processor.process_batch(todo, job.bulk):
+        raise RuntimeError(processor.errors[-1])
+
+    job.processed_count += processor.processed_count
+    job.stock_reduced_count += len(processor.stock_reductions)
+    job.errors = job.errors + processor.errors
+
+
+def _fail(job, error):
+    job.status = ProcessingJob.FAILED
+    job.last_error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'last_error', 'finished_at'])
@@ -0,0 +1,431 @@
+# E:\study\techfix\backend\api\services\read_policy.py
+"""
+How Google Sheets data is served when Google is slow or down.
+
+- Circuit breaker: after GOOGLE_SHEETS_BREAKER_FAILURES consecutive
+  failures (timeouts, connection errors, 5xx) every Sheets call fails
+  fast with SheetsUnavailable for GOOGLE_SHEETS_BREAKER_COOLDOWN seconds,
+  then a single probe call decides whether to close it again. Enforced in
+  SheetsHTTPClient, so it covers every read and write. A 429 is our own
+  quota, not an outage: it neither counts as a failure nor closes it.
+- Stale-while-revalidate: cached data past its freshness window is served
+  immediately while one background thread refreshes it. A refresh that
+  fails (or a tripped breaker) falls back to the last good copy. Cached
+  values live in a cache shared by all worker processes, versioned so an
+  invalidation in one worker reaches the others.
+- Staleness bookkeeping: readers call note_served(); the
+  SheetsStalenessMiddleware turns that into X-Data-Stale / X-Data-Age
+  response headers.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import SharedCounter, SharedLease
+
+logger = logging.getLogger(__name__)
+
+# Cache visible to every worker process on this machine (settings.CACHES)
+shared_cache = caches['shared']
+
+
+class SheetsUnavailable(Exception):
+    """Google Sheets is failing (circuit open) and no cached copy can be served"""
+
+
+class SingleFlightTimeout(SheetsUnavailable):
+    """Gave up waiting for another caller's fetch of the same data"""
+
+
+# -----------------------
+# CIRCUIT BREAKER
+# -----------------------
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one probe) -> closed"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold, cooldown):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        """Raise SheetsUnavailable instead of letting the call wait on a dead upstream"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    raise SheetsUnavailable(f"{self.name} circuit open after {self._failures} failures")
+                self._state = self.HALF_OPEN
+            # Half-open: let exactly one probe through
+            if self._probe_in_flight:
+                raise SheetsUnavailable(f"{self.name} circuit half-open, probe in progress")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed again")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_neutral(self):
+        """A response that says nothing about Google's health (429): only ends a half-open probe"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"Circuit '{self.name}' opened after {self._failures} failures, "
+                        f"failing fast for {self.cooldown}s"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {'state': self._state, 'failures': self._failures}
+
+
+sheets_breaker = CircuitBreaker(
+    "google-sheets",
+    failure_threshold=getattr(settings, 'GOOGLE_SHEETS_BREAKER_FAILURES', 5),
+    cooldown=getattr(settings, 'GOOGLE_SHEETS_BREAKER_COOLDOWN', 30),
+)
+
+
+def is_upstream_failure(exc):
+    """True for errors that say Google is unhealthy (not e.g. a bad range or a 404)"""
+    if isinstance(exc, (TimeoutError, requests.Timeout, requests.ConnectionError)):
+        return True
+    code = getattr(exc, "code", None)
+    return isinstance(code, int) and (code == 429 or code >= 500)
+
+
+# -----------------------
+# STALENESS BOOKKEEPING
+# -----------------------
+
+_served = threading.local()
+
+
+def begin_request():
+    _served.stale = False
+    _served.age = None
+
+
+def note_served(age_seconds, stale):
+    """Record that the current request used Sheets data `age_seconds` old"""
+    if stale:
+        _served.stale = True
+    if age_seconds is not None:
+        _served.age = max(getattr(_served, 'age', None) or 0.0, age_seconds)
+
+
+def served_state():
+    """(stale, oldest age in seconds or None) for the current request"""
+    return getattr(_served, 'stale', False), getattr(_served, 'age', None)
+
+
+# -----------------------
+# BACKGROUND REFRESH
+# -----------------------
+
+_refresh_lock = threading.Lock()
+_refreshing = set()
+
+
+def refresh_in_background(key, refresh):
+    """Run refresh() in a daemon thread unless a refresh for `key` is already running"""
+    with _refresh_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+
+    def run():
+        start_time = time.time()
+        try:
+            refresh()
+            logger.info(f"[TIMING] Background refresh of {key} in {time.time() - start_time:.2f}s")
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed after {time.time() - start_time:.2f}s: {e}")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(key)
+            # The thread's own DB connection; nothing else would ever close it
+            connection.close()
+
+    threading.Thread(target=run, name=f"refresh-{key}", daemon=True).start()
+    return True
+
+
+# -----------------------
+# SINGLE FLIGHT
+# -----------------------
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Per-key stampede protection inside one process: the first caller for a
+    key runs the fetch, concurrent callers wait (at most `wait` seconds)
+    and get the same result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def run(self, key, fetch, wait):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            try:
+                flight.result = fetch()
+                return flight.result
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._flights.pop(key, None)
+                flight.done.set()
+
+        if not flight.done.wait(wait):
+            raise SingleFlightTimeout(f"Timed out after {wait}s waiting for the fetch of {key}")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+
+single_flight = SingleFlight()
+
+
+# -----------------------
+# SHARED COUNTERS
+# -----------------------
+
+def read_counter(key):
+    return SharedCounter.objects.filter(key=key).values_list('value', flat=True).first() or 0
+
+
+def bump_counter(key):
+    """Add 1 to a SharedCounter (created on first use) and return the new value; safe across processes"""
+    with transaction.atomic():
+        if not SharedCounter.objects.filter(key=key).update(value=F('value') + 1):
+            try:
+                with transaction.atomic():
+                    SharedCounter.objects.create(key=key, value=1)
+                return 1
+            except IntegrityError:
+                # Another process created it first
+                SharedCounter.objects.filter(key=key).update(value=F('value') + 1)
+        return read_counter(key)
+
+
+# -----------------------
+# LEASES
+# -----------------------
+
+def new_lease_holder():
+    """A holder id unique to this caller (process id + random suffix)"""
+    return f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(key, holder, ttl):
+    """
+    Take or renew the SharedLease `key` for `ttl` seconds. True when
+    `holder` holds it afterwards. Call it outside a transaction - other
+    workers only see the lease once its row is committed.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=ttl)
+    # Our own lease, or one whose holder died; the UPDATE re-checks this
+    # under the row lock, so only one of two racing workers takes it over
+    if SharedLease.objects.filter(Q(holder=holder) | Q(expires_at__lte=now), key=key).update(
+        holder=holder, expires_at=expires_at
+    ):
+        return True
+    try:
+        with transaction.atomic():
+            SharedLease.objects.create(key=key, holder=holder, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return False
+
+
+def release_lease(key, holder):
+    """Give the lease up, unless it expired and someone else took it meanwhile"""
+    SharedLease.objects.filter(key=key, holder=holder).delete()
+
+
+# -----------------------
+# CACHED READS
+# -----------------------
+
+class StaleWhileRevalidate:
+    """
+    A value from Google Sheets shared by all workers of this machine.
+
+    Two tiers: the "shared" cache (file-based, see settings.CACHES) holds
+    the value; each worker keeps a local copy in the default LocMemCache
+    and only re-reads the shared one when the version moved. The version
+    is a SharedCounter row, not a cache entry: the file cache has no
+    atomic increment, and a lost bump would leave every worker serving
+    the pre-write value. invalidate() (after a write) bumps the version, so every worker
+    drops its copy on its next read, and the first one to refresh publishes
+    the new value for all of them.
+
+    A value is fresh for `fresh_for` seconds; after that it is served as-is
+    and refreshed in the background. After invalidate() the next read
+    fetches synchronously and falls back to the last good copy (kept for
+    `keep_for` seconds) only if Google is failing.
+
+    At most one fetch per version runs at a time across all workers:
+    threads of a worker share one SingleFlight, and workers take a
+    SharedLease (acquire_lease) - the others poll for its result for up to
+    SHEETS_SINGLE_FLIGHT_WAIT seconds, then fall back to the last good copy.
+    The lease lapses after twice the Sheets request timeout, so a fetch
+    that hangs longer than that may overlap with the next one.
+    """
+
+    def __init__(self, key, fetch, fresh_for, keep_for):
+        self.key = key
+        self.fetch = fetch
+        self.fresh_for = fresh_for
+        self.keep_for = keep_for
+
+        self._version_key = f"{key}:version"
+        self._last_good_key = f"{key}:last"
+        self._lease_key = f"{key}:lease"
+
+        self.wait = getattr(settings, 'SHEETS_SINGLE_FLIGHT_WAIT', 15)
+        # A crashed leader's lease expires on its own
+        self.lease_ttl = getattr(settings, 'GOOGLE_SHEETS_REQUEST_TIMEOUT', 30) * 2
+
+    def get(self):
+        version = self._version()
+        entry = self._entry(version)
+
+        if entry is not None:
+            age = time.time() - entry['fetched_at']
+            stale = age >= self.fresh_for
+            if stale:
+                refresh_in_background(self.key, self._refresh_if_leader)
+            note_served(age, stale)
+            return entry['value']
+
+        try:
+            return single_flight.run(self._data_key(version), lambda: self._load(version), self.wait)
+        except Exception as e:
+            last_good = shared_cache.get(self._last_good_key)
+            if last_good is None or not (isinstance(e, SheetsUnavailable) or is_upstream_failure(e)):
+                raise
+            age = time.time() - last_good['fetched_at']
+            logger.warning(f"Serving last good copy of {self.key} ({age:.0f}s old): {e}")
+            note_served(age, True)
+            return last_good['value']
+
+    def refresh(self, version=None):
+        # Read the version before fetching: a write landing mid-fetch bumps
+        # it again, so this (possibly pre-write) value is never served as current
+        version = self._version() if version is None else version
+        value = self.fetch()
+        entry = {'value': value, 'fetched_at': time.time(), 'version': version}
+
+        shared_cache.set_many({self._data_key(version): entry, self._last_good_key: entry}, self.keep_for)
+        cache.set(self.key, entry, self.keep_for)
+        note_served(0.0, False)
+        return value
+
+    def _load(self, version):
+        """Fetch `version` unless another worker is already doing it, then wait for its result"""
+        give_up_at = time.monotonic() + self.wait
+        holder = new_lease_holder()
+        while True:
+            if acquire_lease(self._lease_key, holder, self.lease_ttl):
+                try:
+                    return self.refresh(version)
+                finally:
+                    release_lease(self._lease_key, holder)
+
+            time.sleep(0.2)
+            entry = shared_cache.get(self._data_key(version))
+            if entry is not None:
+                cache.set(self.key, entry, self.keep_for)
+                note_served(time.time() - entry['fetched_at'], False)
+                return entry['value']
+            if time.monotonic() >= give_up_at:
+                raise SingleFlightTimeout(f"Timed out after {self.wait}s waiting for another worker to fetch {self.key}")
+
+    def _refresh_if_leader(self):
+        # Background refresh of a stale value: skip it if another worker is on it
+        holder = new_lease_holder()
+        if not acquire_lease(self._lease_key, holder, self.lease_ttl):
+            return
+        try:
+            self.refresh()
+        finally:
+            release_lease(self._lease_key, holder)
+
+    def invalidate(self):
+        """Make every worker revalidate on its next read"""
+        bump_counter(self._version_key)
+        cache.delete(self.key)
+
+    def _version(self):
+        return read_counter(self._version_key)
+
+    def _data_key(self, version):
+        return f"{self.key}:v{version}"
+
+    def _entry(self, version):
+        local = cache.get(self.key)
+        if local is not None and local['version'] == version:
+            if time.time() - local['fetched_at'] < self.fresh_for:
+                return local
+        else:
+            local = None
+
+        # Another worker may already have fetched (or re-fetched) this version
+        entry = shared_cache.get(self._data_key(version))
+        if entry is None or (local is not None and local['fetched_at'] >= entry['fetched_at']):
+            return local
+        cache.set(self.key, entry, self.keep_for)
+        return entry
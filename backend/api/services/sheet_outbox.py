@@ -0,0 +1,513 @@
+# E:\study\techfix\backend\api\services\sheet_outbox.py
+"""
+Write-behind journal for Google Sheets writes (SheetMutation outbox).
+
+Approvals, courier receipts and complaint processing used to block the HTTP
+request on Google writes, and failed outright while Google was down. They
+now call record_*() inside their DB transaction; the mutation commits (or
+rolls back) together with the business change and the request returns after
+the DB commit.
+
+flush_pending() applies the journal: due mutations are claimed, coalesced
+(stock changes summed per spare / technician+spare, Tracking cells merged
+per complaint, later writes winning) and sent in one SheetWriteBatch per
+spreadsheet. Each row is checked against the sheet as it is now - a spare
+or complaint that is gone, or a company stock that would go negative, marks
+just that row CONFLICT. The rows of a stock transfer (record_stock_transfer)
+share a group and are applied or refused together. Upstream failures retry the whole flush with
+exponential backoff until SHEET_OUTBOX_MAX_ATTEMPTS.
+
+Stock changes are relative, so a retry must not add them twice when the
+failed attempt did reach the sheet (a timeout after Google applied the
+batchUpdate, or an append failing after it). Before sending, every stock
+row records the value its cell had and will have (write_plan); a retry
+compares the sheet with that first - see _apply_stock().
+
+With STOCK_LEDGER_ENABLED, stock changes go to the database ledger
+(courier_api.stock_ledger) instead and only Tracking writes are queued here.
+
+Flushes run in a background thread after each commit that recorded
+mutations (SHEET_OUTBOX_FLUSH_ON_COMMIT) and from
+`manage.py flush_sheet_mutations`, which also picks up whatever a worker
+left behind. One flush runs at a time across all workers (a SharedLease):
+a flush reads stock cells and writes back absolute quantities, so two at
+once would overwrite each other's changes. A flush that finds the lease
+taken returns; the holder flushes what was recorded meanwhile before it
+lets go.
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from courier_api import stock_ledger
+from ..models import SheetMutation
+from .read_policy import (
+    SheetsUnavailable, acquire_lease, is_upstream_failure, new_lease_holder, refresh_in_background, release_lease,
+)
+from .sheet_projection import SheetProjection
+from .sheet_records import safe_int
+from .tracking_queries import record_tracking_write
+
+logger = logging.getLogger(__name__)
+
+# Tracking column B, to confirm where each complaint is before writing
+_COMPLAINT_COLUMN = SheetProjection("Tracking", [1])
+
+_FLUSH_LEASE_KEY = "sheet_outbox:flush"
+
+
+# -----------------------
+# RECORDING
+# -----------------------
+
+def record_company_stock_change(spare_id, quantity, source=""):
+    """Queue "Mrp List" qty of `spare_id` += quantity (negative to reduce)"""
+    if stock_ledger.ledger_enabled():
+        # The ledger is the stock; the sheet tab is regenerated by its export
+        return stock_ledger.move(stock_ledger.COMPANY, spare_id, quantity, source=source)
+    return _record(SheetMutation.COMPANY_STOCK, spare_id=spare_id.strip(), quantity=quantity, source=source)
+
+
+def record_technician_stock_change(technician_name, spare_id, quantity, source=""):
+    """Queue "Technician Stocks" qty += quantity; a missing row is appended on flush"""
+    if stock_ledger.ledger_enabled():
+        return stock_ledger.move(
+            stock_ledger.technician_location(technician_name), spare_id, quantity,
+            source=source, holder=technician_name.strip(),
+        )
+    return _record(
+        SheetMutation.TECHNICIAN_STOCK,
+        technician_name=technician_name.strip(), spare_id=spare_id.strip(), quantity=quantity, source=source,
+    )
+
+
+def record_stock_transfer(transfers, source=""):
+    """
+    Queue company -> technician moves: `transfers` maps technician sheet
+    name -> {spare_id: qty}. All rows are one group: on flush it goes
+    through SheetsSync.apply_transfers() and is applied, or refused
+    (CONFLICT), as a whole. Returns the group. With the stock ledger it is
+    one ledger transfer instead (returns apply_transfers()'s report),
+    raising StockTransferError when the company stock cannot cover it.
+    """
+    from courier_api.sheets_sync import SheetsSync
+
+    if stock_ledger.ledger_enabled():
+        return SheetsSync().apply_transfers(transfers, source=source or "transfer")
+
+    group = f"{source or 'transfer'}:{uuid.uuid4().hex[:8]}"
+    company = {}
+    for technician_name, needed in transfers.items():
+        for spare_id, qty in needed.items():
+            company[spare_id] = company.get(spare_id, 0) + qty
+            _record(
+                SheetMutation.TECHNICIAN_STOCK,
+                technician_name=technician_name.strip(), spare_id=spare_id, quantity=qty, source=source, group=group,
+            )
+    for spare_id, qty in company.items():
+        _record(SheetMutation.COMPANY_STOCK, spare_id=spare_id, quantity=-qty, source=source, group=group)
+    return group
+
+
+def record_tracking_cells(complaint_no, cells, source=""):
+    """Queue writes to the complaint's Tracking row; `cells` maps 1-based column -> value"""
+    return _record(
+        SheetMutation.TRACKING_CELLS,
+        complaint_no=complaint_no.strip(), cells={str(col): value for col, value in cells.items()}, source=source,
+    )
+
+
+def _record(kind, **fields):
+    mutation = SheetMutation.objects.create(kind=kind, **fields)
+    if getattr(settings, 'SHEET_OUTBOX_FLUSH_ON_COMMIT', True):
+        transaction.on_commit(kick)
+    return mutation
+
+
+def kick():
+    """Flush in a background thread of this process (one at a time)"""
+    refresh_in_background("sheet_outbox", flush_pending)
+
+
+# -----------------------
+# READ-YOUR-WRITES
+# -----------------------
+
+def pending_stock_deltas(technician_name=None, applied_since=None):
+    """
+    {spare_id: summed quantity} of stock changes not yet on the sheet - for
+    the company stock, or for one technician's stock. With `applied_since`,
+    changes applied after that moment count too (for a copy of the sheet
+    read before then).
+    """
+    not_on_sheet = Q(status__in=[SheetMutation.PENDING, SheetMutation.APPLYING])
+    if applied_since is not None:
+        not_on_sheet |= Q(status=SheetMutation.APPLIED, applied_at__gt=applied_since)
+
+    mutations = SheetMutation.objects.filter(not_on_sheet)
+    if technician_name is None:
+        mutations = mutations.filter(kind=SheetMutation.COMPANY_STOCK)
+    else:
+        mutations = mutations.filter(
+            kind=SheetMutation.TECHNICIAN_STOCK, technician_name__iexact=technician_name.strip()
+        )
+    return {
+        row['spare_id']: row['total']
+        for row in mutations.values('spare_id').annotate(total=Sum('quantity'))
+        if row['total']
+    }
+
+
+def outbox_stats():
+    counts = dict(SheetMutation.objects.values_list('status').annotate(n=Count('id')))
+    oldest = (
+        SheetMutation.objects.filter(status=SheetMutation.PENDING)
+        .order_by('id').values_list('created_at', flat=True).first()
+    )
+    return {
+        'counts': counts,
+        'oldest_pending_age': round((timezone.now() - oldest).total_seconds()) if oldest else None,
+    }
+
+
+# -----------------------
+# FLUSHING
+# -----------------------
+
+def flush_pending(limit=None):
+    """
+    Apply due mutations, in rounds of `limit` while more are due. Returns
+    counts of what happened to the claimed rows; 'busy' is True when
+    another process was flushing and nothing was done here.
+    """
+    limit = limit or getattr(settings, 'SHEET_OUTBOX_BATCH_SIZE', 500)
+    # A lease outliving its holder lapses with its claims (_release_stale_claims)
+    ttl = getattr(settings, 'SHEET_OUTBOX_CLAIM_TIMEOUT', 300)
+    holder = new_lease_holder()
+    result = {'claimed': 0, 'applied': 0, 'conflicts': 0, 'retrying': 0, 'failed': 0, 'busy': False}
+
+    while True:
+        if not acquire_lease(_FLUSH_LEASE_KEY, holder, ttl):
+            result['busy'] = not result['claimed']
+            if result['busy']:
+                logger.info("Sheet outbox flush skipped, another process is flushing")
+            return result
+        try:
+            claimed = _flush_round(limit, result)
+        finally:
+            release_lease(_FLUSH_LEASE_KEY, holder)
+        # Checked after letting go: a flush skipped while we held the lease
+        # recorded its rows before trying, so they are visible here
+        if not claimed or not _due().exists():
+            return result
+
+
+def _due():
+    return SheetMutation.objects.filter(status=SheetMutation.PENDING, next_attempt_at__lte=timezone.now())
+
+
+def _flush_round(limit, result):
+    start_time = time.time()
+
+    _release_stale_claims()
+    mutations = _claim(limit)
+    result['claimed'] += len(mutations)
+    if not mutations:
+        return 0
+
+    stock = [m for m in mutations if m.kind != SheetMutation.TRACKING_CELLS]
+    tracking = [m for m in mutations if m.kind == SheetMutation.TRACKING_CELLS]
+
+    for group, apply in ((stock, _apply_stock), (tracking, _apply_tracking)):
+        if not group:
+            continue
+        try:
+            conflicts, failed = apply(group)
+        except Exception as e:
+            _retry_later(group, e, result)
+            continue
+        _finish(group, conflicts, failed, result)
+
+    logger.info(
+        f"[TIMING] Sheet outbox flush: {len(mutations)} claimed, {result['applied']} applied, "
+        f"{result['conflicts']} conflicts, {result['retrying']} retrying, {result['failed']} failed - "
+        f"Duration: {time.time() - start_time:.2f}s"
+    )
+    return len(mutations)
+
+
+def _claim(limit):
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            _due().select_for_update(skip_locked=True)
+            .order_by('id').values_list('id', flat=True)[:limit]
+        )
+        groups = set(SheetMutation.objects.filter(id__in=ids).exclude(group="").values_list('group', flat=True))
+        if groups:
+            # A group is claimed whole, even past the limit
+            ids += list(
+                SheetMutation.objects.select_for_update(skip_locked=True)
+                .filter(status=SheetMutation.PENDING, group__in=groups).exclude(id__in=ids)
+                .values_list('id', flat=True)
+            )
+        SheetMutation.objects.filter(id__in=ids).update(status=SheetMutation.APPLYING, claimed_at=now)
+    return list(SheetMutation.objects.filter(id__in=ids).order_by('id'))
+
+
+def _release_stale_claims():
+    """
+    Rows a crashed flusher left APPLYING go back in the queue. Their writes
+    may or may not have reached the sheet: Tracking cells are absolute
+    values, and stock rows are checked against their write_plan.
+    """
+    timeout = getattr(settings, 'SHEET_OUTBOX_CLAIM_TIMEOUT', 300)
+    stale = SheetMutation.objects.filter(
+        status=SheetMutation.APPLYING, claimed_at__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(
+        status=SheetMutation.PENDING, claimed_at=None, last_error="Flush interrupted, retrying",
+    )
+    if stale:
+        logger.warning(f"{stale} sheet mutations were left mid-flush, retrying them")
+
+
+def _apply_stock(mutations):
+    """
+    One SheetWriteBatch on the company spreadsheet. Returns ({mutation id:
+    conflict message}, {mutation id: failure message}).
+
+    Rows with a write_plan were sent by an earlier attempt that failed.
+    Their cell is compared with the plan first: already at `after` - the
+    write landed, nothing is sent again; still at `before` - it did not,
+    apply the row like a new one; anything else - someone else changed the
+    cell meanwhile, FAILED for a human to check.
+
+    Transfers whose rows are all still to apply go through apply_transfers()
+    after the single rows, in the order they were recorded. A transfer that
+    is partly on the sheet already is completed row by row.
+    """
+    from courier_api.sheets_sync import SheetsSync
+
+    sheets_sync = SheetsSync()
+    conflicts, failed = {}, {}
+    with sheets_sync.write_batch() as batch:
+        batch.prefetch(SheetsSync.COMPANY_STOCK_PROJECTION, SheetsSync.TECHNICIAN_STOCK_PROJECTION)
+        cells = _StockCells(batch)
+
+        todo = []
+        for m in mutations:
+            plan = m.write_plan
+            value = cells.get(m)
+            if plan is None or (value == plan['before'] and value != plan['after']):
+                todo.append(m)
+            elif value != plan['after']:
+                failed[m.id] = (
+                    f"Sheet holds {value}, expected {plan['before']} (not written) or {plan['after']} "
+                    f"(written) - check the sheet, then requeue with flush_sheet_mutations --requeue-failed"
+                )
+
+        transfers, singles = _split_transfers(mutations, todo, failed)
+
+        company, technician = {}, {}
+        for m in singles:
+            if m.kind == SheetMutation.COMPANY_STOCK:
+                company.setdefault(m.spare_id, []).append(m)
+            else:
+                technician.setdefault((m.technician_name.lower(), m.spare_id), []).append(m)
+
+        for spare_id, group in company.items():
+            delta = sum(m.quantity for m in group)
+            if delta:
+                _check(conflicts, group, lambda: sheets_sync.update_company_stock(spare_id, -delta, batch=batch))
+
+        for (_, spare_id), group in technician.items():
+            delta = sum(m.quantity for m in group)
+            if delta:
+                # A new row is appended with the name as first recorded
+                _check(conflicts, group, lambda: sheets_sync.update_technician_stock(
+                    group[0].technician_name, spare_id, delta, batch=batch
+                ))
+
+        for members in transfers:
+            needed = {}
+            for m in members:
+                if m.kind == SheetMutation.TECHNICIAN_STOCK:
+                    per_spare = needed.setdefault(m.technician_name, {})
+                    per_spare[m.spare_id] = per_spare.get(m.spare_id, 0) + m.quantity
+            # Validates every company decrement before queueing anything
+            _check(conflicts, members, lambda: sheets_sync.apply_transfers(
+                needed, batch=batch, source=members[0].source or "outbox"
+            ))
+
+        # Committed before the batch is sent
+        _save_write_plans([m for m in todo if m.id not in conflicts and m.id not in failed], cells)
+    return conflicts, failed
+
+
+def _split_transfers(mutations, todo, failed):
+    """
+    ([rows of each transfer to apply whole], [rows to apply one by one]).
+    A transfer with a row that failed its write_plan check fails as a whole.
+    """
+    pending = {m.id for m in todo}
+    groups = {}
+    for m in mutations:
+        if m.group:
+            groups.setdefault(m.group, []).append(m)
+
+    transfers, partial = [], set()
+    for members in groups.values():
+        if any(m.id in failed for m in members):
+            for m in members:
+                if m.id in pending:
+                    failed[m.id] = "Another row of this transfer cannot be retried safely - check the sheet"
+        elif all(m.id in pending for m in members):
+            transfers.append(members)
+        else:
+            partial.update(m.id for m in members)
+
+    singles = [m for m in todo if m.id not in failed and (not m.group or m.id in partial)]
+    return transfers, singles
+
+
+class _StockCells:
+    """Stock quantities as read by a batch, looked up like update_*_stock() finds the rows"""
+
+    def __init__(self, batch):
+        from courier_api.sheets_sync import SheetsSync
+
+        self.company, self.technician = {}, {}
+        for r in batch.get_rows(SheetsSync.COMPANY_STOCK_PROJECTION)[1:]:
+            if len(r) > 1:
+                self.company.setdefault(r[1].strip(), safe_int(r[6] if len(r) > 6 else ""))
+        for r in batch.get_rows(SheetsSync.TECHNICIAN_STOCK_PROJECTION)[1:]:
+            if len(r) >= 4:
+                self.technician.setdefault((r[3].strip().lower(), r[1].strip()), safe_int(r[2]))
+
+    def get(self, m):
+        """Quantity in the cell `m` changes, None when its row does not exist (yet)"""
+        if m.kind == SheetMutation.COMPANY_STOCK:
+            return self.company.get(m.spare_id)
+        return self.technician.get((m.technician_name.lower(), m.spare_id))
+
+
+def _target(m):
+    return m.kind, m.technician_name.lower(), m.spare_id
+
+
+def _save_write_plans(mutations, cells):
+    deltas = {}
+    for m in mutations:
+        deltas[_target(m)] = deltas.get(_target(m), 0) + m.quantity
+    for m in mutations:
+        before = cells.get(m)
+        m.write_plan = {'before': before, 'after': (before or 0) + deltas[_target(m)]}
+    SheetMutation.objects.bulk_update(mutations, ['write_plan'], batch_size=500)
+
+
+def _apply_tracking(mutations):
+    """One SheetWriteBatch on the Tracking spreadsheet. Returns {mutation id: conflict message}."""
+    from .sheets_client import get_sheets_client
+    from courier_api.sheets_sync import SheetWriteBatch
+
+    by_complaint = {}
+    for m in mutations:
+        by_complaint.setdefault(m.complaint_no, []).append(m)
+
+    conflicts = {}
+    written = {}
+    with SheetWriteBatch(get_sheets_client(), settings.GOOGLE_SHEET_ID) as batch:
+        rows = batch.get_rows(_COMPLAINT_COLUMN)
+        row_by_complaint = {}
+        for idx, row in enumerate(rows[1:], start=2):
+            if len(row) > 1 and row[1].strip():
+                row_by_complaint.setdefault(row[1].strip(), idx)
+
+        for complaint_no, group in by_complaint.items():
+            sheet_row = row_by_complaint.get(complaint_no)
+            if sheet_row is None:
+                for m in group:
+                    conflicts[m.id] = f"Complaint {complaint_no} is no longer on the Tracking sheet"
+                continue
+
+            cells = {}
+            for m in group:
+                cells.update({int(col): value for col, value in m.cells.items()})
+            for col, value in cells.items():
+                batch.set_cell("Tracking", sheet_row, col, value)
+            written[sheet_row] = cells
+
+    for sheet_row, cells in written.items():
+        record_tracking_write(sheet_row, cells)
+    return conflicts, {}
+
+
+def _check(conflicts, group, write):
+    """Run one coalesced write; a sheet-side refusal marks its mutations, upstream errors propagate"""
+    try:
+        write()
+    except Exception as e:
+        if isinstance(e, SheetsUnavailable) or is_upstream_failure(e):
+            raise
+        for m in group:
+            conflicts[m.id] = str(e)
+
+
+def _finish(group, conflicts, failed, result):
+    now = timezone.now()
+    applied = [m.id for m in group if m.id not in conflicts and m.id not in failed]
+    SheetMutation.objects.filter(id__in=applied).update(
+        status=SheetMutation.APPLIED, applied_at=now, attempts=F('attempts') + 1, last_error=""
+    )
+    for m in group:
+        if m.id in conflicts:
+            logger.warning(f"Sheet mutation {m.id} ({m}) conflicts with the sheet: {conflicts[m.id]}")
+            SheetMutation.objects.filter(id=m.id).update(
+                status=SheetMutation.CONFLICT, attempts=m.attempts + 1, last_error=conflicts[m.id]
+            )
+        elif m.id in failed:
+            logger.error(f"Sheet mutation {m.id} ({m}) cannot be retried safely: {failed[m.id]}")
+            SheetMutation.objects.filter(id=m.id).update(
+                status=SheetMutation.FAILED, attempts=m.attempts + 1, last_error=failed[m.id]
+            )
+    result['applied'] += len(applied)
+    result['conflicts'] += len(conflicts)
+    result['failed'] += len(failed)
+
+
+def _retry_later(group, error, result):
+    max_attempts = getattr(settings, 'SHEET_OUTBOX_MAX_ATTEMPTS', 8)
+    now = timezone.now()
+    logger.warning(f"Sheet outbox flush of {len(group)} mutations failed: {error}")
+    for m in group:
+        attempts = m.attempts + 1
+        if attempts >= max_attempts:
+            SheetMutation.objects.filter(id=m.id).update(
+                status=SheetMutation.FAILED, attempts=attempts, last_error=str(error)
+            )
+            result['failed'] += 1
+        else:
+            SheetMutation.objects.filter(id=m.id).update(
+                status=SheetMutation.PENDING,
+                attempts=attempts,
+                last_error=str(error),
+                next_attempt_at=now + timedelta(seconds=min(15 * 2 ** attempts, 3600)),
+            )
+            result['retrying'] += 1
+
+
+def requeue_failed():
+    """
+    Put FAILED mutations back in the queue (after checking the sheet). Their
+    write plans are dropped: stock changes are applied to the sheet as it is now.
+    """
+    return SheetMutation.objects.filter(status=SheetMutation.FAILED).update(
+        status=SheetMutation.PENDING, attempts=0, next_attempt_at=timezone.now(), claimed_at=None,
+        write_plan=None,
+    )
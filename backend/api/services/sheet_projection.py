@@ -0,0 +1,218 @@
+# E:\study\techfix\backend\api\services\sheet_projection.py
+"""
+Column-projected worksheet reads.
+
+get_all_values() downloads every column of every row, but the Tracking views
+read about 15 of its columns and the stock code only a handful. A
+SheetProjection lists the columns the code actually indexes; fetch_projected()
+pulls just those column ranges - for any number of worksheets - in a single
+values:batchGet call and rebuilds rows in the usual positional layout
+(row[14] is still the technician), with "" in the columns that were skipped.
+
+The column map is header-driven: the first fetch remembers the header text
+of every projected column. If a column is later inserted or moved in the
+sheet, the headers no longer line up, the projection relocates each column
+by its header text and fetches again, so row[14] keeps meaning the same
+column instead of silently shifting.
+"""
+import logging
+import threading
+import time
+
+from gspread.utils import absolute_range_name, rowcol_to_a1
+
+from .sheets_client import get_sheets_client
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectionError(Exception):
+    """Projected columns could not be located in the current header row"""
+
+
+def _column_letter(index):
+    # rowcol_to_a1(1, 3) -> "C1"
+    return rowcol_to_a1(1, index + 1)[:-1]
+
+
+class SheetProjection:
+    """
+    The columns (0-based, as the code indexes rows) read from one worksheet.
+
+    `columns` are logical positions; `_physical` maps them to the sheet's
+    current positions, which only differ after the header moved.
+    """
+
+    def __init__(self, title, columns):
+        self.title = title
+        self.columns = sorted(set(columns))
+        self.width = self.columns[-1] + 1
+
+        self._lock = threading.Lock()
+        self._physical = {col: col for col in self.columns}
+        self._header_names = None   # logical column -> header text, learned on first fetch
+
+    def ranges(self, start_row=None, end_row=None, columns=None):
+        """
+        A1 ranges covering the projected columns (or the `columns` subset),
+        adjacent columns merged. start_row/end_row (1-based, inclusive) bound
+        the rows; by default whole columns are read, header included.
+        """
+        physical = self._physical_columns(columns)
+        top = str(start_row) if start_row else ""
+        bottom = str(end_row) if end_row else ""
+        ranges = []
+        start = prev = physical[0]
+        for col in physical[1:] + [None]:
+            if col is not None and col == prev + 1:
+                prev = col
+                continue
+            ranges.append(absolute_range_name(
+                self.title, f"{_column_letter(start)}{top}:{_column_letter(prev)}{bottom}"
+            ))
+            if col is not None:
+                start = prev = col
+        return ranges
+
+    def assemble(self, value_ranges, columns=None, check_header=True):
+        """
+        Rebuild positional rows from the value ranges returned for ranges()
+        (same `columns`). With check_header the first row is the header;
+        returns None if it moved and the caller has to fetch again with the
+        updated ranges().
+        """
+        physical = self._physical_columns(columns)
+        logical_of = {phys: col for col, phys in self._physical.items()}
+
+        # Which logical column each (range, offset) lands in
+        placements = []
+        idx = 0
+        for value_range in value_ranges:
+            values = value_range.get("values", [])
+            run = []
+            while idx < len(physical):
+                run.append(logical_of[physical[idx]])
+                idx += 1
+                if idx == len(physical) or physical[idx] != physical[idx - 1] + 1:
+                    break
+            placements.append((run, values))
+
+        total = max((len(values) for _, values in placements), default=0)
+        width = self.width
+        rows = [[""] * width for _ in range(total)]
+        for run, values in placements:
+            for r, value_row in enumerate(values):
+                row = rows[r]
+                for offset, value in enumerate(value_row[:len(run)]):
+                    row[run[offset]] = value
+
+        if check_header:
+            header = rows[0] if rows else [""] * width
+            if not self._check_header(header):
+                return None
+        return rows
+
+    def header_matches(self, full_header):
+        """True if the full header row still has the remembered names at the current positions"""
+        names = self._header_names
+        if names is None:
+            return True
+        for col, phys in self._physical.items():
+            current = full_header[phys].strip() if phys < len(full_header) else ""
+            if names[col] and current != names[col]:
+                return False
+        return True
+
+    def _physical_columns(self, columns=None):
+        physical = self._physical
+        return sorted(physical[col] for col in (columns if columns is not None else self.columns))
+
+    def _check_header(self, header):
+        names = {col: header[col].strip() for col in self.columns}
+        with self._lock:
+            if self._header_names is None:
+                self._header_names = names
+                return True
+            moved = [col for col in self.columns if self._header_names[col] and names[col] != self._header_names[col]]
+        if not moved:
+            return True
+        logger.warning(f"Header of '{self.title}' changed at columns {[_column_letter(c) for c in moved]}, re-locating")
+        return False
+
+    def reset(self):
+        """Back to the configured positions; the header is learned again on the next fetch"""
+        with self._lock:
+            self._physical = {col: col for col in self.columns}
+            self._header_names = None
+
+    def relocate(self, full_header):
+        """Find each projected column again by its remembered header text"""
+        with self._lock:
+            full_header = [h.strip() for h in full_header]
+            seen = {}
+            physical = {}
+            for col in self.columns:
+                name = self._header_names.get(col, "")
+                if not name:
+                    physical[col] = self._physical[col]
+                    continue
+                # Nth column with this header text keeps mapping to the Nth one
+                nth = seen.get(name, 0)
+                seen[name] = nth + 1
+                matches = [i for i, h in enumerate(full_header) if h == name]
+                if len(matches) <= nth:
+                    raise ProjectionError(f"Column '{name}' not found in '{self.title}' header")
+                physical[col] = matches[nth]
+            self._physical = physical
+        logger.info(f"'{self.title}' projection re-located: { {_column_letter(c): _column_letter(p) for c, p in physical.items() if c != p} }")
+
+
+def fetch_projected(sheet_id, sources, client=None):
+    """
+    Read several worksheets in one values:batchGet call.
+
+    `sources` is a list of SheetProjection objects and/or plain worksheet
+    titles (whole sheet). Returns {title: rows} with the header as rows[0].
+    """
+    client = client or get_sheets_client()
+    start_time = time.time()
+
+    ranges, spans = [], []
+    for source in sources:
+        source_ranges = source.ranges() if isinstance(source, SheetProjection) else [absolute_range_name(source)]
+        spans.append((source, len(ranges), len(ranges) + len(source_ranges)))
+        ranges.extend(source_ranges)
+
+    response = client.http_client.values_batch_get(sheet_id, ranges)
+    value_ranges = response.get("valueRanges", [])
+
+    results, moved = {}, []
+    for source, start, end in spans:
+        if isinstance(source, SheetProjection):
+            rows = source.assemble(value_ranges[start:end])
+            if rows is None:
+                moved.append(source)
+                continue
+            results[source.title] = rows
+        else:
+            results[source] = value_ranges[start].get("values", []) if start < len(value_ranges) else []
+
+    if moved:
+        # Structural change: one call for the full header rows, one for the data
+        headers = client.http_client.values_batch_get(
+            sheet_id, [absolute_range_name(p.title, "1:1") for p in moved]
+        ).get("valueRanges", [])
+        for projection, header_range in zip(moved, headers):
+            try:
+                projection.relocate((header_range.get("values") or [[]])[0])
+            except ProjectionError as e:
+                # e.g. a header was renamed in place - trust the configured positions again
+                logger.error(f"{e} - falling back to the configured column positions")
+                projection.reset()
+        results.update(fetch_projected(sheet_id, moved, client))
+
+    logger.info(
+        f"[TIMING] Projected fetch of {len(sources)} worksheets ({len(ranges)} ranges) "
+        f"in {time.time() - start_time:.2f}s"
+    )
+    return results
@@ -0,0 +1,192 @@
+# E:\study\techfix\backend\api\services\sheet_records.py
+"""
+Typed rows for the Google Sheets data we cache.
+
+Sheet rows used to travel around as lists of strings and every view re-did
+row[14].strip().upper(), complaint_no.split("/") and strptime() on each
+request. These classes are built once when a sheet is (re)loaded - cells
+normalised, complaint date parsed - and then shared read-only by all views.
+They use __slots__ because thousands of them stay resident per process.
+"""
+from datetime import datetime
+from functools import lru_cache
+
+
+def _cell(row, index):
+    return row[index] if len(row) > index else ""
+
+
+def safe_int(value):
+    try:
+        if value in (None, "", "#N/A"):
+            return 0
+        return int(float(str(value).replace(",", "")))
+    except Exception:
+        return 0
+
+
+def safe_float(value):
+    try:
+        if value in (None, "", "#N/A"):
+            return 0.0
+        return float(str(value).replace(",", ""))
+    except Exception:
+        return 0.0
+
+
+@lru_cache(maxsize=65536)
+def parse_complaint_date(complaint_no):
+    """
+    Date embedded in a complaint number: PCOTH/150725/01 -> 15-07-2025.
+    Returns None for empty or malformed numbers. Memoised - the same numbers
+    are parsed on every snapshot load and by ComplaintProcessor.
+    """
+    parts = complaint_no.strip().split("/") if complaint_no else []
+    if len(parts) < 3:
+        return None
+    try:
+        return datetime.strptime(parts[1], "%d%m%y")
+    except ValueError:
+        return None
+
+
+# -----------------------
+# TRACKING
+# -----------------------
+
+class TrackingRecord:
+    """
+    One "Tracking" row. Text fields keep the cell value as shown in the sheet
+    (that is what the API returns); *_key fields are stripped + upper-cased
+    for filtering. sheet_row is the 1-based sheet row number.
+    """
+
+    # 0-based sheet column of each text field
+    COLUMNS = {
+        'row_id': 0,            # A
+        'complaint_no': 1,      # B
+        'customer_name': 2,     # C
+        'phone': 3,             # D
+        'area': 5,              # F
+        'brand_name': 6,        # G
+        'product_code': 7,      # H
+        'part_name': 9,         # J
+        'quantity': 10,         # K
+        'status': 11,           # L
+        'pending_days': 12,     # M
+        'technician': 14,       # O
+        'district': 15,         # P
+        'mrp': 19,              # T
+        'cc_remarks': 23,       # X
+    }
+    WIDTH = 24
+
+    __slots__ = ('sheet_row', *COLUMNS, 'technician_key', 'status_key', 'cc_remarks_key', 'complaint_date')
+
+    def __init__(self, sheet_row, row):
+        self.sheet_row = sheet_row
+        for name, index in self.COLUMNS.items():
+            setattr(self, name, _cell(row, index))
+
+        self.technician_key = self.technician.strip().upper()
+        self.status_key = self.status.strip().upper()
+        self.cc_remarks_key = self.cc_remarks.strip().upper()
+
+        complaint_date = parse_complaint_date(self.complaint_no)
+        self.complaint_date = complaint_date.date() if complaint_date else None
+
+    def to_row(self):
+        """Positional list (columns A..X, "" where no field is kept) - used for the DB mirror"""
+        row = [""] * self.WIDTH
+        for name, index in self.COLUMNS.items():
+            row[index] = getattr(self, name)
+        return row
+
+    def with_cells(self, updates):
+        """Copy with `updates` (0-based column -> value) applied"""
+        row = self.to_row()
+        for index, value in updates.items():
+            if index < self.WIDTH:
+                row[index] = value
+        return TrackingRecord(self.sheet_row, row)
+
+    def __reduce__(self):
+        return (TrackingRecord, (self.sheet_row, self.to_row()))
+
+    def __repr__(self):
+        return f"<TrackingRecord row={self.sheet_row} {self.complaint_no}>"
+
+
+# -----------------------
+# STOCK SHEETS
+# -----------------------
+
+class CatalogItem:
+    """One "Mrp List" product (company stock)"""
+
+    __slots__ = ('spare_id', 'name', 'mrp', 'hsn', 'brand', 'qty')
+
+    def __init__(self, spare_id, name, mrp=0.0, hsn="", brand="", qty=0):
+        self.spare_id = spare_id
+        self.name = name
+        self.mrp = mrp
+        self.hsn = hsn
+        self.brand = brand
+        self.qty = qty
+
+    @classmethod
+    def from_row(cls, row):
+        """Mrp List row: B=spare id, C=name, D=mrp, E=hsn, F=brand, G=qty"""
+        return cls(
+            spare_id=row[1].strip(),
+            name=_cell(row, 2).strip(),
+            mrp=safe_float(_cell(row, 3)),
+            hsn=_cell(row, 4).strip(),
+            brand=_cell(row, 5).strip(),
+            qty=safe_int(_cell(row, 6)),
+        )
+
+    def as_dict(self):
+        return {
+            "spare_id": self.spare_id,
+            "name": self.name,
+            "mrp": self.mrp,
+            "hsn": self.hsn,
+            "brand": self.brand,
+            "qty": self.qty,
+        }
+
+    def __reduce__(self):
+        # Positional state keeps the cached list small when the cache pickles it
+        return (CatalogItem, (self.spare_id, self.name, self.mrp, self.hsn, self.brand, self.qty))
+
+
+class TechStockLine:
+    """One "Technician Stocks" row: A=name, B=spare id, C=qty, D=technician"""
+
+    __slots__ = ('spare_id', 'name', 'qty', 'technician_key')
+
+    def __init__(self, spare_id, name, qty, technician_key=""):
+        self.spare_id = spare_id
+        self.name = name
+        self.qty = qty
+        self.technician_key = technician_key
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            spare_id=row[1].strip(),
+            name=row[0].strip(),
+            qty=safe_int(row[2]),
+            technician_key=row[3].strip().lower(),
+        )
+
+    def as_dict(self):
+        return {
+            "spare_id": self.spare_id,
+            "name": self.name,
+            "qty": self.qty,
+        }
+
+    def __reduce__(self):
+        return (TechStockLine, (self.spare_id, self.name, self.qty, self.technician_key))
@@ -0,0 +1,364 @@
+# E:\study\techfix\backend\api\services\sheets_client.py
+"""
+One Google Sheets client per process.
+
+Both api.views.get_google_sheets_client() and SheetsSync.authenticate() used
+to parse the service-account JSON and call gspread.authorize() on every
+request (SheetsSync also ran DNS/socket/open_by_key probes first). The client
+built here is shared by every thread: its AuthorizedSession keeps the HTTP
+connection pool and the OAuth token, so a warm request authenticates with
+zero network calls. The token is refreshed only when it is close to expiry,
+by one thread at a time.
+
+Spreadsheet / Worksheet handles are cached here too (worksheet_registry), so
+code asks for get_worksheet(sheet_id, "Tracking") instead of paying two
+metadata fetches for open_by_key(...).worksheet(...) on every call.
+
+With GOOGLE_SHEETS_STANDIN_URL set, every call goes to the local stand-in
+server instead (manage.py sheets_standin) - for offline benchmarks.
+
+Timeouts are deadlines, not signals: `with sheets_deadline(20):` bounds every
+Sheets call the current thread makes inside the block, and works from any
+thread (gthread workers, thread pools).
+"""
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import gspread
+import requests
+from django.conf import settings
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials as StaticTokenCredentials
+from google.oauth2.service_account import Credentials
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.http_client import HTTPClient
+from gspread.worksheet import Worksheet
+
+from .read_policy import sheets_breaker
+from .sheets_quota import sheets_quota
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_SHEETS_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    # modifiedTime lookups for the Tracking snapshot revision check
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+]
+
+_lock = threading.Lock()
+_client = None
+_credentials = None
+
+
+# -----------------------
+# DEADLINES
+# -----------------------
+
+class SheetsTimeout(TimeoutError):
+    """A Sheets call did not finish before the current deadline"""
+
+
+_deadline = threading.local()
+
+
+@contextmanager
+def sheets_deadline(seconds):
+    """
+    Bound all Sheets API calls made by this thread inside the block to
+    `seconds` in total. Nested blocks can only shorten the outer deadline.
+    Calls raise SheetsTimeout once it has passed.
+    """
+    outer = getattr(_deadline, "at", None)
+    at = time.monotonic() + seconds
+    _deadline.at = at if outer is None else min(at, outer)
+    try:
+        yield
+    finally:
+        _deadline.at = outer
+
+
+def remaining_time():
+    """Seconds left before this thread's deadline, or None when no deadline is set"""
+    at = getattr(_deadline, "at", None)
+    return None if at is None else at - time.monotonic()
+
+
+# -----------------------
+# HTTP CLIENT
+# -----------------------
+
+_SPREADSHEET_ID_RE = re.compile(r"/spreadsheets/([a-zA-Z0-9_-]+)")
+
+# Errors meaning a cached worksheet handle no longer matches the spreadsheet
+# (worksheet renamed/deleted, or the whole spreadsheet gone)
+_STALE_HANDLE_MARKERS = ("Unable to parse range", "No grid with id")
+
+_GOOGLE_API_HOSTS = ("https://sheets.googleapis.com", "https://www.googleapis.com")
+
+# How often a call answered 429 is re-queued before the 429 is raised
+_RATE_LIMIT_RETRIES = 2
+
+
+class SheetsHTTPClient(HTTPClient):
+    """
+    gspread HTTP client that
+    - takes a read/write token from sheets_quota before every call, so
+      bursts queue up instead of hitting Google's per-minute quota
+    - gives every call a socket timeout: GOOGLE_SHEETS_REQUEST_TIMEOUT, cut
+      down to what is left of the thread's sheets_deadline()
+    - fails fast while the Sheets circuit breaker is open, and feeds it the
+      outcome of every call
+    - drops cached worksheet handles when the API says they are stale
+    """
+
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        standin_url = getattr(settings, 'GOOGLE_SHEETS_STANDIN_URL', '')
+        if standin_url:
+            for host in _GOOGLE_API_HOSTS:
+                if endpoint.startswith(host):
+                    endpoint = standin_url.rstrip("/") + endpoint[len(host):]
+                    break
+
+        # Queue for quota, and retry a 429 once the bucket has refilled -
+        # both within the thread's deadline
+        for attempt in range(_RATE_LIMIT_RETRIES + 1):
+            if not sheets_quota.before_call(method, endpoint, remaining_time()):
+                raise SheetsTimeout(f"Sheets deadline passed waiting for quota for {method.upper()} {endpoint}")
+            response = self._send(method, endpoint, params, data, json, files, headers)
+            if response.status_code != 429:
+                break
+            sheets_quota.record_rate_limited(method, endpoint)
+
+        if response.ok:
+            return response
+
+        error = APIError(response)
+        message = str(error.error.get("message", ""))
+        if error.code == 404 or any(marker in message for marker in _STALE_HANDLE_MARKERS):
+            match = _SPREADSHEET_ID_RE.search(endpoint)
+            if match:
+                worksheet_registry.forget(match.group(1))
+        raise error
+
+    def _send(self, method, endpoint, params, data, json, files, headers):
+        timeout = getattr(settings, 'GOOGLE_SHEETS_REQUEST_TIMEOUT', 30)
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise SheetsTimeout(f"Sheets deadline passed before {method.upper()} {endpoint}")
+            timeout = min(timeout, remaining)
+
+        sheets_breaker.before_call()
+        try:
+            # self.timeout is shared by all threads; the per-call value is passed straight to the session
+            response = self.session.request(
+                method=method, url=endpoint, json=json, params=params,
+                data=data, files=files, headers=headers, timeout=timeout,
+            )
+        except requests.Timeout as e:
+            sheets_breaker.record_failure()
+            raise SheetsTimeout(f"{method.upper()} {endpoint} timed out after {timeout:.1f}s") from e
+        except Exception:
+            sheets_breaker.record_failure()
+            raise
+
+        if response.status_code >= 500:
+            sheets_breaker.record_failure()
+        elif response.status_code == 429:
+            # Retried by request(); counting it would trip the breaker on our own quota
+            sheets_breaker.record_neutral()
+        else:
+            sheets_breaker.record_success()
+        return response
+
+
+def _load_credentials():
+    """
+    Service account from GOOGLE_SERVICE_ACCOUNT_JSON (production), falling
+    back to service.json for local development. The stand-in server needs
+    no real credentials.
+    """
+    if getattr(settings, 'GOOGLE_SHEETS_STANDIN_URL', ''):
+        logger.info(f"Using the Google Sheets stand-in at {settings.GOOGLE_SHEETS_STANDIN_URL}")
+        return StaticTokenCredentials(token="standin")
+
+    google_credentials_json = os.getenv('GOOGLE_SERVICE_ACCOUNT_JSON')
+
+    if google_credentials_json:
+        credentials_dict = json.loads(google_credentials_json)
+        logger.info("Using Google credentials from environment variable")
+        return Credentials.from_service_account_info(credentials_dict, scopes=GOOGLE_SHEETS_SCOPES)
+
+    logger.info("Using Google credentials from service.json file")
+    return Credentials.from_service_account_file("service.json", scopes=GOOGLE_SHEETS_SCOPES)
+
+
+def get_sheets_client():
+    """
+    Shared, thread-safe gspread client. The first call builds it; later calls
+    only check the token expiry locally.
+    """
+    global _client, _credentials
+
+    client, credentials = _client, _credentials
+    if client is not None and credentials.valid:
+        return client
+
+    with _lock:
+        if _client is None:
+            start_time = time.time()
+            _credentials = _load_credentials()
+            _client = gspread.authorize(_credentials, http_client=SheetsHTTPClient)
+            logger.info(f"[TIMING] Google Sheets client created in {time.time() - start_time:.3f}s")
+
+        # `valid` turns False shortly before the token expires (google-auth
+        # keeps a refresh margin), so this refreshes ahead of time instead of
+        # every concurrent request racing to do it on its first API call.
+        # A fresh client has no token yet; fetch it here for the same reason.
+        if not _credentials.valid:
+            start_time = time.time()
+            _credentials.refresh(Request())
+            logger.info(f"[TIMING] Google OAuth token refreshed in {time.time() - start_time:.3f}s")
+
+        return _client
+
+
+def reset_sheets_client():
+    """Forget the shared client, e.g. after the service-account env var changed"""
+    global _client, _credentials
+    with _lock:
+        _client = None
+        _credentials = None
+    worksheet_registry.clear()
+
+
+# -----------------------
+# WORKSHEET HANDLES
+# -----------------------
+
+class WorksheetRegistry:
+    """
+    Spreadsheet and Worksheet objects keyed by (sheet id, worksheet title).
+
+    The first lookup for a spreadsheet opens it and reads its metadata once,
+    resolving every worksheet title -> properties (gid, grid size) in that
+    single call. Later lookups are dictionary hits. Handles are only
+    re-resolved after SheetsHTTPClient sees an error saying they are stale
+    (worksheet renamed or deleted), or after forget()/clear().
+    """
+
+    def __init__(self):
+        # Re-entrant: a failing open_by_key() inside _resolve() reaches
+        # forget() through SheetsHTTPClient on the same thread
+        self._lock = threading.RLock()
+        self._spreadsheets = {}   # sheet id -> Spreadsheet
+        self._worksheets = {}     # (sheet id, title) -> Worksheet
+
+    def worksheet(self, sheet_id, title):
+        worksheet = self._worksheets.get((sheet_id, title))
+        if worksheet is not None:
+            return worksheet
+
+        with self._lock:
+            worksheet = self._worksheets.get((sheet_id, title))
+            if worksheet is None:
+                self._resolve(sheet_id)
+                worksheet = self._worksheets.get((sheet_id, title))
+            if worksheet is None:
+                raise WorksheetNotFound(title)
+            return worksheet
+
+    def spreadsheet(self, sheet_id):
+        spreadsheet = self._spreadsheets.get(sheet_id)
+        if spreadsheet is not None:
+            return spreadsheet
+
+        with self._lock:
+            if sheet_id not in self._spreadsheets:
+                self._spreadsheets[sheet_id] = get_sheets_client().open_by_key(sheet_id)
+            return self._spreadsheets[sheet_id]
+
+    def forget(self, sheet_id):
+        """Drop cached worksheet handles of one spreadsheet; the next lookup re-reads its metadata"""
+        with self._lock:
+            dropped = [key for key in self._worksheets if key[0] == sheet_id]
+            for key in dropped:
+                del self._worksheets[key]
+            self._spreadsheets.pop(sheet_id, None)
+        if dropped:
+            logger.info(f"Dropped {len(dropped)} cached worksheet handles for spreadsheet {sheet_id}")
+
+    def clear(self):
+        with self._lock:
+            self._spreadsheets.clear()
+            self._worksheets.clear()
+
+    def _resolve(self, sheet_id):
+        # Called with self._lock held
+        start_time = time.time()
+
+        spreadsheet = self._spreadsheets.get(sheet_id)
+        if spreadsheet is None:
+            spreadsheet = self._spreadsheets[sheet_id] = get_sheets_client().open_by_key(sheet_id)
+
+        metadata = spreadsheet.fetch_sheet_metadata()
+        for item in metadata.get("sheets", []):
+            properties = item["properties"]
+            self._worksheets[(sheet_id, properties["title"])] = Worksheet(
+                spreadsheet, properties, spreadsheet.id, spreadsheet.client
+            )
+
+        logger.info(
+            f"[TIMING] Resolved {len(metadata.get('sheets', []))} worksheets of {sheet_id} "
+            f"in {time.time() - start_time:.3f}s"
+        )
+
+
+worksheet_registry = WorksheetRegistry()
+
+
+def get_worksheet(sheet_id, title):
+    """Cached Worksheet handle - replaces client.open_by_key(sheet_id).worksheet(title)"""
+    return worksheet_registry.worksheet(sheet_id, title)
+
+
+def run_connectivity_diagnostics(sheet_id=None):
+    """
+    DNS, TCP and open_by_key probes that used to run before every
+    authentication. Kept for the health endpoint / debugging only.
+    """
+    results = {}
+
+    start_time = time.time()
+    try:
+        socket.gethostbyname('www.googleapis.com')
+        results['dns'] = {'ok': True}
+    except Exception as e:
+        results['dns'] = {'ok': False, 'error': str(e)}
+    results['dns']['seconds'] = round(time.time() - start_time, 3)
+
+    start_time = time.time()
+    try:
+        with socket.create_connection(('www.googleapis.com', 443), timeout=10):
+            results['tcp'] = {'ok': True}
+    except Exception as e:
+        results['tcp'] = {'ok': False, 'error': str(e)}
+    results['tcp']['seconds'] = round(time.time() - start_time, 3)
+
+    if sheet_id:
+        start_time = time.time()
+        try:
+            spreadsheet = get_sheets_client().open_by_key(sheet_id)
+            results['spreadsheet'] = {'ok': True, 'title': spreadsheet.title}
+        except Exception as e:
+            results['spreadsheet'] = {'ok': False, 'error': str(e)}
+        results['spreadsheet']['seconds'] = round(time.time() - start_time, 3)
+
+    logger.info(f"Google Sheets connectivity diagnostics: {results}")
+    return results
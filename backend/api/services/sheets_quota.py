@@ -0,0 +1,203 @@
+# E:\study\techfix\backend\api\services\sheets_quota.py
+"""
+Google Sheets quota accounting and rate limiting.
+
+Google limits Sheets calls per minute, separately for reads and writes,
+and answers 429 above that. Every call made through SheetsHTTPClient takes
+a token from the read or write bucket first; when a bucket is empty the
+call waits (queues) for the next token instead of failing, bounded by the
+thread's sheets_deadline(). A 429 empties the bucket so the calls behind
+it back off too.
+
+Counters (calls per endpoint and per view/command, throttled waits, 429s)
+are kept per process and shown by the health endpoint.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------
+# TOKEN BUCKET
+# -----------------------
+
+class TokenBucket:
+    """`rate_per_minute` tokens per minute, at most `capacity` saved up. Thread-safe."""
+
+    def __init__(self, rate_per_minute, capacity):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, timeout=None):
+        """
+        Take one token, sleeping until it is available. Callers queue in
+        arrival order (the balance goes negative). Returns the seconds
+        waited, or None - without taking a token - if that would exceed
+        `timeout`.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if timeout is not None and wait > timeout:
+                self._tokens += 1
+                return None
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def available(self):
+        """Tokens available now (negative while callers are queued)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def drain(self):
+        """Google said 429: nothing left for this minute's share"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+
+# -----------------------
+# ACCOUNTING
+# -----------------------
+
+_scope = threading.local()
+
+
+@contextmanager
+def quota_scope(name):
+    """Attribute the Sheets calls made by this thread inside the block to `name` (a view or command)"""
+    outer = getattr(_scope, "name", None)
+    _scope.name = name
+    try:
+        yield
+    finally:
+        _scope.name = outer
+
+
+def set_scope(name):
+    """Like quota_scope() for code that cannot wrap the calls in a block (middleware process_view)"""
+    _scope.name = name
+
+
+def current_scope():
+    return getattr(_scope, "name", None) or "background"
+
+
+@contextmanager
+def count_calls():
+    """
+    Count the Sheets calls this thread makes inside the block. Yields a
+    Counter (endpoint -> calls); calls from other threads are not in it.
+    """
+    outer = getattr(_scope, "counters", ())
+    counter = Counter()
+    _scope.counters = outer + (counter,)
+    try:
+        yield counter
+    finally:
+        _scope.counters = outer
+
+
+def endpoint_name(method, endpoint):
+    """Short, id-free name of a Sheets/Drive API endpoint for the counters"""
+    if "/drive/" in endpoint:
+        return "drive.files.get"
+    path = endpoint.split("/spreadsheets/", 1)[-1].split("?", 1)[0]
+    if ":batchGet" in path:
+        return "values.batchGet"
+    if ":batchUpdate" in path:
+        return "values.batchUpdate" if "/values" in path else "spreadsheets.batchUpdate"
+    if path.endswith(":append"):
+        return "values.append"
+    if "/values/" in path:
+        return "values.get" if method.upper() == "GET" else "values.update"
+    return "spreadsheets.get"
+
+
+class SheetsQuota:
+    """Read/write buckets plus per-process counters"""
+
+    def __init__(self, reads_per_minute, writes_per_minute, burst):
+        self.buckets = {
+            'read': TokenBucket(reads_per_minute, burst),
+            'write': TokenBucket(writes_per_minute, burst),
+        }
+        self._lock = threading.Lock()
+        self._calls = Counter()          # endpoint -> calls
+        self._calls_by_scope = Counter() # view/command -> calls
+        self._throttled = Counter()      # read/write -> calls that had to wait
+        self._throttled_seconds = 0.0
+        self._rate_limited = Counter()   # endpoint -> 429 responses
+
+    @staticmethod
+    def call_class(method):
+        return 'read' if method.upper() == 'GET' else 'write'
+
+    def before_call(self, method, endpoint, timeout=None):
+        """Wait for a token; returns False if none is available within `timeout` seconds"""
+        call_class = self.call_class(method)
+        waited = self.buckets[call_class].acquire(timeout)
+        if waited is None:
+            return False
+
+        name = endpoint_name(method, endpoint)
+        scope = current_scope()
+        with self._lock:
+            self._calls[name] += 1
+            self._calls_by_scope[scope] += 1
+            if waited:
+                self._throttled[call_class] += 1
+                self._throttled_seconds += waited
+        for counter in getattr(_scope, "counters", ()):
+            counter[name] += 1
+        if waited:
+            logger.info(f"[QUOTA] {name} from {scope} waited {waited:.2f}s for a {call_class} token")
+        return True
+
+    def record_rate_limited(self, method, endpoint):
+        name = endpoint_name(method, endpoint)
+        self.buckets[self.call_class(method)].drain()
+        with self._lock:
+            self._rate_limited[name] += 1
+        logger.warning(f"[QUOTA] Google returned 429 for {name} from {current_scope()}")
+
+    def headroom(self):
+        """Share of the burst left in the tighter bucket, 0.0 (exhausted or queued) to 1.0"""
+        return max(0.0, min(bucket.available() / bucket.capacity for bucket in self.buckets.values()))
+
+    def rate_limited_total(self):
+        with self._lock:
+            return sum(self._rate_limited.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': dict(self._calls),
+                'calls_by_scope': dict(self._calls_by_scope.most_common(20)),
+                'throttled': dict(self._throttled),
+                'throttled_seconds': round(self._throttled_seconds, 2),
+                'rate_limited': dict(self._rate_limited),
+            }
+
+
+sheets_quota = SheetsQuota(
+    reads_per_minute=getattr(settings, 'GOOGLE_SHEETS_READS_PER_MINUTE', 60),
+    writes_per_minute=getattr(settings, 'GOOGLE_SHEETS_WRITES_PER_MINUTE', 60),
+    burst=getattr(settings, 'GOOGLE_SHEETS_QUOTA_BURST', 10),
+)
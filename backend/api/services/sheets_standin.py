@@ -0,0 +1,368 @@
+# E:\study\techfix\backend\api\services\sheets_standin.py
+"""
+Local stand-in for the parts of the Google Sheets v4 / Drive v3 APIs this
+project uses, for offline load tests and benchmarks.
+
+Served endpoints (any spreadsheet id maps to the same in-memory workbook):
+
+    GET  /v4/spreadsheets/<id>                        metadata (open_by_key)
+    GET  /v4/spreadsheets/<id>/values/<range>         values get (get_all_values, row_values, find)
+    GET  /v4/spreadsheets/<id>/values:batchGet        values batchGet (projections)
+    PUT  /v4/spreadsheets/<id>/values/<range>         values update (update_cell)
+    POST /v4/spreadsheets/<id>/values:batchUpdate     values batchUpdate (SheetWriteBatch)
+    POST /v4/spreadsheets/<id>/values/<range>:append  values append
+    GET  /drive/v3/files/<id>                         modifiedTime (Tracking revision probe)
+
+Latency, random 5xx errors and a per-minute quota (429) can be injected.
+Start it with `manage.py sheets_standin` and point the app at it with
+GOOGLE_SHEETS_STANDIN_URL; SheetsHTTPClient then sends every call there.
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------
+# WORKBOOK
+# -----------------------
+
+_RANGE_RE = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def _column_number(letters):
+    # a1_to_rowcol("C1") -> (1, 3)
+    return a1_to_rowcol(f"{letters}1")[1]
+
+
+def _format_value(value):
+    # USER_ENTERED numbers come back formatted as text, like the real API
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "" if value is None else str(value)
+
+
+class StandinWorkbook:
+    """Worksheets as lists of rows of strings, safe to share between handler threads"""
+
+    def __init__(self, sheets):
+        self._lock = threading.Lock()
+        self.sheets = {title: [list(map(_format_value, row)) for row in rows] for title, rows in sheets.items()}
+        self.modified_at = datetime.now(timezone.utc)
+
+    def _parse(self, range_name):
+        """'Tracking'!B2:B100 -> (title, row1, col1, row2, col2); open ends are None"""
+        if "!" in range_name:
+            title, a1 = range_name.rsplit("!", 1)
+        else:
+            title, a1 = range_name, ""
+        if title.startswith("'") and title.endswith("'"):
+            title = title[1:-1].replace("''", "'")
+        if title not in self.sheets:
+            raise KeyError(f"Unable to parse range: {range_name}")
+
+        match = _RANGE_RE.match(a1.upper())
+        if not match:
+            raise KeyError(f"Unable to parse range: {range_name}")
+        c1, r1, c2, r2 = match.groups()
+        if match.group(3) is None and match.group(4) is None:
+            # Single cell ("G2") or whole sheet ("")
+            c2, r2 = c1, r1
+
+        return (
+            title,
+            int(r1) if r1 else 1,
+            _column_number(c1) if c1 else 1,
+            int(r2) if r2 else None,
+            _column_number(c2) if c2 else None,
+        )
+
+    def get(self, range_name):
+        title, r1, c1, r2, c2 = self._parse(range_name)
+        with self._lock:
+            rows = self.sheets[title]
+            last_row = len(rows) if r2 is None else min(r2, len(rows))
+            values = []
+            for row in rows[r1 - 1:last_row]:
+                cells = row[c1 - 1:(c2 if c2 is not None else len(row))]
+                while cells and cells[-1] == "":
+                    cells.pop()
+                values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+
+        result = {"range": range_name, "majorDimension": "ROWS"}
+        if values:
+            result["values"] = values
+        return result
+
+    def update(self, range_name, values):
+        title, r1, c1, _, _ = self._parse(range_name)
+        with self._lock:
+            rows = self.sheets[title]
+            for r, value_row in enumerate(values):
+                while len(rows) < r1 + r:
+                    rows.append([])
+                row = rows[r1 - 1 + r]
+                for c, value in enumerate(value_row):
+                    while len(row) < c1 + c:
+                        row.append("")
+                    row[c1 - 1 + c] = _format_value(value)
+            self.modified_at = datetime.now(timezone.utc)
+
+        end = rowcol_to_a1(r1 + max(len(values), 1) - 1, c1 + max(map(len, values), default=1) - 1)
+        return {
+            "updatedRange": f"'{title}'!{rowcol_to_a1(r1, c1)}:{end}",
+            "updatedRows": len(values),
+            "updatedCells": sum(map(len, values)),
+        }
+
+    def append(self, range_name, values):
+        title = self._parse(range_name)[0]
+        with self._lock:
+            rows = self.sheets[title]
+            while rows and not any(rows[-1]):
+                rows.pop()
+            start = len(rows) + 1
+        return {"tableRange": f"'{title}'", "updates": self.update(f"'{title}'!A{start}", values)}
+
+    def metadata(self, spreadsheet_id):
+        with self._lock:
+            sheets = [
+                {"properties": {
+                    "sheetId": index,
+                    "title": title,
+                    "index": index,
+                    "sheetType": "GRID",
+                    "gridProperties": {
+                        "rowCount": max(1000, len(rows)),
+                        "columnCount": max([26, *map(len, rows)]),
+                    },
+                }}
+                for index, (title, rows) in enumerate(self.sheets.items())
+            ]
+        return {
+            "spreadsheetId": spreadsheet_id,
+            "properties": {"title": "TechFix stand-in", "locale": "en_US", "timeZone": "Asia/Kolkata"},
+            "sheets": sheets,
+        }
+
+    def drive_metadata(self, spreadsheet_id):
+        return {
+            "id": spreadsheet_id,
+            "name": "TechFix stand-in",
+            "createdTime": "2025-01-01T00:00:00.000Z",
+            "modifiedTime": self.modified_at.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        }
+
+
+# -----------------------
+# SYNTHETIC DATA
+# -----------------------
+
+TRACKING_HEADER = [
+    "S.NO", "COMPLAINT NO", "CUSTOMER NAME", "PHONE", "ADDRESS", "AREA", "BRAND", "PRODUCT CODE",
+    "MODEL", "PART NAME", "QTY", "COMPLAINT STATUS", "PENDING DAYS", "ASSIGNED ON", "TECHNICIAN",
+    "CLOSED ON", "REMARKS", "DEALER", "WARRANTY", "MRP", "AMOUNT", "INVOICE", "CALL TYPE", "CC REMARKS",
+]
+MRP_LIST_HEADER = ["S.NO", "SPARE CODE", "DESCRIPTION", "MRP", "HSN", "BRAND", "QTY"]
+TECHNICIAN_STOCKS_HEADER = ["SPARE NAME", "SPARE CODE", "QTY", "TECHNICIAN"]
+
+_AREAS = ["Anna Nagar", "T Nagar", "Velachery", "Tambaram", "Porur", "Adyar", "Guindy", "Perambur"]
+_BRANDS = ["PARRYWARE", "HINDWARE", "CERA", "JAQUAR"]
+_PARTS = ["Diverter Knob", "Flush Valve", "Seat Cover", "Angle Valve", "Health Faucet", "Cartridge", "Spout", "Waste Coupling"]
+
+
+def build_synthetic_workbook(tracking_rows=5000, products=800, technicians=40, seed=1):
+    """
+    Reproducible "Tracking", "Mrp List" and "Technician Stocks" worksheets
+    shaped like the production spreadsheet (same columns, complaint number
+    format, statuses and CC remarks).
+    """
+    rng = random.Random(seed)
+    tech_names = [f"TECH{n:02d}" for n in range(1, technicians + 1)]
+
+    mrp_list = [MRP_LIST_HEADER]
+    for n in range(1, products + 1):
+        mrp_list.append([
+            n, f"455{n:05d}", f"{rng.choice(_PARTS)} {n}", rng.randint(50, 5000),
+            rng.choice(["7308", "8481", "3922"]), rng.choice(_BRANDS), rng.randint(0, 200),
+        ])
+
+    tech_stocks = [TECHNICIAN_STOCKS_HEADER]
+    for tech in tech_names:
+        for item in rng.sample(mrp_list[1:], min(20, products)):
+            tech_stocks.append([item[2], item[1], rng.randint(0, 15), tech.lower()])
+
+    tracking = [TRACKING_HEADER]
+    start = date.today() - timedelta(days=180)
+    per_day = {}
+    for n in range(1, tracking_rows + 1):
+        day = start + timedelta(days=(n * 180) // max(tracking_rows, 1))
+        per_day[day] = per_day.get(day, 0) + 1
+        item = rng.choice(mrp_list[1:])
+        status = rng.choice(["PENDING", "CLOSED", "CLOSED"])
+        row = [""] * len(TRACKING_HEADER)
+        row[0] = n
+        row[1] = f"PCOTH/{day.strftime('%d%m%y')}/{per_day[day]:02d}"
+        row[2] = f"Customer {n}"
+        row[3] = f"9{rng.randint(100000000, 999999999)}"
+        row[5] = rng.choice(_AREAS)
+        row[6] = item[5]
+        row[7] = item[1]
+        row[9] = item[2]
+        row[10] = rng.randint(1, 3)
+        row[11] = status
+        row[12] = (date.today() - day).days
+        row[14] = rng.choice(tech_names)
+        if status == "CLOSED":
+            row[15] = (day + timedelta(days=rng.randint(0, 10))).strftime("%d-%b-%Y")
+        row[19] = item[3]
+        row[23] = rng.choice(["", "", "", "STOCK OUT", "ORDERED", "RECEIVED"])
+        tracking.append(row)
+
+    return StandinWorkbook({
+        "Tracking": tracking,
+        "Mrp List": mrp_list,
+        "Technician Stocks": tech_stocks,
+    })
+
+
+# -----------------------
+# HTTP SERVER
+# -----------------------
+
+class FaultInjector:
+    """Latency, random server errors and a rolling per-minute quota"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, quota_per_minute=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.quota_per_minute = quota_per_minute
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._calls = deque()
+
+    def before_request(self):
+        """Sleep for the injected latency; returns (status, message) for an injected failure or None"""
+        with self._lock:
+            delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+            fail = self.error_rate and self._rng.random() < self.error_rate
+
+            over_quota = False
+            if self.quota_per_minute:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] > 60:
+                    self._calls.popleft()
+                over_quota = len(self._calls) >= self.quota_per_minute
+                if not over_quota:
+                    self._calls.append(now)
+
+        if delay:
+            time.sleep(delay / 1000)
+        if over_quota:
+            return 429, "Quota exceeded for quota metric 'Read requests' (stand-in)"
+        if fail:
+            return 503, "The service is currently unavailable (stand-in)"
+        return None
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    workbook = None
+    faults = None
+
+    # Paths: /v4/spreadsheets/<id>[/values/<range>[:append] | /values:batchGet | /values:batchUpdate]
+    #        /drive/v3/files/<id>
+    _SHEETS_RE = re.compile(r"^/v4/spreadsheets/([^/:]+)(.*)$")
+    _DRIVE_RE = re.compile(r"^/drive/v3/files/([^/]+)$")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        failure = self.faults.before_request()
+        if failure:
+            return self._error(*failure)
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        body = self._body() if method in ("PUT", "POST") else {}
+        try:
+            drive = self._DRIVE_RE.match(url.path)
+            if drive and method == "GET":
+                return self._json(self.workbook.drive_metadata(drive.group(1)))
+
+            sheets = self._SHEETS_RE.match(url.path)
+            if not sheets:
+                return self._error(404, f"Unknown endpoint {url.path}")
+            spreadsheet_id, rest = sheets.group(1), unquote(sheets.group(2))
+
+            if rest == "" and method == "GET":
+                return self._json(self.workbook.metadata(spreadsheet_id))
+            if rest == "/values:batchGet" and method == "GET":
+                return self._json({
+                    "spreadsheetId": spreadsheet_id,
+                    "valueRanges": [self.workbook.get(r) for r in query.get("ranges", [])],
+                })
+            if rest == "/values:batchUpdate" and method == "POST":
+                responses = [self.workbook.update(d["range"], d.get("values", [])) for d in body.get("data", [])]
+                return self._json({
+                    "spreadsheetId": spreadsheet_id,
+                    "totalUpdatedCells": sum(r["updatedCells"] for r in responses),
+                    "responses": responses,
+                })
+            if rest.startswith("/values/") and rest.endswith(":append") and method == "POST":
+                result = self.workbook.append(rest[len("/values/"):-len(":append")], body.get("values", []))
+                return self._json({"spreadsheetId": spreadsheet_id, **result})
+            if rest.startswith("/values/") and method == "GET":
+                return self._json(self.workbook.get(rest[len("/values/"):]))
+            if rest.startswith("/values/") and method == "PUT":
+                result = self.workbook.update(rest[len("/values/"):], body.get("values", []))
+                return self._json({"spreadsheetId": spreadsheet_id, **result})
+            return self._error(404, f"Unsupported call {method} {url.path}")
+        except KeyError as e:
+            return self._error(400, str(e.args[0]))
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message):
+        # Same error envelope as Google, so gspread raises a proper APIError
+        self._json({"error": {"code": status, "message": message, "status": "STANDIN_ERROR"}}, status)
+
+    def log_message(self, format, *args):
+        logger.debug(f"[standin] {self.address_string()} {format % args}")
+
+
+def make_server(workbook, host="127.0.0.1", port=8765, faults=None):
+    handler = type("BoundStandinHandler", (StandinHandler,), {
+        "workbook": workbook,
+        "faults": faults or FaultInjector(),
+    })
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,137 @@
+# E:\study\techfix\backend\api\services\tracking_mirror.py
+import hashlib
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import TrackingRow, TrackingSyncState
+from .sheet_records import TrackingRecord
+
+logger = logging.getLogger(__name__)
+
+# Fields rewritten when a row's content hash changes
+UPDATE_FIELDS = [
+    'complaint_no', 'complaint_date', 'technician', 'status', 'cc_remarks',
+    'district', 'product_code', 'mrp', 'values', 'row_hash', 'synced_at',
+]
+
+BULK_BATCH_SIZE = 500
+
+
+def _row_hash(row):
+    return hashlib.sha1("\x1f".join(row).encode("utf-8")).hexdigest()
+
+
+def build_tracking_row(record, row_hash=None):
+    """Map one TrackingRecord to a TrackingRow"""
+    values = record.to_row()
+    return TrackingRow(
+        sheet_row=record.sheet_row,
+        complaint_no=record.complaint_no.strip(),
+        complaint_date=record.complaint_date,
+        technician=record.technician_key,
+        status=record.status_key,
+        cc_remarks=record.cc_remarks_key,
+        district=record.district.strip(),
+        product_code=record.product_code.strip(),
+        mrp=record.mrp.strip(),
+        values=values,
+        row_hash=row_hash or _row_hash(values),
+        synced_at=timezone.now(),
+    )
+
+
+def sync_tracking_rows(records, revision=None):
+    """
+    Upsert the Tracking records (sheet rows 2..n, in order) into the mirror.
+    Only rows whose content hash changed are written; rows past the end of
+    the sheet are deleted.
+    """
+    start_time = time.time()
+
+    existing = dict(TrackingRow.objects.values_list('sheet_row', 'row_hash'))
+
+    changed = []
+    for record in records:
+        row_hash = _row_hash(record.to_row())
+        if existing.get(record.sheet_row) == row_hash:
+            continue
+        changed.append(build_tracking_row(record, row_hash))
+
+    last_row = len(records) + 1
+
+    with transaction.atomic():
+        for i in range(0, len(changed), BULK_BATCH_SIZE):
+            TrackingRow.objects.bulk_create(
+                changed[i:i + BULK_BATCH_SIZE],
+                update_conflicts=True,
+                unique_fields=['sheet_row'],
+                update_fields=UPDATE_FIELDS,
+            )
+
+        deleted, _ = TrackingRow.objects.filter(sheet_row__gt=last_row).delete()
+
+        TrackingSyncState.objects.update_or_create(
+            pk=1,
+            defaults={
+                'last_synced_at': timezone.now(),
+                'row_count': len(records),
+                'revision': revision or '',
+            }
+        )
+
+    duration = time.time() - start_time
+    logger.info(
+        f"Tracking mirror synced: {len(changed)} upserted, {deleted} deleted, "
+        f"{len(records)} total - Duration: {duration:.2f}s"
+    )
+    return {
+        'total': len(records),
+        'upserted': len(changed),
+        'deleted': deleted,
+        'duration': round(duration, 3),
+    }
+
+
+def mirror_is_fresh():
+    """True when the mirror is enabled and was synced recently enough to serve reads"""
+    if not getattr(settings, 'TRACKING_MIRROR_ENABLED', False):
+        return False
+
+    try:
+        state = TrackingSyncState.objects.filter(pk=1).only('last_synced_at').first()
+    except Exception as e:
+        logger.warning(f"Could not read Tracking mirror state: {e}")
+        return False
+
+    if not state or not state.last_synced_at:
+        return False
+
+    max_lag = timedelta(seconds=getattr(settings, 'TRACKING_MIRROR_MAX_LAG', 300))
+    return timezone.now() - state.last_synced_at <= max_lag
+
+
+def apply_tracking_write(sheet_row, updates):
+    """
+    Patch a mirrored row after this process wrote to the sheet, so the next
+    list request reflects the change without waiting for sync_tracking.
+    `updates` maps 1-based sheet column -> new value.
+    """
+    if not getattr(settings, 'TRACKING_MIRROR_ENABLED', False):
+        return
+
+    tracking_row = TrackingRow.objects.filter(sheet_row=sheet_row).first()
+    if not tracking_row:
+        return
+
+    record = TrackingRecord(sheet_row, tracking_row.values).with_cells(
+        {column - 1: str(value) for column, value in updates.items()}
+    )
+
+    patched = build_tracking_row(record)
+    patched.pk = tracking_row.pk
+    patched.save()
@@ -0,0 +1,113 @@
+# E:\study\techfix\backend\api\services\tracking_queries.py
+"""
+Read/write entry points for Tracking data used by the views.
+
+Reads are answered from the Postgres mirror when it is enabled and fresh
+(indexed queries), otherwise from the shared in-memory snapshot. Both paths
+return TrackingRecords so the views format responses the same way
+regardless of the source.
+"""
+import logging
+
+from ..models import TrackingRow
+from .sheet_records import TrackingRecord
+from .tracking_mirror import mirror_is_fresh, apply_tracking_write
+from .tracking_snapshot import tracking_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def find_tracking_rows(technician=None, status=None, cc_remarks=None, date_from=None, date_to=None):
+    """
+    TrackingRecords matching all given filters, in sheet order.
+
+    technician / status / cc_remarks are compared case-insensitively after
+    stripping. date_from / date_to (date objects, inclusive) filter on the
+    date embedded in the complaint number; rows without one are excluded
+    whenever a date filter is given.
+    """
+    technician = technician.strip().upper() if technician is not None else None
+    status = status.strip().upper() if status is not None else None
+    cc_remarks = cc_remarks.strip().upper() if cc_remarks is not None else None
+
+    if mirror_is_fresh():
+        return _rows_from_mirror(technician, status, cc_remarks, date_from, date_to)
+    return _rows_from_snapshot(technician, status, cc_remarks, date_from, date_to)
+
+
+def _rows_from_mirror(technician, status, cc_remarks, date_from, date_to):
+    queryset = TrackingRow.objects.all()
+    if technician is not None:
+        queryset = queryset.filter(technician=technician)
+    if status is not None:
+        queryset = queryset.filter(status=status)
+    if cc_remarks is not None:
+        queryset = queryset.filter(cc_remarks=cc_remarks)
+    if date_from:
+        queryset = queryset.filter(complaint_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(complaint_date__lte=date_to)
+    return [
+        TrackingRecord(sheet_row, values)
+        for sheet_row, values in queryset.order_by('sheet_row').values_list('sheet_row', 'values')
+    ]
+
+
+def _rows_from_snapshot(technician, status, cc_remarks, date_from, date_to):
+    index = tracking_snapshot.get_index()
+    return index.find(technician, status, cc_remarks, date_from, date_to)
+
+
+class ComplaintNotFound(LookupError):
+    """Complaint number is not present in column B of the Tracking sheet"""
+
+
+def locate_complaint_row(sheet, complaint_no):
+    """
+    Find a complaint on the Tracking worksheet `sheet` before writing to it.
+
+    The row number comes from the snapshot index and is confirmed with a
+    single row_values() read, which the callers need anyway. If the index is
+    stale (rows inserted/removed since the last load) we drop the snapshot
+    and fall back to sheet.find(). Returns (sheet_row, TrackingRecord); raises
+    ComplaintNotFound when the complaint is not on the sheet.
+    """
+    complaint_no = complaint_no.strip()
+
+    row_index = tracking_snapshot.get_index().row_by_complaint.get(complaint_no)
+    if row_index:
+        row = sheet.row_values(row_index)
+        if len(row) > 1 and row[1].strip() == complaint_no:
+            return row_index, TrackingRecord(row_index, row)
+        logger.info(f"Tracking index stale for {complaint_no} (row {row_index}), searching sheet")
+        tracking_snapshot.invalidate()
+
+    cell = sheet.find(complaint_no, in_column=2)
+    if cell is None:
+        raise ComplaintNotFound(complaint_no)
+    return cell.row, TrackingRecord(cell.row, sheet.row_values(cell.row))
+
+
+def complaint_on_sheet(complaint_no):
+    """
+    True if the complaint is in column B of the Tracking sheet, from the
+    snapshot index. A miss is re-checked against a revalidated snapshot, so
+    a complaint added since the last load is found.
+    """
+    complaint_no = complaint_no.strip()
+    if complaint_no in tracking_snapshot.get_index().row_by_complaint:
+        return True
+    return complaint_no in tracking_snapshot.get_index(max_age=0).row_by_complaint
+
+
+def record_tracking_write(sheet_row, updates):
+    """
+    Call after writing cells of a Tracking row. `updates` maps 1-based sheet
+    column -> value. Keeps both read paths consistent with the write.
+    """
+    tracking_snapshot.apply_write(sheet_row, updates)
+    try:
+        apply_tracking_write(sheet_row, updates)
+    except Exception as e:
+        # The next sync_tracking run will pick the change up anyway
+        logger.warning(f"Could not patch Tracking mirror row {sheet_row}: {e}")
@@ -0,0 +1,430 @@
+# E:\study\techfix\backend\api\services\tracking_snapshot.py
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from gspread.utils import absolute_range_name
+
+from .read_policy import (
+    SheetsUnavailable, SingleFlightTimeout, is_upstream_failure, note_served, refresh_in_background,
+)
+from .sheet_projection import SheetProjection, fetch_projected
+from .sheet_records import TrackingRecord, parse_complaint_date  # noqa: F401 - re-exported
+from .sheets_client import get_sheets_client
+
+logger = logging.getLogger(__name__)
+
+
+# Every Tracking column the views, the mirror and ComplaintProcessor read:
+# A-D, F-H, J-M, O-P, T, X. The rest of the sheet is never downloaded.
+TRACKING_COLUMNS = [0, 1, 2, 3, 5, 6, 7, 9, 10, 11, 12, 14, 15, 19, 23]
+TRACKING_PROJECTION = SheetProjection("Tracking", TRACKING_COLUMNS)
+
+
+# Cells re-checked on recent rows during an incremental refresh:
+# complaint no. (B, detects moved rows), status (L), updated by (M), CC remarks (X)
+WINDOW_COLUMNS = [1, 11, 12, 23]
+
+
+class StructuralChange(Exception):
+    """Known Tracking rows no longer line up with the sheet - needs a full reload"""
+
+
+def _cell(row, index):
+    return row[index] if row is not None and len(row) > index else ""
+
+
+# TrackingRecord field held in each window column
+_WINDOW_FIELDS = {index: name for name, index in TrackingRecord.COLUMNS.items() if index in WINDOW_COLUMNS}
+
+
+def _source_title(source):
+    return source.title if isinstance(source, SheetProjection) else source
+
+
+class TrackingIndex:
+    """
+    Lookup tables over one immutable list of TrackingRecords.
+
+    Built once per snapshot load so list endpoints do not strip/upper/strptime
+    every row on every request. All lookups return record positions (0-based
+    into `records`) in sheet order; sheet row number = position + 2.
+    """
+
+    def __init__(self, header, records):
+        self.header = header
+        self.records = records
+
+        self.by_technician = {}    # O
+        self.by_status = {}        # L
+        self.by_cc_remarks = {}    # X
+        self.row_by_complaint = {}
+
+        dated = []
+        for pos, record in enumerate(records):
+            self.by_technician.setdefault(record.technician_key, []).append(pos)
+            self.by_status.setdefault(record.status_key, []).append(pos)
+            self.by_cc_remarks.setdefault(record.cc_remarks_key, []).append(pos)
+
+            complaint_no = record.complaint_no.strip()
+            if complaint_no:
+                # First occurrence wins, same as sheet.find()
+                self.row_by_complaint.setdefault(complaint_no, record.sheet_row)
+            if record.complaint_date:
+                dated.append((record.complaint_date.toordinal(), pos))
+
+        dated.sort()
+        self._date_keys = [ordinal for ordinal, _ in dated]
+        self._date_positions = [pos for _, pos in dated]
+
+    @classmethod
+    def from_rows(cls, header, rows):
+        """Index raw data rows (header excluded, the first one is sheet row 2)"""
+        return cls(header, [TrackingRecord(pos + 2, row) for pos, row in enumerate(rows)])
+
+    def positions_in_date_range(self, date_from=None, date_to=None):
+        """Positions of records whose complaint date is within [date_from, date_to], unordered"""
+        lo = bisect_left(self._date_keys, date_from.toordinal()) if date_from else 0
+        hi = bisect_right(self._date_keys, date_to.toordinal()) if date_to else len(self._date_keys)
+        return self._date_positions[lo:hi]
+
+    def find(self, technician=None, status=None, cc_remarks=None, date_from=None, date_to=None):
+        """
+        Rows matching all given filters (already normalised: stripped and
+        upper-cased), in sheet order. Starts from the smallest candidate list
+        and intersects the rest.
+        """
+        candidates = []
+        if technician is not None:
+            candidates.append(self.by_technician.get(technician, []))
+        if status is not None:
+            candidates.append(self.by_status.get(status, []))
+        if cc_remarks is not None:
+            candidates.append(self.by_cc_remarks.get(cc_remarks, []))
+        if date_from or date_to:
+            candidates.append(self.positions_in_date_range(date_from, date_to))
+
+        if not candidates:
+            return list(self.records)
+
+        candidates.sort(key=len)
+        positions = candidates[0]
+        for other in candidates[1:]:
+            if not positions:
+                break
+            other = set(other)
+            positions = [pos for pos in positions if pos in other]
+
+        return [self.records[pos] for pos in sorted(positions)]
+
+
+class TrackingSnapshot:
+    """
+    Process-wide shared copy of the "Tracking" worksheet.
+
+    Every Tracking view used to call get_all_values() on each request, so 40
+    technicians opening the app at once meant 40 downloads of the same
+    multi-thousand-row sheet. This holds one parsed copy per process:
+
+    - inside the TTL window rows are served straight from memory
+    - after the TTL we ask Drive for the spreadsheet's modifiedTime (a tiny
+      metadata call) and only re-download the sheet when it has changed
+    - if the revision probe is not available (403/404, e.g. Drive API not
+      enabled for the service account) we fall back to a plain TTL reload;
+      any other probe failure only skips probing for
+      TRACKING_REVISION_PROBE_RETRY seconds
+    - a reload is incremental: rows appended since the last load, plus the
+      status / updated-by / CC-remarks cells of the last few hundred rows,
+      come back in one small batchGet. The full sheet is re-read only on a
+      structural change (header moved, rows inserted/deleted/sorted in the
+      window) or every TRACKING_FULL_RELOAD_INTERVAL seconds
+    - past the TTL (up to TRACKING_STALE_MAX_AGE) the current copy is served
+      right away and refreshed in the background; if a refresh fails the
+      last good copy keeps being served, flagged as stale (read_policy)
+
+    Rows are held inside a TrackingIndex so the rows and their lookup tables
+    are always swapped together.
+    """
+
+    WORKSHEET = "Tracking"
+
+    def __init__(self, sheet_id=None, ttl=None):
+        self.sheet_id = sheet_id or settings.GOOGLE_SHEET_ID
+        self.ttl = ttl if ttl is not None else getattr(settings, 'TRACKING_SNAPSHOT_TTL', 60)
+
+        self.tail_window = getattr(settings, 'TRACKING_TAIL_WINDOW_ROWS', 500)
+        self.full_reload_interval = getattr(settings, 'TRACKING_FULL_RELOAD_INTERVAL', 900)
+        self.stale_max_age = getattr(settings, 'TRACKING_STALE_MAX_AGE', 3600)
+        self.refresh_wait = getattr(settings, 'SHEETS_SINGLE_FLIGHT_WAIT', 15)
+
+        self._lock = threading.Lock()
+        self._index = None
+        self._revision = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._full_loaded_at = 0.0
+        self._revision_probe_enabled = True
+        self.revision_probe_retry = getattr(settings, 'TRACKING_REVISION_PROBE_RETRY', 300)
+        self._revision_probe_paused_until = 0.0
+
+    # -----------------------
+    # PUBLIC API
+    # -----------------------
+
+    def get_rows(self, max_age=None):
+        """
+        Return the Tracking data rows (header excluded) as TrackingRecords.
+
+        The returned list is shared between requests - treat it as read-only.
+        Pass max_age=0 to force a revision check before returning.
+        """
+        return self._ensure_fresh(self.ttl if max_age is None else max_age).records
+
+    def get_index(self, max_age=None):
+        """Return the TrackingIndex for the current rows (read-only, shared)"""
+        return self._ensure_fresh(self.ttl if max_age is None else max_age)
+
+    def get_index_with(self, extra_sources, max_age=None):
+        """
+        Current index plus other worksheets (titles or SheetProjections).
+        When the Tracking rows have to be reloaded, the extra worksheets come
+        back in the same batchGet call. Returns (index, {title: rows}).
+        """
+        extras = {}
+        index = self._ensure_fresh(self.ttl if max_age is None else max_age, extra_sources, extras)
+
+        missing = [s for s in extra_sources if _source_title(s) not in extras]
+        if missing:
+            extras.update(fetch_projected(self.sheet_id, missing))
+        return index, extras
+
+    def get_header(self, max_age=None):
+        """Return the Tracking header row"""
+        return self._ensure_fresh(self.ttl if max_age is None else max_age).header
+
+    def apply_write(self, sheet_row, updates):
+        """
+        Patch one row after this process wrote to the sheet. `updates` maps
+        1-based sheet column -> value. The next refresh still re-checks the
+        sheet (incrementally), but readers see the write immediately.
+        """
+        with self._lock:
+            index = self._index
+            pos = sheet_row - 2
+            if index is None or not 0 <= pos < len(index.records):
+                return
+
+            records = list(index.records)
+            records[pos] = records[pos].with_cells(
+                {column - 1: str(value) for column, value in updates.items()}
+            )
+
+            self._index = TrackingIndex(index.header, records)
+            self._revision = None
+            self._checked_at = 0.0
+
+    def invalidate(self):
+        """Drop the cached copy, e.g. when the row layout no longer matches the sheet"""
+        with self._lock:
+            self._index = None
+            self._revision = None
+            self._checked_at = 0.0
+        logger.info("Tracking snapshot invalidated")
+
+    def stats(self):
+        """Small summary used for logging/health output"""
+        now = time.monotonic()
+        index = self._index
+        return {
+            'rows': len(index.records) if index is not None else 0,
+            'revision': self._revision,
+            'age_seconds': round(now - self._loaded_at, 1) if index is not None else None,
+            'revision_probe_enabled': self._revision_probe_enabled,
+            'revision_probe_paused': self._revision_probe_enabled and not self._probe_due(),
+        }
+
+    # -----------------------
+    # REFRESH LOGIC
+    # -----------------------
+
+    def _ensure_fresh(self, max_age, extra_sources=(), extras=None):
+        # Fast path without taking the lock. Read the index once so a
+        # concurrent invalidate() cannot hand us None halfway through.
+        index = self._index
+        if index is not None:
+            age = time.monotonic() - self._checked_at
+            if age < max_age:
+                note_served(self._data_age(), False)
+                return index
+            if max_age and not extra_sources and age < self.stale_max_age:
+                # Stale-while-revalidate: answer now, refresh off the request path
+                refresh_in_background("tracking_snapshot", lambda: self._refresh(self.ttl))
+                note_served(self._data_age(), True)
+                return index
+
+        try:
+            index = self._refresh(max_age, extra_sources, extras)
+        except Exception as e:
+            # max_age=0 callers asked for a revalidated copy - never hand them a stale one
+            index = self._index
+            if not max_age or index is None or not (isinstance(e, SheetsUnavailable) or is_upstream_failure(e)):
+                raise
+            age = self._data_age()
+            logger.warning(f"Tracking refresh failed, serving the last good snapshot ({age:.0f}s old): {e}")
+            note_served(age, True)
+            return index
+
+        note_served(self._data_age(), False)
+        return index
+
+    def _data_age(self):
+        # Seconds since the copy was last loaded from / confirmed against the sheet
+        return time.monotonic() - max(self._loaded_at, self._checked_at)
+
+    def _refresh(self, max_age, extra_sources=(), extras=None):
+        # One thread refreshes, concurrent callers wait (bounded) and reuse its result
+        if not self._lock.acquire(timeout=self.refresh_wait):
+            raise SingleFlightTimeout(f"Timed out after {self.refresh_wait}s waiting for the Tracking refresh in progress")
+        try:
+            now = time.monotonic()
+            if self._index is not None and now - self._checked_at < max_age:
+                return self._index
+
+            client = self._get_client()
+
+            if self._index is not None and self._probe_due():
+                revision = self._fetch_revision(client)
+                if revision is not None and revision == self._revision:
+                    self._checked_at = time.monotonic()
+                    logger.debug(f"Tracking snapshot unchanged (revision {revision}), keeping {len(self._index.records)} rows")
+                    return self._index
+            else:
+                revision = self._fetch_revision(client) if self._probe_due() else None
+
+            if self._index is not None and not extra_sources and self._incremental_due():
+                try:
+                    self._load_incremental(client, revision)
+                    return self._index
+                except StructuralChange as e:
+                    logger.info(f"Tracking incremental refresh not possible ({e}), doing a full reload")
+
+            self._load(revision, extra_sources, extras)
+            return self._index
+        finally:
+            self._lock.release()
+
+    def _incremental_due(self):
+        return time.monotonic() - self._full_loaded_at < self.full_reload_interval
+
+    def _load(self, revision, extra_sources=(), extras=None):
+        start_time = time.time()
+        results = fetch_projected(self.sheet_id, [TRACKING_PROJECTION, *extra_sources])
+        values = results.pop(self.WORKSHEET)
+        if extras is not None:
+            extras.update(results)
+
+        self._index = TrackingIndex.from_rows(values[0] if values else [], values[1:])
+        self._revision = revision
+        self._loaded_at = self._checked_at = self._full_loaded_at = time.monotonic()
+
+        logger.info(
+            f"Tracking snapshot loaded: {len(self._index.records)} rows, revision {revision} - "
+            f"Duration: {time.time() - start_time:.2f}s"
+        )
+
+    def _load_incremental(self, client, revision):
+        """
+        One batchGet: the header row, the window columns (B, L, M, X) of the
+        last `tail_window` known rows, and every projected column of the rows
+        appended after them. Raises StructuralChange when the known rows
+        cannot be trusted any more.
+        """
+        start_time = time.time()
+        index = self._index
+        known = len(index.records)
+        last_row = known + 1                                  # sheet row of the last known data row
+        window_start = max(2, last_row - self.tail_window + 1)
+
+        window_ranges = TRACKING_PROJECTION.ranges(window_start, last_row, columns=WINDOW_COLUMNS)
+        tail_ranges = TRACKING_PROJECTION.ranges(last_row + 1)
+        ranges = [absolute_range_name(self.WORKSHEET, "1:1"), *window_ranges, *tail_ranges]
+
+        value_ranges = client.http_client.values_batch_get(self.sheet_id, ranges).get("valueRanges", [])
+        if len(value_ranges) != len(ranges):
+            raise StructuralChange("unexpected batchGet response")
+
+        header = (value_ranges[0].get("values") or [[]])[0]
+        if not TRACKING_PROJECTION.header_matches(header):
+            raise StructuralChange("header changed")
+
+        window = TRACKING_PROJECTION.assemble(
+            value_ranges[1:1 + len(window_ranges)], columns=WINDOW_COLUMNS, check_header=False
+        )
+        tail = TRACKING_PROJECTION.assemble(value_ranges[1 + len(window_ranges):], check_header=False)
+
+        records = None
+        patched = 0
+        for offset in range(last_row - window_start + 1):
+            pos = window_start - 2 + offset
+            old = index.records[pos]
+            fresh = window[offset] if offset < len(window) else None
+            if _cell(fresh, 1) != old.complaint_no:
+                # Complaint numbers moved: rows were inserted, deleted or sorted
+                raise StructuralChange(f"row {pos + 2} now holds '{_cell(fresh, 1)}'")
+            changes = {
+                col: _cell(fresh, col) for col, field in _WINDOW_FIELDS.items()
+                if _cell(fresh, col) != getattr(old, field)
+            }
+            if changes:
+                if records is None:
+                    records = list(index.records)
+                records[pos] = old.with_cells(changes)
+                patched += 1
+
+        if tail:
+            records = (records if records is not None else list(index.records)) + [
+                TrackingRecord(last_row + 1 + i, row) for i, row in enumerate(tail)
+            ]
+
+        if records is not None:
+            self._index = TrackingIndex(index.header, records)
+        self._revision = revision
+        self._loaded_at = self._checked_at = time.monotonic()
+
+        logger.info(
+            f"Tracking snapshot refreshed incrementally: {len(tail)} new rows, {patched} patched "
+            f"(window {window_start}-{last_row}), revision {revision} - Duration: {time.time() - start_time:.2f}s"
+        )
+
+    def _probe_due(self):
+        return self._revision_probe_enabled and time.monotonic() >= self._revision_probe_paused_until
+
+    def _fetch_revision(self, client):
+        """
+        Cheap change marker: Drive modifiedTime of the spreadsheet.
+        Returns None when the probe fails. A 403/404 (Drive not reachable
+        with the current credentials) disables probing for good; any other
+        error only pauses it for revision_probe_retry seconds.
+        """
+        try:
+            metadata = client.http_client.get_file_drive_metadata(self.sheet_id)
+            return metadata.get('modifiedTime')
+        except Exception as e:
+            if not is_upstream_failure(e) and getattr(e, 'code', None) in (403, 404):
+                self._revision_probe_enabled = False
+                logger.warning(f"Tracking revision probe unavailable, falling back to TTL reloads: {e}")
+            else:
+                self._revision_probe_paused_until = time.monotonic() + self.revision_probe_retry
+                logger.warning(
+                    f"Tracking revision probe failed, skipping it for {self.revision_probe_retry}s: {e}"
+                )
+            return None
+
+    def _get_client(self):
+        return get_sheets_client()
+
+
+# Shared instance for the whole process
+tracking_snapshot = TrackingSnapshot()
@@ -1,3 +1,505 @@
-from django.test import TestCase
+import threading
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range
+
+from .models import ComplaintIntakeState, ProcessedComplaint, ProcessingJob, SheetMutation
+from .services import processing_jobs, sheet_outbox
+from .services.complaint_processor import ComplaintProcessor
+from .services.read_policy import (
+    CircuitBreaker, SheetsUnavailable, SingleFlight, SingleFlightTimeout, refresh_in_background,
+)
+from .services.sheets_client import SheetsHTTPClient
+from .services.sheets_quota import TokenBucket
+from .services.tracking_snapshot import TrackingIndex
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() advances monotonic()"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTestCase(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('api.services.sheets_quota.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bucket = TokenBucket(rate_per_minute=60, capacity=2)
+
+    def test_burst_then_queue(self):
+        self.assertEqual(self.bucket.acquire(), 0.0)
+        self.assertEqual(self.bucket.acquire(), 0.0)
+        self.assertEqual(self.bucket.acquire(), 1.0)
+        self.assertEqual(self.clock.slept, [1.0])
+
+    def test_timeout_does_not_take_a_token(self):
+        self.bucket.acquire()
+        self.bucket.acquire()
+        self.assertIsNone(self.bucket.acquire(timeout=0.5))
+        self.assertEqual(self.bucket.available(), 0.0)
+        self.assertEqual(self.clock.slept, [])
+
+    def test_refill_is_capped(self):
+        self.bucket.acquire()
+        self.clock.now += 600
+        self.assertEqual(self.bucket.available(), 2)
+
+    def test_drain_after_429(self):
+        self.bucket.drain()
+        self.assertEqual(self.bucket.available(), 0.0)
+        self.clock.now += 1
+        self.assertEqual(self.bucket.available(), 1.0)
+
+
+class CircuitBreakerTestCase(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('api.services.read_policy.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("test", failure_threshold=2, cooldown=30)
+
+    def open_breaker(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.stats()['state'], CircuitBreaker.OPEN)
+        with self.assertRaises(SheetsUnavailable):
+            self.breaker.before_call()
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.stats(), {'state': CircuitBreaker.CLOSED, 'failures': 1})
+
+    def test_half_open_lets_one_probe_through(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.stats()['state'], CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(SheetsUnavailable):
+            self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.stats()['state'], CircuitBreaker.CLOSED)
+        self.breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.stats()['state'], CircuitBreaker.OPEN)
+        self.clock.now += 29
+        with self.assertRaises(SheetsUnavailable):
+            self.breaker.before_call()
+
+    def test_rate_limited_probe_keeps_it_half_open(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.breaker.before_call()
+        self.breaker.record_neutral()
+        self.assertEqual(self.breaker.stats(), {'state': CircuitBreaker.HALF_OPEN, 'failures': 2})
+        self.breaker.before_call()
+
+    def test_retried_429_is_not_a_failure(self):
+        response = mock.Mock(status_code=429, ok=False)
+        response.json.return_value = {'error': {'code': 429, 'message': 'Quota exceeded', 'status': 'RESOURCE_EXHAUSTED'}}
+        session = mock.Mock(**{'request.return_value': response})
+        client = SheetsHTTPClient(auth=None, session=session)
+        with mock.patch('api.services.sheets_client.sheets_breaker', self.breaker), \
+                mock.patch('api.services.sheets_client.sheets_quota'):
+            with self.assertRaises(APIError):
+                client.request('get', 'https://sheets.googleapis.com/v4/spreadsheets/x/values/A1')
+        self.assertEqual(session.request.call_count, 3)
+        self.assertEqual(self.breaker.stats(), {'state': CircuitBreaker.CLOSED, 'failures': 0})
+
+
+class BackgroundRefreshTestCase(TestCase):
+    def test_thread_closes_its_db_connection(self):
+        closed = threading.Event()
+        connection = mock.Mock(**{'close.side_effect': closed.set})
+        with mock.patch('api.services.read_policy.connection', connection):
+            self.assertTrue(refresh_in_background('test-close', mock.Mock(side_effect=RuntimeError("down"))))
+            self.assertTrue(closed.wait(5))
+        self.assertTrue(refresh_in_background('test-close', mock.Mock()))
+
+
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = 0
+
+    def slow_fetch(self, result=None, error=None):
+        def fetch():
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            if error:
+                raise error
+            return result
+        return fetch
+
+    def run_leader(self, fetch, outcome):
+        def run():
+            try:
+                outcome['result'] = self.flight.run('key', fetch, wait=5)
+            except Exception as e:
+                outcome['error'] = e
+        leader = threading.Thread(target=run)
+        leader.start()
+        self.started.wait(5)
+        return leader
+
+    def test_concurrent_callers_share_one_fetch(self):
+        outcome = {}
+        leader = self.run_leader(self.slow_fetch(result=[1, 2]), outcome)
+        threading.Timer(0.1, self.release.set).start()
+        result = self.flight.run('key', self.slow_fetch(result='other'), wait=5)
+        leader.join(5)
+        self.assertEqual(self.calls, 1)
+        self.assertIs(result, outcome['result'])
+
+    def test_followers_get_the_leaders_error(self):
+        outcome = {}
+        leader = self.run_leader(self.slow_fetch(error=ValueError('boom')), outcome)
+        threading.Timer(0.1, self.release.set).start()
+        with self.assertRaisesMessage(ValueError, 'boom'):
+            self.flight.run('key', self.slow_fetch(result='other'), wait=5)
+        leader.join(5)
+        self.assertEqual(self.calls, 1)
+
+    def test_follower_gives_up_after_wait(self):
+        leader = self.run_leader(self.slow_fetch(result=1), {})
+        with self.assertRaises(SingleFlightTimeout):
+            self.flight.run('key', self.slow_fetch(result=2), wait=0.05)
+        self.release.set()
+        leader.join(5)
+
+    def test_next_call_fetches_again(self):
+        self.assertEqual(self.flight.run('key', lambda: 1, wait=1), 1)
+        self.assertEqual(self.flight.run('key', lambda: 2, wait=1), 2)
+
+
+def tracking_row(complaint_no, status, technician, cc_remarks=""):
+    row = [""] * 24
+    row[1], row[11], row[14], row[23] = complaint_no, status, technician, cc_remarks
+    return row
+
+
+class TrackingIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = TrackingIndex.from_rows(["header"], [
+            tracking_row("PC/010326/01", "CLOSED", "Amal"),
+            tracking_row("PC/050326/02", "PENDING", " amal ", "Spare needed"),
+            tracking_row("PC/020326/03", "closed", "Arun"),
+            tracking_row("", "CLOSED", "Amal"),
+            tracking_row("PC/010326/01", "CLOSED", "Arun"),
+        ])
+
+    def rows(self, records):
+        return [r.sheet_row for r in records]
+
+    def test_no_filters_returns_every_row(self):
+        self.assertEqual(self.rows(self.index.find()), [2, 3, 4, 5, 6])
+
+    def test_filters_are_intersected_in_sheet_order(self):
+        self.assertEqual(self.rows(self.index.find(technician="AMAL")), [2, 3, 5])
+        self.assertEqual(self.rows(self.index.find(technician="AMAL", status="CLOSED")), [2, 5])
+        self.assertEqual(self.rows(self.index.find(status="CLOSED", cc_remarks="SPARE NEEDED")), [])
+        self.assertEqual(self.rows(self.index.find(cc_remarks="SPARE NEEDED")), [3])
+
+    def test_date_range_is_inclusive(self):
+        found = self.index.find(date_from=date(2026, 3, 2), date_to=date(2026, 3, 5))
+        self.assertEqual(self.rows(found), [3, 4])
+        self.assertEqual(self.rows(self.index.find(status="CLOSED", date_to=date(2026, 3, 1))), [2, 6])
+
+    def test_unknown_value_matches_nothing(self):
+        self.assertEqual(self.index.find(technician="NOBODY"), [])
+
+    def test_first_occurrence_of_a_complaint_wins(self):
+        self.assertEqual(self.index.row_by_complaint["PC/010326/01"], 2)
+
+
+class FakeSheetsHTTP:
+    """In-memory "Mrp List" / "Technician Stocks" behind the values endpoints SheetWriteBatch uses"""
+
+    def __init__(self, company, technician):
+        self.sheets = {
+            "Mrp List": [["", "Spare Id", "Name", "Mrp", "Hsn", "Brand", "Qty"]]
+            + [["", spare_id, f"Part {spare_id}", "100", "", "", str(qty)] for spare_id, qty in company.items()],
+            "Technician Stocks": [["Name", "Spare Id", "Qty", "Technician"]]
+            + [[f"Part {spare_id}", spare_id, str(qty), name] for (name, spare_id), qty in technician.items()],
+        }
+        self.read_calls = 0
+        self.write_calls = 0
+        self.lose_response = False
+        self.on_read = None
+
+    @staticmethod
+    def _split(range_name):
+        title, a1 = range_name.rsplit("!", 1)
+        return title.strip("'"), a1_range_to_grid_range(a1)
+
+    def values_batch_get(self, sheet_id, ranges):
+        self.read_calls += 1
+        if self.on_read:
+            on_read, self.on_read = self.on_read, None
+            on_read()
+        value_ranges = []
+        for range_name in ranges:
+            title, grid = self._split(range_name)
+            start, end = grid['startColumnIndex'], grid['endColumnIndex']
+            value_ranges.append({"values": [row[start:end] for row in self.sheets[title]]})
+        return {"valueRanges": value_ranges}
+
+    def values_batch_update(self, sheet_id, body):
+        self.write_calls += 1
+        for value_range in body["data"]:
+            title, grid = self._split(value_range["range"])
+            row = self.sheets[title][grid['startRowIndex']]
+            for offset, value in enumerate(value_range["values"][0]):
+                row[grid['startColumnIndex'] + offset] = str(value)
+        if self.lose_response:
+            raise requests.Timeout("response lost")
+
+    def values_append(self, sheet_id, range_name, params, body):
+        self.write_calls += 1
+        self.sheets[range_name.strip("'")].extend([[str(v) for v in row] for row in body["values"]])
+
+    def company(self, spare_id):
+        return next(int(r[6]) for r in self.sheets["Mrp List"][1:] if r[1] == spare_id)
+
+    def technician(self, name, spare_id):
+        return next(
+            (int(r[2]) for r in self.sheets["Technician Stocks"][1:] if r[1] == spare_id and r[3] == name), None
+        )
+
+
+@override_settings(SHEET_OUTBOX_FLUSH_ON_COMMIT=False)
+class SheetOutboxTestCase(TestCase):
+    def setUp(self):
+        self.sheet = FakeSheetsHTTP({'S1': 10, 'S2': 3}, {('amal', 'S1'): 1})
+        client = mock.Mock(http_client=self.sheet)
+        patcher = mock.patch('courier_api.sheets_sync.get_sheets_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def statuses(self):
+        return list(SheetMutation.objects.order_by('id').values_list('status', flat=True))
+
+    def test_changes_to_one_cell_are_coalesced(self):
+        sheet_outbox.record_company_stock_change('S1', -2)
+        sheet_outbox.record_company_stock_change('S1', -3)
+        sheet_outbox.record_technician_stock_change('amal', 'S1', 2)
+        sheet_outbox.record_technician_stock_change('Amal', 'S1', 3)
+
+        result = sheet_outbox.flush_pending()
+        self.assertEqual((result['claimed'], result['applied']), (4, 4))
+        self.assertEqual(self.sheet.write_calls, 1)
+        self.assertEqual(self.sheet.company('S1'), 5)
+        self.assertEqual(self.sheet.technician('amal', 'S1'), 6)
+
+    def test_conflict_only_marks_its_own_rows(self):
+        sheet_outbox.record_company_stock_change('S2', -4)
+        sheet_outbox.record_company_stock_change('MISSING', -1)
+        sheet_outbox.record_company_stock_change('S1', -1)
+
+        result = sheet_outbox.flush_pending()
+        self.assertEqual((result['applied'], result['conflicts']), (1, 2))
+        self.assertEqual(self.statuses(), [SheetMutation.CONFLICT, SheetMutation.CONFLICT, SheetMutation.APPLIED])
+        self.assertEqual((self.sheet.company('S1'), self.sheet.company('S2')), (9, 3))
+
+    def test_retry_after_a_lost_response_does_not_apply_twice(self):
+        sheet_outbox.record_company_stock_change('S1', -2)
+        self.sheet.lose_response = True
+        self.assertEqual(sheet_outbox.flush_pending()['retrying'], 1)
+        self.assertEqual(self.sheet.company('S1'), 8)
+
+        self.sheet.lose_response = False
+        SheetMutation.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(sheet_outbox.flush_pending()['applied'], 1)
+        self.assertEqual(self.sheet.company('S1'), 8)
+        self.assertEqual(self.sheet.write_calls, 1)
+
+    def test_retry_after_an_edit_on_the_sheet_fails(self):
+        sheet_outbox.record_company_stock_change('S1', -2)
+        self.sheet.lose_response = True
+        sheet_outbox.flush_pending()
+        self.sheet.sheets["Mrp List"][1][6] = "50"
+
+        self.sheet.lose_response = False
+        SheetMutation.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(sheet_outbox.flush_pending()['failed'], 1)
+        self.assertEqual(self.sheet.company('S1'), 50)
+
+    def test_concurrent_flushes_keep_both_changes(self):
+        sheet_outbox.record_company_stock_change('S1', -2)
+
+        def other_process():
+            # Records and flushes while the first flush is between its read and its write
+            sheet_outbox.record_company_stock_change('S1', -3)
+            self.assertTrue(sheet_outbox.flush_pending()['busy'])
+        self.sheet.on_read = other_process
+
+        result = sheet_outbox.flush_pending()
+        self.assertEqual((result['claimed'], result['applied']), (2, 2))
+        self.assertEqual(self.sheet.company('S1'), 5)
+
+    def test_transfer_is_applied_or_refused_whole(self):
+        sheet_outbox.record_stock_transfer({'amal': {'S1': 2, 'S2': 4}})
+        self.assertEqual(sheet_outbox.flush_pending()['conflicts'], 4)
+        self.assertEqual((self.sheet.company('S1'), self.sheet.technician('amal', 'S1')), (10, 1))
+        self.assertIsNone(self.sheet.technician('amal', 'S2'))
+
+        sheet_outbox.record_stock_transfer({'amal': {'S1': 2, 'S2': 3}})
+        self.assertEqual(sheet_outbox.flush_pending()['applied'], 4)
+        self.assertEqual((self.sheet.company('S1'), self.sheet.company('S2')), (8, 0))
+        self.assertEqual((self.sheet.technician('amal', 'S1'), self.sheet.technician('amal', 'S2')), (3, 3))
+
+
+@override_settings(COMPLAINT_PROCESSING_SINCE_DATE='2026-03-01', COMPLAINT_INTAKE_LOOKBACK_DAYS=10)
+class IntakeWatermarkTestCase(TestCase):
+    def setUp(self):
+        self.index = TrackingIndex.from_rows(["header"], [
+            tracking_row("PC/200226/01", "CLOSED", "Amal"),     # row 2, before the floor
+            tracking_row("PC/050326/02", "CLOSED", "Amal"),     # row 3
+            tracking_row("PC/250326/03", "CLOSED", "Amal"),     # row 4
+            tracking_row("PC/260326/04", "PENDING", "Amal"),    # row 5
+            tracking_row("PC/010326/05", "CLOSED", "Arun"),     # row 6, added late with an old date
+        ])
+        self.processor = ComplaintProcessor()
+
+    def examined(self, since_date=None):
+        return [r.sheet_row for r in self.processor._intake_candidates(self.index, since_date, False)]
+
+    def test_first_run_starts_at_the_configured_date(self):
+        self.assertEqual(self.examined(), [3, 4, 6])
+        self.assertEqual(self.processor.intake_watermark, {'date': '2026-03-25', 'row': 6})
+
+    def test_later_run_examines_the_lookback_window_and_new_rows(self):
+        # The last run saw sheet rows up to 5
+        ComplaintIntakeState.objects.create(pk=1, watermark_date=date(2026, 3, 25), watermark_row=5)
+        self.assertEqual(self.examined(), [4, 6])
+        self.assertEqual(self.processor.intake_watermark, {'date': '2026-03-25', 'row': 6})
+
+    def test_explicit_since_date_is_examined_in_full(self):
+        ComplaintIntakeState.objects.create(pk=1, watermark_date=date(2026, 3, 25), watermark_row=6)
+        self.assertEqual(self.examined(date(2026, 2, 1)), [2, 3, 4, 6])
+        self.assertIsNotNone(self.processor.intake_watermark)
+        # Rows between the floor and a later since_date were not examined
+        self.assertEqual(self.examined(date(2026, 3, 10)), [4])
+        self.assertIsNone(self.processor.intake_watermark)
+
+    def test_unrecorded_complaint_holds_the_watermark_back(self):
+        self.examined()
+        ProcessedComplaint.objects.create(
+            complaint_no="PC/250326/03", technician_name="Amal", product_code="S1", part_name="", quantity_reduced=1,
+        )
+        self.processor.save_intake_watermark([{'complaint_no': "PC/050326/02"}, {'complaint_no': "PC/250326/03"}])
+        state = ComplaintIntakeState.objects.get(pk=1)
+        self.assertEqual((state.watermark_date, state.watermark_row), (date(2026, 3, 5), 6))
+
+
+@override_settings(SHEET_OUTBOX_FLUSH_ON_COMMIT=False)
+class BulkProcessingTestCase(TestCase):
+    def setUp(self):
+        self.processor = ComplaintProcessor()
+        self.processor.sheets_sync.seed_tech_stock_rows([
+            ["Name", "Spare Id", "Qty", "Technician"],
+            ["Part S1", "S1", "5", "amal"],
+        ])
+        self.complaints = [
+            {'complaint_no': f"PC/050326/0{n}", 'technician_name': "Amal", 'product_code': "S1",
+             'part_name': "Part S1", 'quantity': 2}
+            for n in range(1, 4)
+        ]
+
+    def test_groups_reductions_per_technician_and_product(self):
+        self.assertTrue(self.processor.process_complaints_bulk(self.complaints))
+        self.assertEqual(list(SheetMutation.objects.values_list('technician_name', 'spare_id', 'quantity')),
+                         [('amal', 'S1', -4)])
+        self.assertEqual(ProcessedComplaint.objects.filter(stock_reduced=True).count(), 2)
+        self.assertEqual(len(self.processor.errors), 1)  # the third one: 1 left, 2 required
+
+    def test_complaint_recorded_meanwhile_records_nothing(self):
+        ProcessedComplaint.objects.create(
+            complaint_no="PC/050326/02", technician_name="Amal", product_code="S1", part_name="", quantity_reduced=2,
+        )
+        self.assertFalse(self.processor.process_complaints_bulk(self.complaints))
+        self.assertIn("processed by another run meanwhile", self.processor.errors[-1])
+        self.assertFalse(SheetMutation.objects.exists())
+        self.assertEqual(ProcessedComplaint.objects.count(), 1)
+        self.assertEqual(self.processor.processed_count, 0)
+
+
+@override_settings(SHEET_OUTBOX_FLUSH_ON_COMMIT=False, PROCESSING_JOB_CHUNK_SIZE=2)
+class DryRunEstimateTestCase(TestCase):
+    def setUp(self):
+        self.sheet = FakeSheetsHTTP({'S1': 10, 'S2': 10}, {('amal', 'S1'): 5, ('amal', 'S2'): 3})
+        patcher = mock.patch('courier_api.sheets_sync.get_sheets_client', return_value=mock.Mock(http_client=self.sheet))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        complaints = [
+            {'complaint_no': f"PC/050326/0{n}", 'technician_name': "Amal", 'product_code': product_code,
+             'part_name': f"Part {product_code}", 'quantity': quantity}
+            for n, (product_code, quantity) in enumerate([('S1', 2), ('S2', 1), ('S1', 2), ('S1', 2)], 1)
+        ]
+        stock_rows = [list(row) for row in self.sheet.sheets["Technician Stocks"]]
+
+        def plan_complaints(processor, since_date=None, technician_filter=None, full_scan=False):
+            # The Tracking read, with the Technician Stocks rows it brings along
+            processor.sheets_sync.seed_tech_stock_rows(stock_rows)
+            processor.intake_watermark = {'date': '2026-03-05', 'row': 6}
+            return [dict(c) for c in complaints]
+
+        patcher = mock.patch.object(ComplaintProcessor, 'plan_complaints', plan_complaints)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_estimate_matches_a_real_run(self):
+        estimate = ComplaintProcessor().dry_run(bulk=True)['estimated_calls']
+
+        ProcessingJob.objects.create(bulk=True)
+        with CaptureQueriesContext(connection) as queries:
+            processing_jobs.run_job(processing_jobs._claim())
+        result = sheet_outbox.flush_pending()
+
+        job_saves = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "api_processingjob"')]
+        self.assertGreater(estimate['db'].pop('planning_queries'), 0)
+        self.assertEqual(estimate['db'], {
+            'job_saves': len(job_saves),
+            'intake_state': ComplaintIntakeState.objects.count(),
+            'processed_rows': ProcessedComplaint.objects.count(),
+            'outbox_rows': SheetMutation.objects.count(),
+            'ledger_moves': 0,
+            'outbox_flushes': 1,
+        })
+        # Chunk 1 changes S1 and S2, chunk 2 S1 again; the fourth complaint finds 1 left
+        self.assertEqual((result['applied'], self.sheet.technician('amal', 'S1')), (3, 1))
+        self.assertEqual(estimate['sheets']['outbox_flush'], self.sheet.read_calls + self.sheet.write_calls)
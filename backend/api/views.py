@@ -4,6 +4,7 @@ import json
 import logging
 from django.db.models import Q
 from django.db import transaction
+from django.conf import settings
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime, date
@@ -17,13 +18,21 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from django.utils import timezone
-from .models import Attendance, Technician, SpareRequest, StockOutOrder, StockReceived, ProcessedComplaint, SalesRequest, SalesRequestProduct
+from .models import Attendance, Technician, SpareRequest, StockOutOrder, StockReceived, ProcessedComplaint, ProcessingJob, SalesRequest, SalesRequestProduct
 from .serializers import (
     AttendanceSerializer, AttendanceCheckInSerializer,
     AttendanceCheckOutSerializer, TechnicianSerializer, SpareRequestSerializer,
     StockOutOrderSerializer, StockReceivedSerializer, SalesRequestSerializer, SalesRequestCreateSerializer
 )
-from courier_api.sheets_sync import SheetsSync
+from courier_api.sheets_sync import SheetsSync, SheetWriteBatch
+from .services.complaint_follower import follower_status
+from .services.processing_jobs import create_job, job_status
+from .services.sheet_outbox import record_technician_stock_change, record_tracking_cells
+from .services.sheets_client import get_sheets_client, get_worksheet
+from .services.tracking_snapshot import tracking_snapshot
+from .services.tracking_queries import (
+    find_tracking_rows, record_tracking_write, locate_complaint_row, complaint_on_sheet, ComplaintNotFound,
+)
 
 # API Root View
 @api_view(['GET'])
@@ -61,29 +70,11 @@ def get_google_sheets_client():
     """
     Get authenticated Google Sheets client using environment variables
     Falls back to service.json if environment variables are not set (local development)
+
+    The client is built once per process and shared (see services/sheets_client.py).
     """
     try:
-        # Try to get credentials from environment variable (for production)
-        google_credentials_json = os.getenv('GOOGLE_SERVICE_ACCOUNT_JSON')
-        
-        if google_credentials_json:
-            # Parse the JSON string from environment variable
-            credentials_dict = json.loads(google_credentials_json)
-            creds = Credentials.from_service_account_info(
-                credentials_dict,
-                scopes=["https://www.googleapis.com/auth/spreadsheets"]
-            )
-            logger.info("Using Google credentials from environment variable")
-        else:
-            # Fallback to service.json for local development
-            creds = Credentials.from_service_account_file(
-                "service.json",
-                scopes=["https://www.googleapis.com/auth/spreadsheets"]
-            )
-            logger.info("Using Google credentials from service.json file")
-        
-        client = gspread.authorize(creds)
-        return client
+        return get_sheets_client()
     
     except Exception as e:
         logger.error(f"Failed to authenticate with Google Sheets: {str(e)}")
@@ -739,56 +730,28 @@ def get_complaints(request):
         from_dt = datetime.strptime(from_date, "%d-%m-%Y")
         to_dt = datetime.strptime(to_date, "%d-%m-%Y")
 
-        # Authenticate Google Sheets
-        client = get_google_sheets_client()
-
-
-        # Open worksheet
-        sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
-
-        # Fetch sheet data
-        rows = sheet.get_all_values()
+        # Technician + date range filtering happens in the Tracking query layer
+        rows = find_tracking_rows(
+            technician=technician,
+            date_from=from_dt.date(),
+            date_to=to_dt.date()
+        )
 
         results = []
 
-        # Process rows — skip header
-        for row in rows[1:]:
-            complaint_no = row[1]
-            technician_name = row[14]
-            status = row[11]
-            customer_name = row[2]
-            customer_phone = row[3]
-            area = row[5]
-            part_name = row[9]
-            part_no = row[7]
-            quantity = row[10]
-
-
-
-            # Extract date from complaint_no → B column format: PCOTH/150725/01
-            complaint_parts = complaint_no.split("/")
-            if len(complaint_parts) >= 3:
-                date_str = complaint_parts[1]  # 150725 (DDMMYY)
-                try:
-                    date_obj = datetime.strptime(date_str, "%d%m%y")
-                except:
-                    continue
-            else:
-                continue
-
-            # Apply filters
-            if technician_name.upper() == technician.upper() and from_dt <= date_obj <= to_dt:
-                results.append({
-                    "date": date_obj.strftime("%d-%m-%Y"),
-                    "complaint_no": complaint_no,
-                    "status": status,
-                    "customer_name": customer_name,
-                    "customer_phone": customer_phone,
-                    "part_name": part_name,
-                    "part_no": part_no,
-                    "area": area,
-                    "quantity": quantity
-                })
+        for record in rows:
+            results.append({
+                # Parsed from complaint_no (PCOTH/150725/01) when the row was loaded
+                "date": record.complaint_date.strftime("%d-%m-%Y"),
+                "complaint_no": record.complaint_no,
+                "status": record.status,
+                "customer_name": record.customer_name,
+                "customer_phone": record.phone,
+                "part_name": record.part_name,
+                "part_no": record.product_code,
+                "area": record.area,
+                "quantity": record.quantity
+            })
 
         return JsonResponse(results, safe=False)
 
@@ -809,14 +772,17 @@ def update_complaint_status(request):
         client = get_google_sheets_client()
 
 
-        sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
+        sheet = get_worksheet(settings.GOOGLE_SHEET_ID, "Tracking")
 
         # Find complaint number row
-        cell = sheet.find(complaint_no)
-        row_index = cell.row
+        try:
+            row_index, _ = locate_complaint_row(sheet, complaint_no)
+        except ComplaintNotFound:
+            return JsonResponse({"error": f"Complaint {complaint_no} not found"}, status=404)
 
         # Column L = index 11 → Sheet column 12
         sheet.update_cell(row_index, 12, new_status)
+        record_tracking_write(row_index, {12: new_status})
 
         return JsonResponse({
             "success": True,
@@ -838,39 +804,27 @@ def get_spare_pending(request):
     try:
         technician_name = request.user.first_name
 
-        client = get_google_sheets_client()
-
-        sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
-        rows = sheet.get_all_values()
+        # Filter: Match technician AND status = PENDING
+        rows = find_tracking_rows(technician=technician_name, status='PENDING')
         
         results = []
         
-        # Process rows — skip header (row 0)
-        for row in rows[1:]:
-            if len(row) < 15:  # Ensure row has enough columns
-                continue
-                
-            complaint_no = row[1]       # Index 1 = Complaint No
-            tech_name = row[14]         # Index 14 = TECHNICIAN
-            status = row[11]            # Index 11 = COMPLAINT STATUS
-            
-            # Filter: Match technician AND status = PENDING
-            if tech_name.strip().upper() == technician_name.upper() and status.strip().upper() == 'PENDING':
-                results.append({
-                    "complaint_no": row[1],          # Index 1
-                    "customer_name": row[2],         # Index 2
-                    "phone": row[3],                 # Index 3
-                    "area": row[5],                  # Index 5
-                    "brand_name": row[6],            # Index 6
-                    "product_code": row[7],          # Index 7
-                    "part_name": row[9],             # Index 9
-                    "no_of_spares": row[10],         # Index 10
-                    "status": status,                # Index 11
-                    "pending_days": row[12],  # Index 12
-                    "district": row[15] if len(row) > 15 else "",  # Index 15
-                    "mrp": row[19],
-                    "technician": tech_name
-                })
+        for record in rows:
+            results.append({
+                "complaint_no": record.complaint_no,
+                "customer_name": record.customer_name,
+                "phone": record.phone,
+                "area": record.area,
+                "brand_name": record.brand_name,
+                "product_code": record.product_code,
+                "part_name": record.part_name,
+                "no_of_spares": record.quantity,
+                "status": record.status,
+                "pending_days": record.pending_days,
+                "district": record.district,
+                "mrp": record.mrp,
+                "technician": record.technician
+            })
         
         return JsonResponse({
             "success": True,
@@ -901,52 +855,31 @@ def get_spare_closed(request):
         from_dt = datetime.strptime(from_date_str, "%d-%m-%Y")
         to_dt = datetime.strptime(to_date_str, "%d-%m-%Y")
         
-        client = get_google_sheets_client()
-
-        sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
-        rows = sheet.get_all_values()
+        # Filter: Match technician AND status = CLOSED AND date in range
+        rows = find_tracking_rows(
+            technician=technician_name,
+            status='CLOSED',
+            date_from=from_dt.date(),
+            date_to=to_dt.date()
+        )
         
         results = []
         
-        # Process rows
-        for row in rows[1:]:
-            if len(row) < 15:
-                continue
-            
-            complaint_no = row[1]       # Index 1 = Complaint No
-            tech_name = row[14]         # Index 14 = TECHNICIAN
-            status = row[11]            # Index 11 = COMPLAINT STATUS
-            
-            # Extract date from complaint_no → format: PCOTH/150725/01
-            complaint_parts = complaint_no.split("/")
-            if len(complaint_parts) >= 3:
-                date_str = complaint_parts[1]  # 150725 (DDMMYY)
-                try:
-                    date_obj = datetime.strptime(date_str, "%d%m%y")
-                except:
-                    continue
-            else:
-                continue
-            
-            # Filter: Match technician AND status = CLOSED AND date in range
-            if (tech_name.strip().upper() == technician_name.upper() and 
-                status.strip().upper() == 'CLOSED' and 
-                from_dt <= date_obj <= to_dt):
-                
-                results.append({
-                    "complaint_no": row[1],          # Index 1
-                    "customer_name": row[2],         # Index 2
-                    "phone": row[3],                 # Index 3
-                    "area": row[5],                  # Index 5
-                    "brand_name": row[6],            # Index 6
-                    "product_code": row[7],          # Index 7
-                    "part_name": row[9],             # Index 9
-                    "no_of_spares": row[10],         # Index 10
-                    "status": status,                # Index 11
-                    "district": row[15] if len(row) > 15 else "",  # Index 15
-                    "technician": tech_name,
-                    "date": date_obj.strftime("%d-%m-%Y")
-                })
+        for record in rows:
+            results.append({
+                "complaint_no": record.complaint_no,
+                "customer_name": record.customer_name,
+                "phone": record.phone,
+                "area": record.area,
+                "brand_name": record.brand_name,
+                "product_code": record.product_code,
+                "part_name": record.part_name,
+                "no_of_spares": record.quantity,
+                "status": record.status,
+                "district": record.district,
+                "technician": record.technician,
+                "date": record.complaint_date.strftime("%d-%m-%Y")
+            })
         
         return JsonResponse({
             "success": True,
@@ -971,37 +904,27 @@ def get_admin_spare_approvals(request):
         if not request.user.is_staff:
             return JsonResponse({"error": "Only admin users can access this endpoint"}, status=403)
 
-        client = get_google_sheets_client()
-
-        sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
-        rows = sheet.get_all_values()
+        # Filter: Only include PENDING status
+        rows = find_tracking_rows(status='PENDING')
         
         results = []
         
-        # Process rows — skip header (row 0)
-        for row in rows[1:]:
-            if len(row) < 15:  # Ensure row has enough columns
-                continue
-                
-            status = row[11]  # Index 11 = COMPLAINT STATUS
-            
-            # Filter: Only include PENDING status
-            if status.strip().upper() == 'PENDING':
-                results.append({
-                    "id": row[0],                   # Index 0 (Row ID)
-                    "complaint_no": row[1],         # Index 1
-                    "customer_name": row[2],        # Index 2
-                    "phone": row[3],                # Index 3
-                    "area": row[5],                 # Index 5
-                    "brand_name": row[6],           # Index 6
-                    "product_code": row[7],         # Index 7
-                    "part_name": row[9],            # Index 9
-                    "no_of_spares": row[10],        # Index 10
-                    "status": status,               # Index 11
-                     "pending_days": row[12], 
-                    "district": row[15] if len(row) > 15 else "",  # Index 15
-                    "technician": row[14] if len(row) > 14 else ""  # Index 14
-                })
+        for record in rows:
+            results.append({
+                "id": record.row_id,
+                "complaint_no": record.complaint_no,
+                "customer_name": record.customer_name,
+                "phone": record.phone,
+                "area": record.area,
+                "brand_name": record.brand_name,
+                "product_code": record.product_code,
+                "part_name": record.part_name,
+                "no_of_spares": record.quantity,
+                "status": record.status,
+                "pending_days": record.pending_days,
+                "district": record.district,
+                "technician": record.technician
+            })
         
         return JsonResponse({
             "success": True,
@@ -1039,24 +962,25 @@ def update_spare_status(request):
         client = get_google_sheets_client()
 
         
-        sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
+        sheet = get_worksheet(settings.GOOGLE_SHEET_ID, "Tracking")
         
         try:
             # Find complaint number row (column B = 2)
-            cell = sheet.find(complaint_no, in_column=2)
-            row_index = cell.row
+            row_index, _ = locate_complaint_row(sheet, complaint_no)
             
-            # Get the current row data
-            row = sheet.row_values(row_index)
-            if len(row) < 15:  # Ensure we have enough columns
-                return JsonResponse({"success": False, "error": "Invalid row data"}, status=400)
-            
-            # Update the status (column L = 12)
-            sheet.update_cell(row_index, 12, new_status)
+            # Status and updated_by go out in a single write
+            with SheetWriteBatch(client, sheet.spreadsheet_id) as batch:
+                # Update the status (column L = 12)
+                batch.set_cell("Tracking", row_index, 12, new_status)
+                
+                written = {12: new_status}
+                
+                # If this is an admin approval, update the updated_by field (assuming it's in column M = 13)
+                if request.user.is_staff:
+                    written[13] = f"{updated_by} ({datetime.now().strftime('%d-%m-%Y %H:%M')})"
+                    batch.set_cell("Tracking", row_index, 13, written[13])
             
-            # If this is an admin approval, update the updated_by field (assuming it's in column M = 13)
-            if request.user.is_staff and len(row) >= 13:
-                sheet.update_cell(row_index, 13, f"{updated_by} ({datetime.now().strftime('%d-%m-%Y %H:%M')})")
+            record_tracking_write(row_index, written)
             
             return JsonResponse({
                 "success": True,
@@ -1067,7 +991,7 @@ def update_spare_status(request):
                 "timestamp": datetime.now().isoformat()
             })
             
-        except gspread.exceptions.CellNotFound:
+        except ComplaintNotFound:
             return JsonResponse({"success": False, "error": f"Complaint {complaint_no} not found"}, status=404)
     
     except Exception as e:
@@ -1078,14 +1002,13 @@ def update_spare_status(request):
 def test_sheet_connection(request):
     """Test if we can connect to the sheet"""
     try:
-        client = get_google_sheets_client()
-
-        sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
-        rows = sheet.get_all_values()
+        rows = tracking_snapshot.get_rows(max_age=0)
+        header = tracking_snapshot.get_header()
         return JsonResponse({
             "success": True,
-            "message": f"Connected! Sheet has {len(rows)} rows",
-            "first_row": rows[0] if rows else []
+            "message": f"Connected! Sheet has {len(rows) + (1 if header else 0)} rows",
+            "first_row": header,
+            "snapshot": tracking_snapshot.stats()
         })
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -1208,8 +1131,8 @@ def get_all_spare_requests(request):
 def approve_spare_request(request):
     """
     Admin approves a spare request
-    Updates Google Sheet (marks complaint as CLOSED)
     Updates DB request status to APPROVED
+    Queues the Google Sheet update (marks complaint as CLOSED)
     """
     try:
         if not request.user.is_staff:
@@ -1235,36 +1158,37 @@ def approve_spare_request(request):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Update Google Sheet
+        # The complaint must be on the Tracking sheet before its CLOSED write is queued
         try:
-            client = get_google_sheets_client()
-
-            sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
-            
-            # Find and update the complaint row
-            cell = sheet.find(spare_request.complaint_no, in_column=2)
-            row_index = cell.row
-            
-            # Update status to CLOSED (column L = 12)
-            sheet.update_cell(row_index, 12, 'CLOSED')
-            
+            on_sheet = complaint_on_sheet(spare_request.complaint_no)
         except Exception as sheet_error:
             return Response(
-                {'error': f'Failed to update Google Sheet: {str(sheet_error)}'},
+                {'error': f'Failed to read Google Sheet: {str(sheet_error)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not on_sheet:
+            return Response(
+                {'error': f'Complaint {spare_request.complaint_no} not found on the Tracking sheet'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Update DB record
-        spare_request.status = 'APPROVED'
-        spare_request.approved_by = request.user
-        spare_request.admin_notes = admin_notes
-        spare_request.reviewed_at = timezone.now()
-        spare_request.save()
+        # Update DB record; the Tracking status (column L = 12) is written to
+        # Google Sheets from the outbox once this commits
+        with transaction.atomic():
+            spare_request.status = 'APPROVED'
+            spare_request.approved_by = request.user
+            spare_request.admin_notes = admin_notes
+            spare_request.reviewed_at = timezone.now()
+            spare_request.save()
+
+            record_tracking_cells(
+                spare_request.complaint_no, {12: 'CLOSED'}, source=f"spare_request:{spare_request.id}"
+            )
         
         serializer = SpareRequestSerializer(spare_request)
         return Response({
             'success': True,
-            'message': 'Request approved and Google Sheet updated',
+            'message': 'Request approved; Google Sheet update queued',
             'data': serializer.data
         }, status=status.HTTP_200_OK)
     
@@ -1342,32 +1266,22 @@ def get_stock_out_items(request):
                 "error": "Only admin users can access this endpoint"
             }, status=403)
 
-        client = get_google_sheets_client()
-
-        sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
-        rows = sheet.get_all_values()
+        # Filter: Only include items with CC REMARKS = "STOCK OUT" (column X)
+        rows = find_tracking_rows(cc_remarks='STOCK OUT')
         
         results = []
         
-        # Process rows — skip header (row 0)
-        for row in rows[1:]:
-            if len(row) < 24:  # Ensure row has enough columns (column X = index 23)
-                continue
-            
-            cc_remarks = row[23].strip().upper() if len(row) > 23 else ""  # Column X = index 23
-            
-            # Filter: Only include items with CC REMARKS = "STOCK OUT"
-            if cc_remarks == 'STOCK OUT':
-                results.append({
-                    "complaint_no": row[1],          # Index 1 = B
-                    "area": row[5],                  # Index 5 = F
-                    "brand_name": row[6],            # Index 6 = G
-                    "product_code": row[7],          # Index 7 = H
-                    "part_name": row[9],             # Index 9 = J
-                    "district": row[15] if len(row) > 15 else "",  # Index 15 = P
-                    "mrp": row[19] if len(row) > 19 else "",       # Index 19 = T
-                    "cc_remarks": row[23],           # Index 23 = X
-                })
+        for record in rows:
+            results.append({
+                "complaint_no": record.complaint_no,
+                "area": record.area,
+                "brand_name": record.brand_name,
+                "product_code": record.product_code,
+                "part_name": record.part_name,
+                "district": record.district,
+                "mrp": record.mrp,
+                "cc_remarks": record.cc_remarks,
+            })
         
         return JsonResponse({
             "success": True,
@@ -1418,14 +1332,10 @@ def mark_stock_as_ordered(request):
         try:
             client = get_google_sheets_client()
 
-            sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
+            sheet = get_worksheet(settings.GOOGLE_SHEET_ID, "Tracking")
             
             # Find complaint number row (column B = 2)
-            cell = sheet.find(complaint_no, in_column=2)
-            row_index = cell.row
-            
-            # Get the current row data to save in DB
-            row = sheet.row_values(row_index)
+            row_index, record = locate_complaint_row(sheet, complaint_no)
             
             # First save to database within a transaction
             logger.info("Starting database transaction...")
@@ -1433,12 +1343,12 @@ def mark_stock_as_ordered(request):
                 try:
                     stock_order = StockOutOrder.objects.create(
                         complaint_no=complaint_no,
-                        area=row[5] if len(row) > 5 else "",
-                        brand_name=row[6] if len(row) > 6 else "",
-                        product_code=row[7] if len(row) > 7 else "",
-                        part_name=row[9] if len(row) > 9 else "",
-                        district=row[15] if len(row) > 15 else "",
-                        mrp=row[19] if len(row) > 19 else "",
+                        area=record.area,
+                        brand_name=record.brand_name,
+                        product_code=record.product_code,
+                        part_name=record.part_name,
+                        district=record.district,
+                        mrp=record.mrp,
                         cc_remarks='ORDERED',
                         ordered_by=request.user,
                         ordered_at=timezone.now(),
@@ -1449,13 +1359,19 @@ def mark_stock_as_ordered(request):
                     # Then update Google Sheet
                     logger.info("Updating Google Sheet...")
                     sheet.update_cell(row_index, 24, 'ORDERED')
+                    record_tracking_write(row_index, {24: 'ORDERED'})
                     logger.info("Successfully updated Google Sheet")
                     
                 except Exception as e:
                     error_msg = f"Error in transaction: {str(e)}"
                     logger.error(error_msg, exc_info=True)
                     raise
-                
+
+        except ComplaintNotFound:
+            return Response({
+                "success": False,
+                "error": f"Complaint {complaint_no} not found in sheet"
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             # If any error occurs, the database transaction will be rolled back automatically
             error_msg = f"Failed to process order for {complaint_no}: {str(e)}"
@@ -1493,32 +1409,22 @@ def get_ordered_items(request):
                 "error": "Only admin users can access this endpoint"
             }, status=403)
 
-        client = get_google_sheets_client()
-
-        sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
-        rows = sheet.get_all_values()
+        # Filter: Only include items with CC REMARKS = "ORDERED" (column X)
+        rows = find_tracking_rows(cc_remarks='ORDERED')
         
         results = []
         
-        # Process rows — skip header (row 0)
-        for row in rows[1:]:
-            if len(row) < 24:  # Ensure row has enough columns
-                continue
-            
-            cc_remarks = row[23].strip().upper() if len(row) > 23 else ""  # Column X = index 23
-            
-            # Filter: Only include items with CC REMARKS = "ORDERED"
-            if cc_remarks == 'ORDERED':
-                results.append({
-                    "complaint_no": row[1],          # Index 1 = B
-                    "area": row[5],                  # Index 5 = F
-                    "brand_name": row[6],            # Index 6 = G
-                    "product_code": row[7],          # Index 7 = H
-                    "part_name": row[9],             # Index 9 = J
-                    "district": row[15] if len(row) > 15 else "",  # Index 15 = P
-                    "mrp": row[19] if len(row) > 19 else "",       # Index 19 = T
-                    "cc_remarks": row[23],           # Index 23 = X
-                })
+        for record in rows:
+            results.append({
+                "complaint_no": record.complaint_no,
+                "area": record.area,
+                "brand_name": record.brand_name,
+                "product_code": record.product_code,
+                "part_name": record.part_name,
+                "district": record.district,
+                "mrp": record.mrp,
+                "cc_remarks": record.cc_remarks,
+            })
         
         return JsonResponse({
             "success": True,
@@ -1573,19 +1479,16 @@ def mark_stock_as_received(request):
         try:
             client = get_google_sheets_client()
 
-            sheet = client.open_by_key("1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ").worksheet("Tracking")
+            sheet = get_worksheet(settings.GOOGLE_SHEET_ID, "Tracking")
             
             # Find complaint number row (column B = 2)
-            cell = sheet.find(complaint_no, in_column=2)
-            row_index = cell.row
-            
-            # Get the current row data to save in DB
-            row = sheet.row_values(row_index)
+            row_index, record = locate_complaint_row(sheet, complaint_no)
             
             # Update CC REMARKS to "RECEIVED" (column X = 24)
             sheet.update_cell(row_index, 24, 'RECEIVED')
+            record_tracking_write(row_index, {24: 'RECEIVED'})
             
-        except gspread.exceptions.CellNotFound:
+        except ComplaintNotFound:
             return Response({
                 "success": False,
                 "error": f"Complaint {complaint_no} not found in sheet"
@@ -1599,12 +1502,12 @@ def mark_stock_as_received(request):
         # Save to database
         stock_received = StockReceived.objects.create(
             complaint_no=complaint_no,
-            area=row[5] if len(row) > 5 else "",
-            brand_name=row[6] if len(row) > 6 else "",
-            product_code=row[7] if len(row) > 7 else "",
-            part_name=row[9] if len(row) > 9 else "",
-            district=row[15] if len(row) > 15 else "",
-            mrp=row[19] if len(row) > 19 else "",
+            area=record.area,
+            brand_name=record.brand_name,
+            product_code=record.product_code,
+            part_name=record.part_name,
+            district=record.district,
+            mrp=record.mrp,
             cc_remarks='RECEIVED',
             stock_order=stock_order,
             received_by=request.user,
@@ -1693,9 +1596,15 @@ def process_pending_complaints(request):
     Admin only: Process completed complaints and reduce technician stock
     Expected payload:
     {
-        "since_date": "2026-04-25",  // optional, defaults to yesterday (April 25, 2026)
-        "technician_filter": "John Doe"  // optional, filter by technician name
+        "since_date": "2026-04-25",  // optional, examine every complaint from this date (default: COMPLAINT_PROCESSING_SINCE_DATE, from the intake watermark)
+        "technician_filter": "John Doe",  // optional, filter by technician name
+        "bulk": true,  // optional, grouped bulk mode (default: COMPLAINT_PROCESSING_BULK)
+        "full_scan": false,  // optional, examine every Tracking row instead of those after the intake watermark
+        "dry_run": false  // optional, only return the plan, estimated call counts and stage timings
     }
+    Runs as a background ProcessingJob: returns 202 with the job, poll
+    /api/complaints/process/jobs/<job_id>/ for progress. A dry run answers
+    200 with the plan and records nothing.
     """
     try:
         if not request.user.is_staff:
@@ -1708,31 +1617,31 @@ def process_pending_complaints(request):
         since_date_str = request.data.get('since_date')
         technician_filter = request.data.get('technician_filter')
         
-        # Parse since_date or use default (yesterday: April 25, 2026)
-        if since_date_str:
-            since_date = datetime.strptime(since_date_str, '%Y-%m-%d').date()
-        else:
-            # Default to yesterday (April 25, 2026)
-            since_date = date(2026, 4, 25)
-            logger.info(f"Using default date filter from yesterday: {since_date}")
-        
-        logger.info(f"Admin {request.user.username} initiated complaint processing since {since_date}")
-        
-        # Import and use the complaint processor
-        from .services.complaint_processor import ComplaintProcessor
-        processor = ComplaintProcessor()
+        # An explicit since_date is examined in full; without one the run
+        # uses COMPLAINT_PROCESSING_SINCE_DATE and the intake watermark
+        since_date = datetime.strptime(since_date_str, '%Y-%m-%d').date() if since_date_str else None
+        
+        if request.data.get('dry_run'):
+            # Read-only plan of what the run would do and cost - quick enough to answer inline
+            from .services.complaint_processor import ComplaintProcessor
+            result = ComplaintProcessor().dry_run(
+                since_date=since_date,
+                technician_filter=technician_filter,
+                bulk=request.data.get('bulk', getattr(settings, 'COMPLAINT_PROCESSING_BULK', False)),
+                full_scan=bool(request.data.get('full_scan', False)),
+            )
+            return Response(result, status=status.HTTP_200_OK)
         
-        # Process complaints
-        result = processor.process_complaints(
+        job = create_job(
+            request.user,
             since_date=since_date,
-            technician_filter=technician_filter
+            technician_filter=technician_filter,
+            bulk=request.data.get('bulk', getattr(settings, 'COMPLAINT_PROCESSING_BULK', False)),
+            full_scan=bool(request.data.get('full_scan', False)),
         )
+        logger.info(f"Admin {request.user.username} queued complaint processing job {job.id} since {since_date or 'the intake watermark'}")
         
-        logger.info(f"Complaint processing completed by admin {request.user.username}. "
-                    f"Processed: {result.get('processed_count', 0)}, "
-                    f"Errors: {len(result.get('errors', []))}")
-        
-        return Response(result, status=status.HTTP_200_OK)
+        return Response(job_status(job), status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         logger.exception(f"Error in process_pending_complaints: {e}")
@@ -1742,6 +1651,29 @@ def process_pending_complaints(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_processing_job(request, job_id):
+    """
+    Admin only: Progress of a complaint processing job
+    (status QUEUED / RUNNING / COMPLETED / FAILED, position of total_count)
+    """
+    if not request.user.is_staff:
+        return Response({
+            'success': False,
+            'error': 'Admin access required'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    job = ProcessingJob.objects.filter(id=job_id).first()
+    if job is None:
+        return Response({
+            'success': False,
+            'error': 'Processing job not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response(job_status(job), status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_complaint_processing_status(request):
@@ -1783,6 +1715,8 @@ def get_complaint_processing_status(request):
                     (successful_reductions / total_processed * 100) if total_processed > 0 else 0, 2
                 )
             },
+            # Lag metrics of manage.py follow_complaints (None when it is not running)
+            "follower": follower_status(),
             "recent_processed": [
                 {
                     "complaint_no": pc.complaint_no,
@@ -1929,35 +1863,37 @@ def approve_sales_request(request, request_id):
                 'error': 'Sales request is not pending'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Update status
-        sales_request.status = 'APPROVED'
-        sales_request.approved_by = request.user
-        sales_request.reviewed_at = timezone.now()
-        sales_request.save()
-        
-        # Reduce technician stock for each product
-        from courier_api.sheets_sync import SheetsSync
         from .services.complaint_processor import ComplaintProcessor
-        sheets_sync = SheetsSync()
         processor = ComplaintProcessor()
-        
-        for product in sales_request.products.all():
-            try:
-                # Get technician sheet name
-                technician_name = sales_request.technician.first_name if sales_request.technician else "Unknown"
-                tech_sheet_name = processor.get_technician_sheet_name(technician_name)
-                
-                # Reduce from technician stock (not company stock)
-                sheets_sync.update_technician_stock(
-                    tech_sheet_name,
-                    product.product_code,
-                    -product.quantity
-                )
-                logger.info(f"Reduced {product.quantity} from technician {technician_name} stock for {product.product_code}")
-            except Exception as e:
-                logger.error(f"Failed to reduce technician stock for {product.product_code}: {e}")
-                # Continue with other products even if one fails
-                continue
+
+        # Approval and the technician stock reductions commit together; the
+        # Google Sheets writes are applied from the outbox afterwards
+        with transaction.atomic():
+            sales_request.status = 'APPROVED'
+            sales_request.approved_by = request.user
+            sales_request.reviewed_at = timezone.now()
+            sales_request.save()
+
+            # Get technician sheet name
+            technician_name = sales_request.technician.first_name if sales_request.technician else "Unknown"
+            tech_sheet_name = processor.get_technician_sheet_name(technician_name)
+
+            for product in sales_request.products.all():
+                try:
+                    # Savepoint: a failed product must not abort the approval's transaction
+                    with transaction.atomic():
+                        # Reduce from technician stock (not company stock)
+                        record_technician_stock_change(
+                            tech_sheet_name,
+                            product.product_code,
+                            -product.quantity,
+                            source=f"sales_request:{sales_request.id}",
+                        )
+                    logger.info(f"Queued reduction of {product.quantity} {product.product_code} from technician {technician_name}")
+                except Exception as e:
+                    logger.error(f"Failed to reduce technician stock for {product.product_code}: {e}")
+                    # Continue with other products even if one fails
+                    continue
         
         logger.info(f"Sales request {request_id} approved by admin {request.user.username}")
         
@@ -2139,67 +2075,45 @@ def search_products(request):
         
         # Get cached company stock data
         sheets_sync = SheetsSync()
+        # Served from cache; a stale copy is returned while Google is down
         try:
             all_products = sheets_sync.get_company_stock()
             logger.info(f"Retrieved {len(all_products)} products from cache/sheets")
         except Exception as e:
             logger.error(f"Error fetching company stock: {e}")
-            # Fallback to demo products when Sheets API is unavailable
-            logger.info("Using fallback demo products due to Sheets API error")
-            all_products = [
-                {
-                    'spare_id': '45547000',
-                    'name': 'Diverter Knob',
-                    'mrp': 933,
-                    'brand': 'PARRYWARE',
-                    'hsn': '7308',
-                    'qty': 50
-                },
-                {
-                    'spare_id': '45547001',
-                    'name': 'Flush Valve',
-                    'mrp': 450,
-                    'brand': 'PARRYWARE',
-                    'hsn': '7308',
-                    'qty': 25
-                },
-                {
-                    'spare_id': '45547002',
-                    'name': 'Seat Cover',
-                    'mrp': 275,
-                    'brand': 'PARRYWARE',
-                    'hsn': '7308',
-                    'qty': 30
-                }
-            ]
+            return Response({
+                'success': False,
+                'error': 'Product catalogue is temporarily unavailable',
+                'message': str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         
         # Filter products based on search criteria
         filtered_products = []
         
         for product in all_products:
             # Skip products with no stock
-            if product.get('qty', 0) <= 0:
+            if product.qty <= 0:
                 continue
                 
             
             
             # Apply search filter (name or spare_id)
             if search_query:
-                name_match = search_query.lower() in product.get('name', '').lower()
-                code_match = search_query.lower() in product.get('spare_id', '').lower()
+                name_match = search_query.lower() in product.name.lower()
+                code_match = search_query.lower() in product.spare_id.lower()
                 
                 if not (name_match or code_match):
                     continue
             
             # Map to expected format for frontend
             filtered_products.append({
-                'id': product.get('spare_id', ''),  # Using spare_id as unique identifier
-                'name': product.get('name', ''),
-                'code': product.get('spare_id', ''),
-                'mrp': float(product.get('mrp', 0)),
-                'company': product.get('brand', ''),
-                'hsn': product.get('hsn', ''),
-                'stock': product.get('qty', 0)
+                'id': product.spare_id,  # Using spare_id as unique identifier
+                'name': product.name,
+                'code': product.spare_id,
+                'mrp': float(product.mrp),
+                'company': product.brand,
+                'hsn': product.hsn,
+                'stock': product.qty
             })
         
         # Limit results to prevent large responses
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
@@ -65,6 +66,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # Enhanced logging middleware for debugging
     'api.middleware.MemoryAndPerformanceMiddleware',
+    'api.middleware.SheetsStalenessMiddleware',
+    'api.middleware.SheetsDeadlineMiddleware',
+    'api.middleware.SheetsQuotaMiddleware',
 ]
 
 # -------------------------------------------------
@@ -157,6 +161,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # -------------------------------------------------
 CORS_ALLOW_ALL_ORIGINS = True   
 CORS_ALLOW_CREDENTIALS = False
+# Staleness of Google Sheets data (api.middleware.SheetsStalenessMiddleware)
+CORS_EXPOSE_HEADERS = ["X-Data-Stale", "X-Data-Age"]
 
 # -------------------------------------------------
 # DRF + JWT
@@ -183,7 +189,15 @@ SIMPLE_JWT = {
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    # Shared by all gunicorn workers on the box, no external service needed.
+    # Holds Google Sheets data that must stay coherent across workers
+    # (company stock) - see api.services.read_policy.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get("SHARED_CACHE_DIR", os.path.join(tempfile.gettempdir(), "techfix-shared-cache")),
+        'TIMEOUT': None,
+    },
 }
 
 # -------------------------------------------------
@@ -198,6 +212,98 @@ GOOGLE_SHEET_ID = os.environ.get(
 
 COURIER_SHEET_ID = GOOGLE_SHEET_ID
 
+# Base URL of a local Sheets API stand-in (manage.py sheets_standin), e.g.
+# http://127.0.0.1:8765. When set, all Google Sheets traffic goes there
+# instead of Google - for offline load tests and benchmarks only.
+GOOGLE_SHEETS_STANDIN_URL = os.environ.get("GOOGLE_SHEETS_STANDIN_URL", "")
+
+# Upper bound (seconds) for a single Google Sheets API call; code paths with
+# their own sheets_deadline() get whatever is left of it, if that is less
+GOOGLE_SHEETS_REQUEST_TIMEOUT = float(os.environ.get("GOOGLE_SHEETS_REQUEST_TIMEOUT", "30"))
+
+# Total Sheets time per HTTP request (SheetsDeadlineMiddleware); keep it below
+# the gunicorn worker timeout (30s by default). 0 disables the budget.
+GOOGLE_SHEETS_REQUEST_DEADLINE = float(os.environ.get("GOOGLE_SHEETS_REQUEST_DEADLINE", "25"))
+
+# Circuit breaker: fail Sheets calls fast for GOOGLE_SHEETS_BREAKER_COOLDOWN
+# seconds after GOOGLE_SHEETS_BREAKER_FAILURES consecutive upstream failures
+GOOGLE_SHEETS_BREAKER_FAILURES = int(os.environ.get("GOOGLE_SHEETS_BREAKER_FAILURES", "5"))
+GOOGLE_SHEETS_BREAKER_COOLDOWN = int(os.environ.get("GOOGLE_SHEETS_BREAKER_COOLDOWN", "30"))
+
+# Sheets API calls per minute allowed per worker process (Google's quota is
+# per project and per user - divide it by the number of workers), and how
+# many calls may go out back to back before the rate applies
+GOOGLE_SHEETS_READS_PER_MINUTE = int(os.environ.get("GOOGLE_SHEETS_READS_PER_MINUTE", "60"))
+GOOGLE_SHEETS_WRITES_PER_MINUTE = int(os.environ.get("GOOGLE_SHEETS_WRITES_PER_MINUTE", "60"))
+GOOGLE_SHEETS_QUOTA_BURST = int(os.environ.get("GOOGLE_SHEETS_QUOTA_BURST", "10"))
+
+# Complaints dated before this (YYYY-MM-DD) are never processed - the
+# default since_date of the process endpoint and of follow_complaints
+COMPLAINT_PROCESSING_SINCE_DATE = os.environ.get("COMPLAINT_PROCESSING_SINCE_DATE", "2026-04-25")
+
+# Process complaints in grouped bulk mode (one stock check per technician,
+# one bulk_create) unless the request says otherwise
+COMPLAINT_PROCESSING_BULK = os.environ.get("COMPLAINT_PROCESSING_BULK", "False") == "True"
+
+# Keep stock quantities in the StockBalance ledger (authoritative) and
+# export them to "Mrp List" / "Technician Stocks" with
+# `manage.py stock_ledger --export`; run `--import` once before enabling
+STOCK_LEDGER_ENABLED = os.environ.get("STOCK_LEDGER_ENABLED", "False") == "True"
+
+# Sheet writes queued in the SheetMutation outbox: flush in a background
+# thread after each commit, claim at most SHEET_OUTBOX_BATCH_SIZE per flush,
+# give up after SHEET_OUTBOX_MAX_ATTEMPTS, and treat a claim older than
+# SHEET_OUTBOX_CLAIM_TIMEOUT seconds as an interrupted flush
+SHEET_OUTBOX_FLUSH_ON_COMMIT = os.environ.get("SHEET_OUTBOX_FLUSH_ON_COMMIT", "True") == "True"
+SHEET_OUTBOX_BATCH_SIZE = int(os.environ.get("SHEET_OUTBOX_BATCH_SIZE", "500"))
+SHEET_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("SHEET_OUTBOX_MAX_ATTEMPTS", "8"))
+SHEET_OUTBOX_CLAIM_TIMEOUT = int(os.environ.get("SHEET_OUTBOX_CLAIM_TIMEOUT", "300"))
+
+# Complaint intake re-examines CLOSED complaints dated up to
+# COMPLAINT_INTAKE_LOOKBACK_DAYS before the last run's watermark (complaints
+# closed late); older ones need a full_scan run
+COMPLAINT_INTAKE_LOOKBACK_DAYS = int(os.environ.get("COMPLAINT_INTAKE_LOOKBACK_DAYS", "30"))
+
+# Complaint processing jobs: PROCESSING_JOB_CHUNK_SIZE complaints between
+# checkpoints; a running job without a heartbeat for
+# PROCESSING_JOB_STALE_SECONDS lost its worker and is resumed, at most
+# PROCESSING_JOB_MAX_ATTEMPTS times
+PROCESSING_JOB_CHUNK_SIZE = int(os.environ.get("PROCESSING_JOB_CHUNK_SIZE", "50"))
+PROCESSING_JOB_STALE_SECONDS = int(os.environ.get("PROCESSING_JOB_STALE_SECONDS", "600"))
+PROCESSING_JOB_MAX_ATTEMPTS = int(os.environ.get("PROCESSING_JOB_MAX_ATTEMPTS", "3"))
+
+# "Mrp List" company stock: fresh for COMPANY_STOCK_TTL seconds, then served
+# while it refreshes in the background; the last good copy is kept for
+# COMPANY_STOCK_KEEP_FOR seconds as a fallback when Sheets is down
+COMPANY_STOCK_TTL = int(os.environ.get("COMPANY_STOCK_TTL", "86400"))
+COMPANY_STOCK_KEEP_FOR = int(os.environ.get("COMPANY_STOCK_KEEP_FOR", "604800"))
+
+# Concurrent callers of the same expensive sheet fetch wait at most this many
+# seconds for the one fetch in flight, then fall back to stale data
+SHEETS_SINGLE_FLIGHT_WAIT = int(os.environ.get("SHEETS_SINGLE_FLIGHT_WAIT", "15"))
+
+# Seconds the shared "Tracking" snapshot is served without re-checking the sheet
+TRACKING_SNAPSHOT_TTL = int(os.environ.get("TRACKING_SNAPSHOT_TTL", "60"))
+
+# After a failed Drive revision probe (other than 403/404, which turn it off),
+# refresh the snapshot on TTL alone for this many seconds, then probe again
+TRACKING_REVISION_PROBE_RETRY = int(os.environ.get("TRACKING_REVISION_PROBE_RETRY", "300"))
+
+# Incremental Tracking refresh: fetch only rows appended since the last load,
+# re-check status / CC remarks on the last TRACKING_TAIL_WINDOW_ROWS rows, and
+# do a full reload at most every TRACKING_FULL_RELOAD_INTERVAL seconds
+TRACKING_TAIL_WINDOW_ROWS = int(os.environ.get("TRACKING_TAIL_WINDOW_ROWS", "500"))
+TRACKING_FULL_RELOAD_INTERVAL = int(os.environ.get("TRACKING_FULL_RELOAD_INTERVAL", "900"))
+
+# Past its TTL the snapshot is still served (refreshing in the background) for
+# up to TRACKING_STALE_MAX_AGE seconds; older copies are refreshed in-request
+TRACKING_STALE_MAX_AGE = int(os.environ.get("TRACKING_STALE_MAX_AGE", "3600"))
+
+# Serve Tracking list endpoints from the Postgres mirror (see sync_tracking)
+# while its last sync is at most TRACKING_MIRROR_MAX_LAG seconds old
+TRACKING_MIRROR_ENABLED = os.environ.get("TRACKING_MIRROR_ENABLED", "False") == "True"
+TRACKING_MIRROR_MAX_LAG = int(os.environ.get("TRACKING_MIRROR_MAX_LAG", "300"))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
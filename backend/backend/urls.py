@@ -15,7 +15,7 @@ from api.views import (
     mark_stock_as_received, get_order_history,
     get_received_history,
     delete_my_account, get_my_profile,
-    process_pending_complaints, get_complaint_processing_status,
+    process_pending_complaints, get_processing_job, get_complaint_processing_status,
     create_sales_request, get_sales_requests, get_my_sales_requests, approve_sales_request, reject_sales_request, download_sales_request_pdf,
     search_products,
     api_root
@@ -92,6 +92,7 @@ urlpatterns = [
     
     # Complaint Processing
     path('api/complaints/process/', process_pending_complaints, name='process_pending_complaints'),
+    path('api/complaints/process/jobs/<int:job_id>/', get_processing_job, name='processing_job'),
     path('api/complaints/processing-status/', get_complaint_processing_status, name='complaint_processing_status'),
 
     # Sales Requests
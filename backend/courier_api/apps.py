@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class CourierApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courier_api'
-    verbose_name = 'Courier Management'
\ No newline at end of file
+    verbose_name = 'Courier Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - connects the technician mapping invalidation
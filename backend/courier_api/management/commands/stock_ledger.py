@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courier_api import stock_ledger
+from courier_api.sheets_sync import SheetsSync
+
+
+class Command(BaseCommand):
+    help = (
+        "Stock ledger <-> Google Sheets: --import replaces the ledger with the sheet quantities, "
+        "--export writes the ledger to \"Mrp List\" column G and \"Technician Stocks\""
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--import', dest='import_', action='store_true', help="Load the ledger from the sheet")
+        parser.add_argument('--export', action='store_true', help="Write the ledger to the sheet")
+        parser.add_argument('--force', action='store_true', help="Export even if nothing moved since the last export")
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help="With --export: keep running and export every N seconds (0 = once)",
+        )
+
+    def handle(self, *args, **options):
+        if not (options['import_'] or options['export']):
+            raise CommandError("Pass --import and/or --export")
+
+        sheets_sync = SheetsSync()
+
+        if options['import_']:
+            count = stock_ledger.import_from_sheets(sheets_sync)
+            self.stdout.write(f"Imported {count} stock balances")
+
+        if not options['export']:
+            return
+
+        interval = options['interval']
+        while True:
+            try:
+                cells = stock_ledger.export_to_sheets(sheets_sync, force=options['force'])
+                if cells is not None:
+                    self.stdout.write(f"Exported stock ledger: {cells} cells written")
+                elif not interval:
+                    self.stdout.write("Nothing moved since the last export")
+            except Exception as e:
+                if not interval:
+                    raise
+                self.stderr.write(f"Stock ledger export failed: {e}")
+
+            if not interval:
+                return
+            time.sleep(interval)
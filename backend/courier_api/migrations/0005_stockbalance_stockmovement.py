@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-17 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courier_api', '0004_alter_couriertransaction_created_by'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=150)),
+                ('spare_id', models.CharField(max_length=100)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('holder', models.CharField(blank=True, max_length=150)),
+                ('qty', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Stock Balance',
+                'verbose_name_plural': 'Stock Balances',
+                'constraints': [models.UniqueConstraint(fields=('location', 'spare_id'), name='stock_balance_location_spare')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=150)),
+                ('spare_id', models.CharField(max_length=100)),
+                ('quantity', models.IntegerField()),
+                ('balance_after', models.IntegerField()),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['location', 'spare_id', '-id'], name='stock_movement_lookup_idx')],
+            },
+        ),
+    ]
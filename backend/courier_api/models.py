@@ -96,4 +96,49 @@ class CourierTransaction(models.Model):
         indexes = [
             models.Index(fields=['status', '-sent_time']),
             models.Index(fields=['created_by', '-sent_time']),
-        ]
\ No newline at end of file
+        ]
+
+class StockBalance(models.Model):
+    """
+    Quantity of one spare at one location - the company store ("company")
+    or a technician ("tech:<sheet name, lower-case>"). With
+    STOCK_LEDGER_ENABLED this, not the sheet, is the authoritative stock;
+    "Mrp List" column G and "Technician Stocks" are regenerated from it.
+    """
+    location = models.CharField(max_length=150)
+    spare_id = models.CharField(max_length=100)
+    name = models.CharField(max_length=255, blank=True)    # part name, for "Technician Stocks" column A
+    holder = models.CharField(max_length=150, blank=True)  # technician name as written to column D
+    qty = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.location} {self.spare_id}: {self.qty}"
+
+    class Meta:
+        verbose_name = "Stock Balance"
+        verbose_name_plural = "Stock Balances"
+        constraints = [
+            models.UniqueConstraint(fields=['location', 'spare_id'], name='stock_balance_location_spare'),
+        ]
+
+
+class StockMovement(models.Model):
+    """Append-only history of StockBalance changes (one row per location changed)"""
+    location = models.CharField(max_length=150)
+    spare_id = models.CharField(max_length=100)
+    quantity = models.IntegerField()                   # signed change
+    balance_after = models.IntegerField()
+    source = models.CharField(max_length=100, blank=True)  # e.g. "courier:CR-12", "sales_request:5", "import"
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.location} {self.spare_id} {self.quantity:+d} ({self.source})"
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = "Stock Movement"
+        verbose_name_plural = "Stock Movements"
+        indexes = [
+            models.Index(fields=['location', 'spare_id', '-id'], name='stock_movement_lookup_idx'),
+        ]
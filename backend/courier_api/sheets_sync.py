@@ -1,66 +1,216 @@
 # backend/courier_api/sheets_sync.py
 
 import os
-import json
 import logging
 import time
 import psutil
-import socket
 import traceback
 from datetime import datetime
-import signal
-from contextlib import contextmanager
 
 import gspread
-from google.oauth2.service_account import Credentials
-from django.core.cache import cache
+from gspread.utils import absolute_range_name, rowcol_to_a1
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from api.services.read_policy import StaleWhileRevalidate, single_flight
+from api.services.sheet_outbox import pending_stock_deltas
+from api.services.sheet_projection import SheetProjection, fetch_projected
+from api.services.sheet_records import CatalogItem, TechStockLine, safe_int
+from api.services.sheets_client import (
+    SheetsTimeout, get_sheets_client, run_connectivity_diagnostics, sheets_deadline,
+)
+from . import stock_ledger
+from .technician_names import technician_names
 
 logger = logging.getLogger(__name__)
 
 
+class StockTransferError(Exception):
+    """transfer_stock() refused: every missing spare / shortfall is listed in `problems`"""
+
+    def __init__(self, problems):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
 # -----------------------
-# TIMEOUT CONTEXT MANAGER
+# SHEET WRITE BATCH
 # -----------------------
 
-class TimeoutError(Exception):
-    pass
+def _source_title(source):
+    return source.title if isinstance(source, SheetProjection) else source
 
-@contextmanager
-def timeout_context(seconds):
-    def timeout_handler(signum, frame):
-        raise TimeoutError(f"Operation timed out after {seconds} seconds")
-    
-    old_handler = signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(seconds)
-    
-    try:
-        yield
-    finally:
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, old_handler)
 
+class SheetWriteBatch:
+    """
+    Collects cell writes and appended rows for one spreadsheet and sends them
+    in as few API calls as possible:
 
-# -----------------------
-# SAFE CONVERSION HELPERS
-# -----------------------
+    - all cell writes (any worksheet) go out in ONE values:batchUpdate, with
+      adjacent cells of the same row merged into a single range
+    - appended rows go out in one values:append per worksheet
+
+    Use it as a context manager. Nothing is written if the block raises, so a
+    courier receive that fails on item 15 no longer leaves items 1-14 applied.
+
+        with SheetWriteBatch(client, sheet_id) as batch:
+            batch.set_cell("Tracking", 5, 12, "CLOSED")
+            batch.set_cell("Tracking", 5, 13, "admin")
+
+    Worksheets read through get_rows() are fetched once per batch (only the
+    projected columns when given a SheetProjection), so read-modify-write
+    callers see a consistent copy plus their own pending writes
+    (pending_value()).
+    """
 
-def safe_int(value):
-    try:
-        if value in (None, "", "#N/A"):
-            return 0
-        return int(float(str(value).replace(",", "")))
-    except Exception:
-        return 0
+    VALUE_INPUT_OPTION = "USER_ENTERED"  # same as Worksheet.update_cell / append_row
 
+    def __init__(self, client, spreadsheet_id):
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
 
-def safe_float(value):
-    try:
-        if value in (None, "", "#N/A"):
-            return 0.0
-        return float(str(value).replace(",", ""))
-    except Exception:
-        return 0.0
+        self._cells = {}         # worksheet title -> {(row, col): value}
+        self._appends = {}       # worksheet title -> [row values]
+        self._rows = {}          # worksheet title -> rows read in this batch
+        self._after_flush = []
+
+        self.writes_queued = 0   # what the per-cell code would have sent
+        self.write_calls = 0
+        self.read_calls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            logger.warning(f"SheetWriteBatch discarded {self.writes_queued} queued writes after error: {exc}")
+        return False
+
+    # -----------------------
+    # READS
+    # -----------------------
+
+    def prefetch(self, *sources):
+        """Read several worksheets (titles or SheetProjections) in one values:batchGet call"""
+        missing = [s for s in sources if _source_title(s) not in self._rows]
+        if not missing:
+            return
+
+        self._rows.update(fetch_projected(self.spreadsheet_id, missing, self.client))
+        self.read_calls += 1
+
+    def get_rows(self, source):
+        """All rows of a worksheet (header included, row 1 = index 0) as read by this batch"""
+        self.prefetch(source)
+        return self._rows[_source_title(source)]
+
+    def pending_value(self, title, row, col, default=None):
+        """Value queued for a cell in this batch, or `default` if none"""
+        return self._cells.get(title, {}).get((row, col), default)
+
+    def pending_appends(self, title):
+        """Rows queued for appending to a worksheet (mutable - callers may update them)"""
+        return self._appends.get(title, [])
+
+    # -----------------------
+    # WRITES
+    # -----------------------
+
+    def set_cell(self, title, row, col, value):
+        """Queue one cell write (1-based row/col). A later write to the same cell wins."""
+        self._cells.setdefault(title, {})[(row, col)] = value
+        self.writes_queued += 1
+
+    def set_range(self, title, row, col, values):
+        """Queue a block of values (list of rows) with its top-left cell at row/col"""
+        for r, row_values in enumerate(values):
+            for c, value in enumerate(row_values):
+                self._cells.setdefault(title, {})[(row + r, col + c)] = value
+        self.writes_queued += 1
+
+    def append_row(self, title, values):
+        """Queue a row to append after the last row of the worksheet"""
+        self._appends.setdefault(title, []).append(list(values))
+        self.writes_queued += 1
+
+    def after_flush(self, callback):
+        """Run `callback()` once the writes have been sent (e.g. cache invalidation)"""
+        self._after_flush.append(callback)
+
+    @property
+    def calls_saved(self):
+        return max(self.writes_queued - self.write_calls, 0)
+
+    def flush(self):
+        start_time = time.time()
+
+        data = []
+        for title, cells in self._cells.items():
+            data.extend(self._merge_ranges(title, cells))
+
+        if data:
+            self.client.http_client.values_batch_update(
+                self.spreadsheet_id,
+                {"valueInputOption": self.VALUE_INPUT_OPTION, "data": data},
+            )
+            self.write_calls += 1
+
+        for title, rows in self._appends.items():
+            if not rows:
+                continue
+            self.client.http_client.values_append(
+                self.spreadsheet_id,
+                absolute_range_name(title),
+                {"valueInputOption": self.VALUE_INPUT_OPTION},
+                {"values": rows},
+            )
+            self.write_calls += 1
+
+        self._cells = {}
+        self._appends = {}
+
+        for callback in self._after_flush:
+            callback()
+        self._after_flush = []
+
+        if self.writes_queued:
+            logger.info(
+                f"[TIMING] SheetWriteBatch flushed {self.writes_queued} writes in {self.write_calls} calls "
+                f"(+{self.read_calls} reads, saved {self.calls_saved}) - Duration: {time.time() - start_time:.2f}s"
+            )
+
+    @staticmethod
+    def _merge_ranges(title, cells):
+        """Group a worksheet's cells into value ranges, one per run of adjacent columns in a row"""
+        by_row = {}
+        for (row, col), value in cells.items():
+            by_row.setdefault(row, {})[col] = value
+
+        ranges = []
+        for row in sorted(by_row):
+            columns = by_row[row]
+            run = []
+            for col in sorted(columns):
+                if run and col != run[-1] + 1:
+                    ranges.append(SheetWriteBatch._value_range(title, row, run, columns))
+                    run = []
+                run.append(col)
+            ranges.append(SheetWriteBatch._value_range(title, row, run, columns))
+        return ranges
+
+    @staticmethod
+    def _value_range(title, row, run, columns):
+        a1 = rowcol_to_a1(row, run[0])
+        if len(run) > 1:
+            a1 = f"{a1}:{rowcol_to_a1(row, run[-1])}"
+        return {
+            "range": absolute_range_name(title, a1),
+            "values": [[columns[col] for col in run]],
+        }
 
 
 # -----------------------
@@ -73,12 +223,15 @@ class SheetsSync:
     Uses ENV-based Google Service Account authentication (Render-safe).
     """
 
-    SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-
     # ---- SHEET CONFIG ----
     COMPANY_SHEET_ID = "1H54mqxD9P2RXX3u8JDwtCg5Wokf2CHPPEjQ7mkqDZnQ"
     COMPANY_STOCK_WORKSHEET = "Mrp List"
     TECHNICIAN_STOCK_WORKSHEET = "Technician Stocks"
+    COMPANY_STOCK_CACHE_KEY = "company_stock_data"
+
+    # Columns actually read: Mrp List B-G (spare id .. qty), Technician Stocks A-D
+    COMPANY_STOCK_PROJECTION = SheetProjection(COMPANY_STOCK_WORKSHEET, range(1, 7))
+    TECHNICIAN_STOCK_PROJECTION = SheetProjection(TECHNICIAN_STOCK_WORKSHEET, range(0, 4))
 
     def __init__(self):
         # IMPORTANT: Do NOT authenticate here
@@ -89,6 +242,15 @@ class SheetsSync:
         # from Google on every single call, which is what was causing the
         # worker timeout when processing many complaints in one request.
         self._tech_stock_cache = None
+        self._tech_stock_loaded_at = None
+        # "Mrp List" shared by all workers (versioned), served stale while it
+        # refreshes and as a fallback while Google is down
+        self._company_stock = StaleWhileRevalidate(
+            self.COMPANY_STOCK_CACHE_KEY,
+            self._fetch_company_stock,
+            fresh_for=getattr(settings, 'COMPANY_STOCK_TTL', 86400),
+            keep_for=getattr(settings, 'COMPANY_STOCK_KEEP_FOR', 604800),
+        )
 
     # -----------------------
     # AUTHENTICATION (ENV BASED)
@@ -96,159 +258,98 @@ class SheetsSync:
 
     def authenticate(self):
         """
-        Authenticate lazily using GOOGLE_SERVICE_ACCOUNT_JSON env variable.
-        Enhanced with detailed logging for connection debugging.
+        Attach the process-wide Google Sheets client (built from the
+        GOOGLE_SERVICE_ACCOUNT_JSON env variable on first use). Warm calls do
+        no network I/O - connectivity probes live in diagnose().
         """
         if self.client:
             logger.debug("Google Sheets client already authenticated")
             return
 
         start_time = time.time()
-        logger.info("=== GOOGLE SHEETS AUTHENTICATION START ===")
-        logger.info(f"[TIMING] Sheets authentication started at: {time.strftime('%H:%M:%S.%f', time.gmtime())}")
-        
         try:
-            # Check environment variable
-            env_start = time.time()
-            service_account_json = os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON")
-            env_time = time.time() - env_start
-            logger.info(f"[TIMING] Environment variable check completed in: {env_time:.3f}s")
-            logger.info(f"Service account JSON env var check: {'SET' if service_account_json else 'NOT_SET'}")
-
-            if not service_account_json:
-                logger.error("GOOGLE_SERVICE_ACCOUNT_JSON environment variable not set")
-                raise Exception(
-                    "GOOGLE_SERVICE_ACCOUNT_JSON environment variable not set"
-                )
-
-            # Parse JSON
-            logger.info("[TIMING] Parsing service account JSON...")
-            parse_start = time.time()
-            try:
-                service_account_info = json.loads(service_account_json)
-                logger.info(f"Service account JSON parsed successfully. Keys: {list(service_account_info.keys())}")
-                if 'client_email' in service_account_info:
-                    logger.info(f"Client email: {service_account_info['client_email']}")
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse service account JSON: {e}")
-                raise
-            parse_time = time.time() - parse_start
-            logger.info(f"[TIMING] JSON parsing completed in: {parse_time:.3f}s")
-
-            # Test network connectivity
-            logger.info("[TIMING] Testing network connectivity...")
-            net_start = time.time()
-            try:
-                # Test DNS resolution
-                dns_start = time.time()
-                socket.gethostbyname('www.googleapis.com')
-                dns_time = time.time() - dns_start
-                logger.info(f"[TIMING] DNS resolution completed in: {dns_time:.3f}s")
-                logger.info("DNS resolution for www.googleapis.com: OK")
-                
-                # Test HTTP connection to Google APIs
-                http_start = time.time()
-                test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                test_socket.settimeout(10)
-                result = test_socket.connect_ex(('www.googleapis.com', 443))
-                test_socket.close()
-                http_time = time.time() - http_start
-                
-                if result == 0:
-                    logger.info(f"[TIMING] HTTP connection test completed in: {http_time:.3f}s")
-                    logger.info("HTTP connection to www.googleapis.com:443: OK")
-                else:
-                    logger.warning(f"HTTP connection to www.googleapis.com:443 failed with code {result}")
-            except Exception as net_error:
-                logger.error(f"Network connectivity test failed: {net_error}")
-            net_time = time.time() - net_start
-            logger.info(f"[TIMING] Network connectivity test completed in: {net_time:.3f}s")
-            
-            # Create credentials
-            logger.info("[TIMING] Creating Google credentials...")
-            creds_start = time.time()
-            creds = Credentials.from_service_account_info(
-                service_account_info,
-                scopes=self.SCOPES
-            )
-            creds_time = time.time() - creds_start
-            logger.info(f"[TIMING] Credentials creation completed in: {creds_time:.3f}s")
-            logger.info(f"Credentials created. Scopes: {self.SCOPES}")
-            logger.info(f"Token valid: {creds.valid if hasattr(creds, 'valid') else 'Unknown'}")
-
-            # Authorize client
-            logger.info("[TIMING] Authorizing gspread client...")
-            auth_start = time.time()
-            self.client = gspread.authorize(creds)
-            auth_time = time.time() - auth_start
-            logger.info(f"[TIMING] Gspread authorization completed in: {auth_time:.3f}s")
-            
-            duration = time.time() - start_time
-            logger.info(f"=== GOOGLE SHEETS AUTHENTICATION SUCCESS === Duration: {duration:.2f}s")
-            
-            # Test the connection
-            logger.info("[TIMING] Testing Google Sheets connection...")
-            test_start = time.time()
-            try:
-                # Try to open the spreadsheet to verify connection
-                test_spreadsheet = self.client.open_by_key(self.COMPANY_SHEET_ID)
-                test_time = time.time() - test_start
-                logger.info(f"[TIMING] Connection test completed in: {test_time:.3f}s")
-                logger.info(f"Successfully connected to spreadsheet: {test_spreadsheet.title}")
-            except Exception as test_error:
-                test_time = time.time() - test_start
-                logger.error(f"[TIMING] Connection test failed after: {test_time:.3f}s")
-                logger.warning(f"Connection test failed: {test_error}")
-
+            self.client = get_sheets_client()
         except Exception as e:
             duration = time.time() - start_time
             logger.error(f"=== GOOGLE SHEETS AUTHENTICATION FAILED === Duration: {duration:.2f}s")
-            logger.error(f"[TIMING] Authentication failed after: {duration:.3f}s")
             logger.error(f"Error: {e}")
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
 
+        logger.info(f"[TIMING] Sheets authentication completed in: {time.time() - start_time:.3f}s")
+
+    def diagnose(self):
+        """DNS / TCP / open_by_key probes against Google, for debugging connection issues"""
+        return run_connectivity_diagnostics(self.COMPANY_SHEET_ID)
+
     # -----------------------
     # COMPANY STOCK
     # -----------------------
 
     def get_company_stock(self):
+        start_time = time.time()
+        stock = self._company_stock.get()
+        if stock_ledger.ledger_enabled():
+            # Catalogue details from the sheet, quantities from the ledger
+            ledger = stock_ledger.quantities(stock_ledger.COMPANY)
+            stock = [
+                CatalogItem(s.spare_id, s.name, s.mrp, s.hsn, s.brand, ledger[s.spare_id])
+                if ledger.get(s.spare_id, s.qty) != s.qty else s
+                for s in stock
+            ]
+        logger.info(f"Company stock: {len(stock)} items - Duration: {time.time() - start_time:.2f}s")
+        return stock
+
+    def company_quantities(self, spare_ids):
+        """{spare_id: available qty} - a ledger read, or the cached sheet copy minus queued changes"""
+        if stock_ledger.ledger_enabled():
+            return stock_ledger.quantities(stock_ledger.COMPANY, spare_ids)
+
+        wanted = set(spare_ids)
+        available = {item.spare_id: item.qty for item in self.get_company_stock() if item.spare_id in wanted}
+        for spare_id, delta in pending_stock_deltas().items():
+            if spare_id in available:
+                available[spare_id] += delta
+        return available
+
+    def find_company_shortfall(self, items):
+        """
+        Check [{"spare_id", "qty"}] against the cached company stock minus
+        changes still queued in the outbox. Returns the first problem as a
+        message, or None when everything is covered.
+        """
+        needed = {}
+        for item in items:
+            needed[item["spare_id"]] = needed.get(item["spare_id"], 0) + item["qty"]
+
+        available = self.company_quantities(needed)
+        for spare_id, qty in needed.items():
+            if spare_id not in available:
+                return f"Spare Code {spare_id} not found"
+            if qty > available[spare_id]:
+                return f"Insufficient stock for {spare_id} (Available: {available[spare_id]})"
+        return None
+
+    def _fetch_company_stock(self):
         start_time = time.time()
         process = psutil.Process(os.getpid())
         memory_before = process.memory_info().rss / 1024 / 1024
         
         logger.info(f"=== GET COMPANY STOCK START === Memory: {memory_before:.1f}MB")
-        
-        cache_key = "company_stock_data"
-        cached_data = cache.get(cache_key)
-        
-        if cached_data is not None:
-            duration = time.time() - start_time
-            logger.info(f"Returning cached company stock data ({len(cached_data)} items) - "
-                       f"Duration: {duration:.2f}s - Memory: {memory_before:.1f}MB")
-            return cached_data
-        
         logger.info(f"Fetching company stock from Google Sheets - Memory: {memory_before:.1f}MB")
         
         try:
             self.authenticate()
-            logger.info("Authentication completed, opening spreadsheet...")
 
-            with timeout_context(15):  # 15 second timeout for opening spreadsheet
-                spreadsheet = self.client.open_by_key(self.COMPANY_SHEET_ID)
-            logger.info(f"Spreadsheet opened: {spreadsheet.title}")
-            
-            with timeout_context(10):  # 10 second timeout for accessing worksheet
-                sheet = spreadsheet.worksheet(self.COMPANY_STOCK_WORKSHEET)
-            logger.info(f"Worksheet accessed: {self.COMPANY_STOCK_WORKSHEET}")
-
-            logger.info("Fetching all values from worksheet...")
+            logger.info("Fetching projected columns from worksheet...")
             try:
-                with timeout_context(20):  # 20 second timeout for sheets API
-                    rows = sheet.get_all_values()
-            except TimeoutError:
+                with sheets_deadline(20):  # 20 second timeout for sheets API
+                    rows = fetch_projected(
+                        self.COMPANY_SHEET_ID, [self.COMPANY_STOCK_PROJECTION], self.client
+                    )[self.COMPANY_STOCK_WORKSHEET]
+            except SheetsTimeout:
                 logger.error("Google Sheets API call timed out after 20 seconds")
-                raise Exception("Google Sheets API timeout - please try again")
+                raise
             
             data_rows = rows[1:]
             
@@ -267,20 +368,9 @@ class SheetsSync:
                     continue
 
                 processed_count += 1
-                stock.append({
-                    "spare_id": r[1].strip(),
-                    "name": r[2].strip(),
-                    "mrp": safe_float(r[3]),
-                    "hsn": r[4].strip() if len(r) > 4 else "",
-                    "brand": r[5].strip() if len(r) > 5 else "",
-                    "qty": safe_int(r[6]) if len(r) > 6 else 0,
-                })
+                stock.append(CatalogItem.from_row(r))
 
             logger.info(f"Processed {processed_count} valid items, skipped {skipped_count} invalid rows")
-
-            # Cache for 24 hours (86400 seconds)
-            cache.set(cache_key, stock, 86400)
-            logger.info(f"Company stock cached for 24 hours")
             
             duration = time.time() - start_time
             memory_after = process.memory_info().rss / 1024 / 1024
@@ -302,10 +392,10 @@ class SheetsSync:
     # TECHNICIAN STOCK
     # -----------------------
 
-    def _get_tech_stock_sheet_rows(self, force_refresh=False):
+    def _get_tech_stock_lines(self, force_refresh=False):
         """
-        Fetch the "Technician Stocks" worksheet ONCE and cache the raw rows
-        on this instance. Every complaint used to trigger its own full-sheet
+        Fetch the "Technician Stocks" worksheet ONCE and cache its parsed
+        lines on this instance. Every complaint used to trigger its own full-sheet
         fetch (~1s+ round trip to Google), so 69 complaints meant 69+ sequential
         network calls in a single request - easily blowing past gunicorn's
         worker timeout. Now we fetch it once per run and reuse it.
@@ -314,13 +404,23 @@ class SheetsSync:
             return self._tech_stock_cache
 
         self.authenticate()
-        spreadsheet = self.client.open_by_key(self.COMPANY_SHEET_ID)
-        sheet = spreadsheet.worksheet(self.TECHNICIAN_STOCK_WORKSHEET)
+        fetched_at = timezone.now()
+        # Concurrent requests share one download of the sheet
+        rows = single_flight.run(
+            self.TECHNICIAN_STOCK_WORKSHEET,
+            lambda: fetch_projected(
+                self.COMPANY_SHEET_ID, [self.TECHNICIAN_STOCK_PROJECTION], self.client
+            )[self.TECHNICIAN_STOCK_WORKSHEET],
+            getattr(settings, 'SHEETS_SINGLE_FLIGHT_WAIT', 15),
+        )
+        self.seed_tech_stock_rows(rows, fetched_at)
+        return self._tech_stock_cache
 
-        rows = sheet.get_all_values()
-        self._tech_stock_cache = rows[1:]
+    def seed_tech_stock_rows(self, rows, fetched_at=None):
+        """Parse and cache "Technician Stocks" rows (header included), e.g. fetched together with Tracking"""
+        self._tech_stock_cache = [TechStockLine.from_row(r) for r in rows[1:] if len(r) >= 4 and r[1]]
+        self._tech_stock_loaded_at = fetched_at or timezone.now()
         logger.info(f"Fetched and cached {len(self._tech_stock_cache)} rows from technician stock sheet")
-        return self._tech_stock_cache
 
     def get_technician_stock(self, technician_name):
         start_time = time.time()
@@ -329,22 +429,16 @@ class SheetsSync:
         
         logger.info(f"Fetching technician stock for '{technician_name}' - Memory: {memory_before:.1f}MB")
 
-        data_rows = self._get_tech_stock_sheet_rows()
-
-        stock = []
-
-        for r in data_rows:
-            if len(r) < 4 or not r[1]:
-                continue
-
-            if r[3].strip().lower() != technician_name.strip().lower():
-                continue
+        tech_key = technician_name.strip().lower()
+        if stock_ledger.ledger_enabled():
+            stock = stock_ledger.technician_lines(technician_name)
+        else:
+            stock = [line for line in self._get_tech_stock_lines() if line.technician_key == tech_key]
 
-            stock.append({
-                "spare_id": r[1].strip(),
-                "name": r[0].strip(),
-                "qty": safe_int(r[2]),
-            })
+            # Stock changes still in the outbox (or applied after our copy was read)
+            deltas = pending_stock_deltas(technician_name, applied_since=self._tech_stock_loaded_at)
+            if deltas:
+                stock = self._with_pending(stock, deltas, tech_key)
 
         duration = time.time() - start_time
         memory_after = process.memory_info().rss / 1024 / 1024
@@ -357,27 +451,62 @@ class SheetsSync:
         )
         return stock
 
+    @staticmethod
+    def _with_pending(stock, deltas, tech_key):
+        adjusted = []
+        for line in stock:
+            delta = deltas.pop(line.spare_id, 0)
+            if delta:
+                line = TechStockLine(line.spare_id, line.name, line.qty + delta, line.technician_key)
+            adjusted.append(line)
+        # Spares the technician gets a first row for on the next flush
+        adjusted.extend(
+            TechStockLine(spare_id, spare_id, delta, tech_key) for spare_id, delta in deltas.items() if delta > 0
+        )
+        return adjusted
+
+    # -----------------------
+    # BATCHED WRITES
+    # -----------------------
+
+    def write_batch(self):
+        """
+        SheetWriteBatch for the company spreadsheet. Pass it as `batch=` to
+        update_company_stock()/update_technician_stock() to send all of a
+        request's stock changes in one flush.
+        """
+        self.authenticate()
+        return SheetWriteBatch(self.client, self.COMPANY_SHEET_ID)
+
     # -----------------------
     # UPDATE COMPANY STOCK
     # -----------------------
 
-    def update_company_stock(self, spare_id, qty_to_reduce):
+    def update_company_stock(self, spare_id, qty_to_reduce, batch=None):
+        if batch is None:
+            with self.write_batch() as batch:
+                return self.update_company_stock(spare_id, qty_to_reduce, batch=batch)
+
         start_time = time.time()
         process = psutil.Process(os.getpid())
         memory_before = process.memory_info().rss / 1024 / 1024
         
         logger.info(f"Updating company stock: {spare_id} -{qty_to_reduce} - Memory: {memory_before:.1f}MB")
-        self.authenticate()
 
-        spreadsheet = self.client.open_by_key(self.COMPANY_SHEET_ID)
-        sheet = spreadsheet.worksheet(self.COMPANY_STOCK_WORKSHEET)
+        rows = batch.get_rows(self.COMPANY_STOCK_PROJECTION)
 
-        cell = sheet.find(spare_id, in_column=2)
-        if not cell:
+        row_idx = next(
+            (idx + 1 for idx, r in enumerate(rows) if idx > 0 and len(r) > 1 and r[1].strip() == spare_id),
+            None
+        )
+        if not row_idx:
             raise Exception(f"Spare Code {spare_id} not found")
 
-        row_idx = cell.row
-        current_qty = safe_int(sheet.cell(row_idx, 7).value)
+        sheet_row = rows[row_idx - 1]
+        current_qty = safe_int(batch.pending_value(
+            self.COMPANY_STOCK_WORKSHEET, row_idx, 7,
+            sheet_row[6] if len(sheet_row) > 6 else ""
+        ))
 
         new_qty = current_qty - qty_to_reduce
         if new_qty < 0:
@@ -385,10 +514,10 @@ class SheetsSync:
                 f"Insufficient stock for {spare_id} (Available: {current_qty})"
             )
 
-        sheet.update_cell(row_idx, 7, new_qty)
+        batch.set_cell(self.COMPANY_STOCK_WORKSHEET, row_idx, 7, new_qty)
 
-        # Invalidate cache after updating stock
-        cache.delete("company_stock_data")
+        # Revalidate the cached list once the new quantity is actually on the sheet
+        batch.after_flush(self._company_stock.invalidate)
         
         duration = time.time() - start_time
         memory_after = process.memory_info().rss / 1024 / 1024
@@ -405,94 +534,288 @@ class SheetsSync:
     # UPDATE TECHNICIAN STOCK
     # -----------------------
 
-    def update_technician_stock(self, technician_name, spare_id, qty_to_add):
-        self.authenticate()
-
-        spreadsheet = self.client.open_by_key(self.COMPANY_SHEET_ID)
-        sheet = spreadsheet.worksheet(self.TECHNICIAN_STOCK_WORKSHEET)
+    def update_technician_stock(self, technician_name, spare_id, qty_to_add, batch=None):
+        if batch is None:
+            with self.write_batch() as batch:
+                return self.update_technician_stock(technician_name, spare_id, qty_to_add, batch=batch)
 
-        # Reuse the cached rows if we already have them this run instead of
-        # doing yet another full-sheet fetch just to locate the row.
-        data_rows = self._get_tech_stock_sheet_rows()
+        worksheet = self.TECHNICIAN_STOCK_WORKSHEET
+        rows = batch.get_rows(self.TECHNICIAN_STOCK_PROJECTION)
+        tech_key = technician_name.strip().lower()
 
         found_row = None
 
-        for idx, r in enumerate(data_rows):
+        for idx, r in enumerate(rows):
             if (
+                idx > 0 and
                 len(r) >= 4 and
                 r[1].strip() == spare_id and
-                r[3].strip().lower() == technician_name.strip().lower()
+                r[3].strip().lower() == tech_key
             ):
-                found_row = idx + 2
+                found_row = idx + 1
                 break
 
         if found_row:
-            current_qty = safe_int(sheet.cell(found_row, 3).value)
-            sheet.update_cell(found_row, 3, current_qty + qty_to_add)
+            sheet_row = rows[found_row - 1]
+            current_qty = safe_int(batch.pending_value(worksheet, found_row, 3, sheet_row[2]))
+            batch.set_cell(worksheet, found_row, 3, current_qty + qty_to_add)
         else:
-            company_stock = self.get_company_stock()
-            item = next(
-                (s for s in company_stock if s["spare_id"] == spare_id),
+            # Same spare added twice in one batch - grow the row we already queued
+            pending = next(
+                (r for r in batch.pending_appends(worksheet)
+                 if r[1] == spare_id and r[3].strip().lower() == tech_key),
                 None
             )
+            if pending:
+                pending[2] += qty_to_add
+            else:
+                company_stock = self.get_company_stock()
+                item = next(
+                    (s for s in company_stock if s.spare_id == spare_id),
+                    None
+                )
 
-            if not item:
-                raise Exception(f"Spare {spare_id} not found in company stock")
-
-            sheet.append_row(
-                [
-                    item["name"],
-                    spare_id,
-                    qty_to_add,
-                    technician_name,
-                ],
-                value_input_option="USER_ENTERED"
-            )
+                if not item:
+                    raise Exception(f"Spare {spare_id} not found in company stock")
+
+                batch.append_row(
+                    worksheet,
+                    [
+                        item.name,
+                        spare_id,
+                        qty_to_add,
+                        technician_name,
+                    ]
+                )
 
-        # The sheet just changed on Google's side, so the cached snapshot is
-        # stale. Drop it - the next get_technician_stock()/update call will
-        # do one fresh fetch and re-cache.
-        self._tech_stock_cache = None
+        # The sheet is about to change on Google's side, so the cached snapshot
+        # is stale. Drop it after the flush - the next get_technician_stock()
+        # call will do one fresh fetch and re-cache.
+        batch.after_flush(self._clear_tech_stock_cache)
 
         return True
 
+    def _clear_tech_stock_cache(self):
+        self._tech_stock_cache = None
+
+    # -----------------------
+    # BULK TRANSFER
+    # -----------------------
+
+    def transfer_stock(self, items, technician_name, batch=None, source="transfer_stock"):
+        """
+        Move [{"spare_id", "qty"}] from company stock to one technician.
+
+        All rows are resolved from one read of both stock worksheets and every
+        quantity is validated before anything is queued - StockTransferError
+        lists all problems at once. The company decrements, technician
+        increments and new technician rows then go out in the batch's single
+        flush (two API calls in total, however many items). Pass `batch` to
+        combine several transfers; later ones see the earlier ones' pending
+        quantities. With the stock ledger enabled the move is a DB
+        transaction instead. Returns the per-spare report of apply_transfers().
+        """
+        return self.apply_transfers({technician_name: _sum_items(items)}, batch=batch, source=source)
+
+    def apply_transfers(self, transfers, batch=None, source="transfer_stock"):
+        """
+        Planned company -> technician moves: `transfers` maps technician sheet
+        name -> {spare_id: qty}. Validates the summed company decrement of
+        every spare up front, then queues all (technician, spare) deltas.
+
+        Returns one report entry per spare: requested total, company
+        before/after and each technician's before/after (before None = new row).
+        """
+        if stock_ledger.ledger_enabled():
+            return self._transfer_in_ledger(transfers, source)
+
+        if batch is None:
+            with self.write_batch() as batch:
+                return self.apply_transfers(transfers, batch=batch, source=source)
+
+        start_time = time.time()
+        company_ws = self.COMPANY_STOCK_WORKSHEET
+        tech_ws = self.TECHNICIAN_STOCK_WORKSHEET
+        batch.prefetch(self.COMPANY_STOCK_PROJECTION, self.TECHNICIAN_STOCK_PROJECTION)
+
+        company_needed = _company_totals(transfers)
+
+        company_rows = batch.get_rows(self.COMPANY_STOCK_PROJECTION)
+        company_index = {}
+        for idx, r in enumerate(company_rows[1:], start=2):
+            if len(r) > 1 and r[1].strip():
+                company_index.setdefault(r[1].strip(), idx)
+
+        problems, report = [], {}
+        for spare_id, qty in company_needed.items():
+            row_idx = company_index.get(spare_id)
+            if row_idx is None:
+                problems.append(f"Spare Code {spare_id} not found")
+                continue
+            sheet_row = company_rows[row_idx - 1]
+            current_qty = safe_int(batch.pending_value(
+                company_ws, row_idx, 7, sheet_row[6] if len(sheet_row) > 6 else ""
+            ))
+            if qty > current_qty:
+                problems.append(f"Insufficient stock for {spare_id} (Available: {current_qty})")
+            report[spare_id] = {
+                "spare_id": spare_id,
+                "requested": qty,
+                "company_before": current_qty,
+                "company_after": current_qty - qty,
+                "technicians": [],
+            }
+        if problems:
+            raise StockTransferError(problems)
+
+        for spare_id, entry in report.items():
+            batch.set_cell(company_ws, company_index[spare_id], 7, entry["company_after"])
+
+        # (technician, spare) -> sheet row, for every technician at once
+        tech_keys = {name.strip().lower() for name in transfers}
+        tech_rows = batch.get_rows(self.TECHNICIAN_STOCK_PROJECTION)
+        tech_index = {}
+        for idx, r in enumerate(tech_rows[1:], start=2):
+            if len(r) >= 4 and r[3].strip().lower() in tech_keys:
+                tech_index.setdefault((r[3].strip().lower(), r[1].strip()), idx)
+        pending_rows = {
+            (r[3].strip().lower(), r[1]): r for r in batch.pending_appends(tech_ws)
+            if r[3].strip().lower() in tech_keys
+        }
+
+        for technician_name, needed in transfers.items():
+            tech_key = technician_name.strip().lower()
+            for spare_id, qty in needed.items():
+                key = (tech_key, spare_id)
+                tech_row = tech_index.get(key)
+                if tech_row:
+                    before = safe_int(batch.pending_value(tech_ws, tech_row, 3, tech_rows[tech_row - 1][2]))
+                    batch.set_cell(tech_ws, tech_row, 3, before + qty)
+                elif key in pending_rows:
+                    before = pending_rows[key][2]
+                    pending_rows[key][2] += qty
+                else:
+                    before = None
+                    name = company_rows[company_index[spare_id] - 1][2].strip()
+                    batch.append_row(tech_ws, [name, spare_id, qty, technician_name])
+                    pending_rows[key] = batch.pending_appends(tech_ws)[-1]
+
+                report[spare_id]["technicians"].append({
+                    "technician": technician_name,
+                    "qty": qty,
+                    "before": before,
+                    "after": (before or 0) + qty,
+                })
+
+        batch.after_flush(self._company_stock.invalidate)
+        batch.after_flush(self._clear_tech_stock_cache)
+
+        logger.info(
+            f"Stock transfer to {len(transfers)} technicians queued: {len(report)} spares - "
+            f"Duration: {time.time() - start_time:.2f}s"
+        )
+        return list(report.values())
+
+    def _transfer_in_ledger(self, transfers, source):
+        company_needed = _company_totals(transfers)
+        available = stock_ledger.quantities(stock_ledger.COMPANY, company_needed)
+        problems = [
+            f"Spare Code {spare_id} not found" if spare_id not in available
+            else f"Insufficient stock for {spare_id} (Available: {available[spare_id]})"
+            for spare_id, qty in company_needed.items()
+            if qty > available.get(spare_id, -1)
+        ]
+        if problems:
+            raise StockTransferError(problems)
+
+        report = {
+            spare_id: {
+                "spare_id": spare_id,
+                "requested": qty,
+                "company_before": available[spare_id],
+                "company_after": available[spare_id] - qty,
+                "technicians": [],
+            }
+            for spare_id, qty in company_needed.items()
+        }
+        with transaction.atomic():
+            for technician_name, needed in transfers.items():
+                for spare_id, qty in needed.items():
+                    after = stock_ledger.transfer(spare_id, qty, technician_name, source=source)
+                    report[spare_id]["technicians"].append({
+                        "technician": technician_name, "qty": qty, "before": after - qty, "after": after,
+                    })
+        return list(report.values())
+
     # -----------------------
     # COURIER → SHEETS SYNC
     # -----------------------
 
-    def sync_courier_to_sheets(self, items, technician_ids):
-        from .models import TechnicianStock
+    def sync_courier_to_sheets(self, items, technician_ids, source="courier_sync"):
+        """
+        Move `items` ([{"spare_id", "qty"}], qty per technician) from company
+        stock to every technician in `technician_ids` as one planned
+        transfer. Sheet names come from the cached technician mapping, the
+        (technician, spare) deltas are computed at once and the whole courier
+        is queued as one outbox group (record_stock_transfer): applied by
+        apply_transfers() in one batched write, or refused whole. With the
+        stock ledger it is applied right away.
+
+        Returns one report entry per spare: the total requested and each
+        technician's qty (with the ledger, apply_transfers()'s report with
+        before/after quantities).
+        """
+        from api.services.sheet_outbox import record_stock_transfer
 
-        self.authenticate()
+        start_time = time.time()
 
+        names = technician_names()
         tech_mapping = {}
-
         for tech_id in technician_ids:
-            tech_stock = TechnicianStock.objects.filter(
-                technician_id=tech_id
-            ).first()
-
-            if tech_stock and tech_stock.sheet_technician_name:
-                tech_mapping[tech_id] = tech_stock.sheet_technician_name
-            else:
-                try:
-                    user = User.objects.get(id=tech_id)
-                    tech_mapping[tech_id] = user.username
-                except User.DoesNotExist:
-                    continue
+            name = names.for_user_or_username(int(tech_id))
+            if name:
+                tech_mapping[tech_id] = name
 
         if not tech_mapping:
             raise Exception("No valid technicians found")
 
-        for item in items:
-            spare_id = item["spare_id"]
-            qty = item["qty"]
+        per_technician = {spare_id: qty for spare_id, qty in _sum_items(items).items() if qty > 0}
+        # Technicians sharing a sheet name share a row - their deltas add up
+        transfers = {}
+        for name in tech_mapping.values():
+            needed = transfers.setdefault(name, {})
+            for spare_id, qty in per_technician.items():
+                needed[spare_id] = needed.get(spare_id, 0) + qty
+
+        queued = record_stock_transfer(transfers, source=source)
+        report = queued if stock_ledger.ledger_enabled() else [
+            {
+                "spare_id": spare_id,
+                "requested": sum(needed[spare_id] for needed in transfers.values()),
+                "technicians": [{"technician": name, "qty": needed[spare_id]} for name, needed in transfers.items()],
+            }
+            for spare_id in per_technician
+        ]
+
+        logger.info(
+            f"[TIMING] Courier sync: {len(per_technician)} spares x {len(tech_mapping)} technicians "
+            f"queued in {time.time() - start_time:.2f}s"
+        )
+        return report
+
 
-            total_qty = qty * len(tech_mapping)
-            self.update_company_stock(spare_id, total_qty)
+def _sum_items(items):
+    """[{"spare_id", "qty"}] -> {spare_id: total qty}"""
+    needed = {}
+    for item in items:
+        spare_id = item["spare_id"].strip()
+        needed[spare_id] = needed.get(spare_id, 0) + item["qty"]
+    return needed
 
-            for tech_name in tech_mapping.values():
-                self.update_technician_stock(tech_name, spare_id, qty)
 
-        logger.info("Courier sync completed successfully")
-        return True
\ No newline at end of file
+def _company_totals(transfers):
+    totals = {}
+    for needed in transfers.values():
+        for spare_id, qty in needed.items():
+            totals[spare_id] = totals.get(spare_id, 0) + qty
+    return totals
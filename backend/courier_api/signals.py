@@ -0,0 +1,22 @@
+# E:\study\techfix\backend\courier_api\signals.py
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import technician_names
+from .models import TechnicianStock
+
+
+@receiver(post_save, sender=TechnicianStock)
+@receiver(post_delete, sender=TechnicianStock)
+@receiver(post_delete, sender=User)
+def technician_mapping_changed(sender, **kwargs):
+    technician_names.invalidate()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, update_fields=None, **kwargs):
+    # Logins save last_login only - no name changed
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    technician_names.invalidate()
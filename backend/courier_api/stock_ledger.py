@@ -0,0 +1,251 @@
+# E:\study\techfix\backend\courier_api\stock_ledger.py
+"""
+Stock ledger: StockBalance / StockMovement in the database.
+
+With STOCK_LEDGER_ENABLED the ledger is the authoritative stock. A stock
+move is one conditional UPDATE ... SET qty = qty + n (atomic, no
+read-modify-write against the sheet) plus a StockMovement row, and
+availability checks are indexed DB reads. The sheet tabs become an export:
+export_to_sheets() writes the quantities to "Mrp List" column G and
+"Technician Stocks" in one batched call, so edits made directly to those
+quantities on the sheet are overwritten - change stock through the app, or
+re-import. Rows added on the sheet are kept, but not counted until imported.
+
+Locations: "company" for the company store, technician_location(name) for
+a technician (the "Technician Stocks" column D name, lower-cased).
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from api.services.sheet_records import TechStockLine
+from .models import StockBalance, StockMovement
+
+logger = logging.getLogger(__name__)
+
+COMPANY = "company"
+_TECH_PREFIX = "tech:"
+
+# Last StockMovement id written to the sheet, shared by all workers
+_EXPORTED_THROUGH_KEY = "stock_ledger:exported_through"
+
+
+class InsufficientStock(Exception):
+    """The company store does not hold enough of a spare (or does not stock it at all)"""
+
+
+def ledger_enabled():
+    return getattr(settings, 'STOCK_LEDGER_ENABLED', False)
+
+
+def technician_location(technician_name):
+    return f"{_TECH_PREFIX}{technician_name.strip().lower()}"
+
+
+# -----------------------
+# MOVES
+# -----------------------
+
+def move(location, spare_id, quantity, source="", holder=""):
+    """
+    qty += quantity at `location` and record the movement. The company
+    store never goes below zero (InsufficientStock); technician stock may,
+    as it always could on the sheet. `holder` names the technician on a
+    newly created balance. Returns the new balance.
+    """
+    spare_id = spare_id.strip()
+    company = location == COMPANY
+
+    with transaction.atomic():
+        balances = StockBalance.objects.filter(location=location, spare_id=spare_id)
+        guarded = balances.filter(qty__gte=-quantity) if company and quantity < 0 else balances
+        updates = {'qty': F('qty') + quantity, 'updated_at': timezone.now()}
+
+        if not guarded.update(**updates):
+            if company:
+                available = balances.values_list('qty', flat=True).first()
+                if available is None:
+                    raise InsufficientStock(f"Spare Code {spare_id} not found")
+                raise InsufficientStock(f"Insufficient stock for {spare_id} (Available: {available})")
+            _create_balance(location, spare_id, holder)
+            balances.update(**updates)
+
+        balance_after = balances.values_list('qty', flat=True).get()
+        StockMovement.objects.create(
+            location=location, spare_id=spare_id, quantity=quantity, balance_after=balance_after, source=source,
+        )
+    return balance_after
+
+
+def _create_balance(location, spare_id, holder):
+    """First stock of a spare for a technician; the part name comes from the company row"""
+    name = (
+        StockBalance.objects.filter(location=COMPANY, spare_id=spare_id)
+        .values_list('name', flat=True).first()
+    )
+    if name is None:
+        raise InsufficientStock(f"Spare {spare_id} not found in company stock")
+    try:
+        with transaction.atomic():
+            StockBalance.objects.create(location=location, spare_id=spare_id, name=name, holder=holder, qty=0)
+    except IntegrityError:
+        pass  # created concurrently - the caller's UPDATE applies to that row
+
+
+def transfer(spare_id, quantity, technician_name, source=""):
+    """Move `quantity` from the company store to a technician, atomically"""
+    with transaction.atomic():
+        move(COMPANY, spare_id, -quantity, source=source)
+        return move(technician_location(technician_name), spare_id, quantity, source=source, holder=technician_name)
+
+
+# -----------------------
+# READS
+# -----------------------
+
+def quantities(location, spare_ids=None):
+    """{spare_id: qty} at `location`, optionally only for `spare_ids`"""
+    balances = StockBalance.objects.filter(location=location)
+    if spare_ids is not None:
+        balances = balances.filter(spare_id__in=list(spare_ids))
+    return dict(balances.values_list('spare_id', 'qty'))
+
+
+def technician_lines(technician_name):
+    tech_key = technician_name.strip().lower()
+    return [
+        TechStockLine(spare_id, name, qty, tech_key)
+        for spare_id, name, qty in StockBalance.objects.filter(
+            location=technician_location(technician_name)
+        ).order_by('name').values_list('spare_id', 'name', 'qty')
+    ]
+
+
+# -----------------------
+# SHEET IMPORT / EXPORT
+# -----------------------
+
+def import_from_sheets(sheets_sync):
+    """Replace the whole ledger with the quantities currently on the sheet. Returns the row count."""
+    from api.services.sheet_projection import fetch_projected
+    from api.services.sheet_records import CatalogItem
+
+    sheets_sync.authenticate()
+    rows = fetch_projected(
+        sheets_sync.COMPANY_SHEET_ID,
+        [sheets_sync.COMPANY_STOCK_PROJECTION, sheets_sync.TECHNICIAN_STOCK_PROJECTION],
+        sheets_sync.client,
+    )
+
+    balances = {}
+    for r in rows[sheets_sync.COMPANY_STOCK_WORKSHEET][1:]:
+        if len(r) >= 7 and r[1]:
+            item = CatalogItem.from_row(r)
+            balances[(COMPANY, item.spare_id)] = StockBalance(
+                location=COMPANY, spare_id=item.spare_id, name=item.name, qty=item.qty,
+            )
+    for r in rows[sheets_sync.TECHNICIAN_STOCK_WORKSHEET][1:]:
+        if len(r) >= 4 and r[1]:
+            line = TechStockLine.from_row(r)
+            key = (technician_location(line.technician_key), line.spare_id)
+            if key in balances:
+                balances[key].qty += line.qty  # duplicate sheet rows add up
+            else:
+                balances[key] = StockBalance(
+                    location=key[0], spare_id=line.spare_id, name=line.name, holder=r[3].strip(), qty=line.qty,
+                )
+
+    with transaction.atomic():
+        StockBalance.objects.all().delete()
+        StockBalance.objects.bulk_create(balances.values(), batch_size=1000)
+        StockMovement.objects.bulk_create(
+            (StockMovement(location=b.location, spare_id=b.spare_id, quantity=b.qty, balance_after=b.qty, source="import")
+             for b in balances.values()),
+            batch_size=1000,
+        )
+    _mark_exported()
+    logger.info(f"Stock ledger imported {len(balances)} balances from Google Sheets")
+    return len(balances)
+
+
+def export_to_sheets(sheets_sync, force=False):
+    """
+    Write the ledger quantities to "Mrp List" column G and "Technician
+    Stocks" column C, changed cells only, in one batched call; technician
+    balances without a row are appended. Rows not in the ledger are left
+    in place and logged. Skipped when nothing moved since the last export.
+    Returns the number of cells written, or None if skipped.
+    """
+    last_movement = StockMovement.objects.aggregate(last=Max('id'))['last'] or 0
+    if not force and caches['shared'].get(_EXPORTED_THROUGH_KEY) == last_movement:
+        return None
+
+    start_time = time.time()
+    company_sheet = sheets_sync.COMPANY_STOCK_WORKSHEET
+    tech_sheet = sheets_sync.TECHNICIAN_STOCK_WORKSHEET
+
+    company = quantities(COMPANY)
+    technician = {
+        (location, spare_id): [name, spare_id, qty, holder or location[len(_TECH_PREFIX):]]
+        for location, spare_id, name, holder, qty in StockBalance.objects.filter(
+            location__startswith=_TECH_PREFIX
+        ).order_by('location', 'name', 'spare_id').values_list('location', 'spare_id', 'name', 'holder', 'qty')
+    }
+
+    with sheets_sync.write_batch() as batch:
+        batch.prefetch(sheets_sync.COMPANY_STOCK_PROJECTION, sheets_sync.TECHNICIAN_STOCK_PROJECTION)
+
+        for idx, r in enumerate(batch.get_rows(sheets_sync.COMPANY_STOCK_PROJECTION)[1:], start=2):
+            spare_id = r[1].strip() if len(r) > 1 else ""
+            if spare_id in company and _differs(r, 6, company[spare_id]):
+                batch.set_cell(company_sheet, idx, 7, company[spare_id])
+
+        # Rows stay where they are: a balance updates the quantity of its own
+        # row, new balances are appended. Rows the ledger has no balance for
+        # (added on the sheet since the import) are left as they are.
+        written, unknown = set(), []
+        for idx, r in enumerate(batch.get_rows(sheets_sync.TECHNICIAN_STOCK_PROJECTION)[1:], start=2):
+            if len(r) < 4 or not r[1].strip():
+                continue
+            key = (technician_location(r[3]), r[1].strip())
+            if key in written:
+                # The import added duplicate rows up into the balance written above
+                if _differs(r, 2, 0):
+                    batch.set_cell(tech_sheet, idx, 3, 0)
+            elif key in technician:
+                written.add(key)
+                if _differs(r, 2, technician[key][2]):
+                    batch.set_cell(tech_sheet, idx, 3, technician[key][2])
+            else:
+                unknown.append(f"{r[3].strip()}/{key[1]} (row {idx})")
+        for key, row in technician.items():
+            if key not in written:
+                batch.append_row(tech_sheet, row)
+
+        cells = batch.writes_queued
+        batch.after_flush(sheets_sync._company_stock.invalidate)
+        batch.after_flush(sheets_sync._clear_tech_stock_cache)
+
+    _mark_exported(last_movement)
+    if unknown:
+        logger.warning(
+            f"Stock ledger export left {len(unknown)} \"{tech_sheet}\" rows that are not in the ledger "
+            f"as they are (run stock_ledger --import to take them over): {', '.join(unknown[:20])}"
+        )
+    logger.info(f"[TIMING] Stock ledger export: {cells} cells written - Duration: {time.time() - start_time:.2f}s")
+    return cells
+
+
+def _differs(row, col, value):
+    return (row[col].strip() if len(row) > col else "") != str(value)
+
+
+def _mark_exported(last_movement=None):
+    if last_movement is None:
+        last_movement = StockMovement.objects.aggregate(last=Max('id'))['last'] or 0
+    caches['shared'].set(_EXPORTED_THROUGH_KEY, last_movement, None)
@@ -0,0 +1,102 @@
+# E:\study\techfix\backend\courier_api\technician_names.py
+"""
+Technician -> "Technician Stocks" sheet name resolver.
+
+Every stock path needs the sheet name of a technician: complaint processing
+and sales approvals start from the name on the Tracking sheet / the user's
+first name, my_stock, mark_received and the courier sync from a user id.
+The whole User + TechnicianStock mapping is loaded in one query, kept in
+the shared cache and dropped by the post_save/post_delete signals in
+courier_api.signals, so resolving a name costs no query.
+
+Name matching follows the old per-call lookup: a name matches a user by
+username or first name, case-insensitively, lowest user id first. Failing
+that, the same names with spaces removed are tried (and a configured sheet
+name resolves to itself). Unknown names fall back to lower case without
+spaces, which is how the sheet spells most technicians.
+"""
+import logging
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_CACHE_KEY = "technician_names:v1"
+
+
+def _normalise(name):
+    return " ".join((name or "").split()).lower()
+
+
+def _compact(name):
+    return _normalise(name).replace(" ", "")
+
+
+class TechnicianNames:
+    """One loaded copy of the mapping. Pickled into the shared cache."""
+
+    def __init__(self, users):
+        # users: (id, username, first_name, last_name, sheet_technician_name), by id
+        self.sheet_names = {}
+        self.usernames = {}
+        self._by_name = {}
+        compact = {}
+
+        for user_id, username, first_name, last_name, sheet_name in users:
+            self.usernames[user_id] = username
+            sheet_name = (sheet_name or "").strip()
+            if sheet_name:
+                self.sheet_names[user_id] = sheet_name
+
+            for name in (username, first_name):
+                if _normalise(name):
+                    self._by_name.setdefault(_normalise(name), user_id)
+            for name in (username, first_name, f"{first_name} {last_name}", sheet_name):
+                if _compact(name):
+                    compact.setdefault(_compact(name), user_id)
+
+        for key, user_id in compact.items():
+            self._by_name.setdefault(key, user_id)
+
+    def user_id(self, name):
+        """Id of the user `name` refers to, or None"""
+        user_id = self._by_name.get(_normalise(name))
+        return user_id if user_id is not None else self._by_name.get(_compact(name))
+
+    def for_user(self, user_id):
+        """Configured TechnicianStock.sheet_technician_name of a user, or None"""
+        return self.sheet_names.get(user_id)
+
+    def for_user_or_username(self, user_id):
+        """Sheet name of a user, falling back to the username (None for unknown ids)"""
+        return self.sheet_names.get(user_id) or self.usernames.get(user_id)
+
+    def resolve(self, name):
+        """Sheet name for a technician name from the Tracking sheet or a user's first name"""
+        sheet_name = self.sheet_names.get(self.user_id(name))
+        return sheet_name or name.lower().replace(' ', '')
+
+
+def technician_names():
+    """The current mapping (one query when the cached copy was invalidated)"""
+    cache = caches['shared']
+    names = cache.get(_CACHE_KEY)
+    if names is None:
+        names = TechnicianNames(
+            User.objects.order_by('id').values_list(
+                'id', 'username', 'first_name', 'last_name', 'technician_stock_metadata__sheet_technician_name'
+            )
+        )
+        cache.set(_CACHE_KEY, names, None)
+        logger.debug(f"Technician name mapping loaded: {len(names.usernames)} users")
+    return names
+
+
+def invalidate():
+    """Drop the cached mapping now and again once the current transaction commits"""
+    cache = caches['shared']
+    cache.delete(_CACHE_KEY)
+    # A reader in another process may reload the old rows before the commit
+    transaction.on_commit(lambda: cache.delete(_CACHE_KEY))
@@ -1,36 +1,144 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
-from .models import Stock, Courier, CourierItem
+from api.models import SheetMutation
+from api.services.sheet_outbox import flush_pending
+from api.tests import FakeSheetsHTTP
+from .models import CourierTransaction, StockBalance, StockMovement, TechnicianStock
+from .sheets_sync import SheetsSync, SheetWriteBatch
+from . import stock_ledger
+from .stock_ledger import InsufficientStock
 
-class StockTestCase(TestCase):
+class TechnicianStockTestCase(TestCase):
     def setUp(self):
-        Stock.objects.create(
-            spare_id='SKU001',
-            spare_name='Item 1',
-            brand_name='Brand A',
-            mrp=500,
-            quantity_available=100
-        )
+        self.user = User.objects.create_user('amal', 'amal@test.com', 'password')
+        TechnicianStock.objects.create(technician=self.user, sheet_technician_name='amal')
 
-    def test_stock_creation(self):
-        stock = Stock.objects.get(spare_id='SKU001')
-        self.assertEqual(stock.spare_name, 'Item 1')
+    def test_technician_stock_creation(self):
+        stock = TechnicianStock.objects.get(technician=self.user)
+        self.assertEqual(stock.sheet_technician_name, 'amal')
 
 class CourierTestCase(TestCase):
     def setUp(self):
         self.user = User.objects.create_user('admin', 'admin@test.com', 'password')
-        self.stock = Stock.objects.create(
-            spare_id='SKU001',
-            spare_name='Item 1',
-            brand_name='Brand A',
-            mrp=500,
-            quantity_available=100
-        )
+        self.technician = User.objects.create_user('amal', 'amal@test.com', 'password')
 
     def test_courier_creation(self):
-        courier = Courier.objects.create(
+        courier = CourierTransaction.objects.create(
             courier_id='CUR-20251213-TEST',
             created_by=self.user,
-            status='CREATED'
+            items=[{'spare_id': 'SKU001', 'name': 'Item 1', 'qty': 5}],
         )
-        self.assertEqual(courier.status, 'CREATED')
+        courier.technicians.add(self.technician)
+        self.assertEqual(courier.status, 'in_transit')
+        self.assertEqual(list(courier.technicians.all()), [self.technician])
+
+class StockLedgerTestCase(TestCase):
+    def setUp(self):
+        StockBalance.objects.create(location=stock_ledger.COMPANY, spare_id='SKU001', name='Item 1', qty=10)
+
+    def balance(self, location, spare_id='SKU001'):
+        return StockBalance.objects.get(location=location, spare_id=spare_id).qty
+
+    def test_move_records_movement(self):
+        self.assertEqual(stock_ledger.move(stock_ledger.COMPANY, 'SKU001', -3, source='test'), 7)
+        movement = StockMovement.objects.get()
+        self.assertEqual((movement.quantity, movement.balance_after, movement.source), (-3, 7, 'test'))
+
+    def test_company_stock_never_goes_negative(self):
+        with self.assertRaisesMessage(InsufficientStock, 'Available: 10'):
+            stock_ledger.move(stock_ledger.COMPANY, 'SKU001', -11)
+        with self.assertRaisesMessage(InsufficientStock, 'not found'):
+            stock_ledger.move(stock_ledger.COMPANY, 'SKU999', -1)
+        self.assertEqual(self.balance(stock_ledger.COMPANY), 10)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_transfer_creates_technician_balance(self):
+        self.assertEqual(stock_ledger.transfer('SKU001', 4, 'Amal', source='courier:C1'), 4)
+        location = stock_ledger.technician_location('Amal')
+        self.assertEqual(self.balance(stock_ledger.COMPANY), 6)
+        self.assertEqual(self.balance(location), 4)
+        technician = StockBalance.objects.get(location=location)
+        self.assertEqual((technician.name, technician.holder), ('Item 1', 'Amal'))
+        self.assertEqual(stock_ledger.quantities(location), {'SKU001': 4})
+
+    def test_refused_transfer_moves_nothing(self):
+        with self.assertRaises(InsufficientStock):
+            stock_ledger.transfer('SKU001', 11, 'amal')
+        self.assertEqual(self.balance(stock_ledger.COMPANY), 10)
+        self.assertFalse(StockBalance.objects.filter(location=stock_ledger.technician_location('amal')).exists())
+
+class MergeRangesTestCase(TestCase):
+    def test_adjacent_cells_of_a_row_share_a_range(self):
+        cells = {(5, 12): 'CLOSED', (5, 13): 'admin', (5, 15): 'x', (2, 3): 7}
+        self.assertEqual(SheetWriteBatch._merge_ranges('Tracking', cells), [
+            {'range': "'Tracking'!C2", 'values': [[7]]},
+            {'range': "'Tracking'!L5:M5", 'values': [['CLOSED', 'admin']]},
+            {'range': "'Tracking'!O5", 'values': [['x']]},
+        ])
+
+    def test_same_column_on_other_rows_is_not_merged(self):
+        cells = {(3, 7): 1, (2, 7): 2}
+        self.assertEqual(
+            [r['range'] for r in SheetWriteBatch._merge_ranges('Mrp List', cells)],
+            ["'Mrp List'!G2", "'Mrp List'!G3"],
+        )
+
+@override_settings(SHEET_OUTBOX_FLUSH_ON_COMMIT=False)
+class CourierSyncTestCase(TestCase):
+    def setUp(self):
+        self.sheet = FakeSheetsHTTP({'S1': 10, 'S2': 5}, {('amal', 'S1'): 1})
+        patcher = mock.patch('courier_api.sheets_sync.get_sheets_client', return_value=mock.Mock(http_client=self.sheet))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.technicians = []
+        for username, sheet_name in (('amal', 'amal'), ('arun', 'arun k')):
+            user = User.objects.create_user(username, f'{username}@test.com', 'password')
+            TechnicianStock.objects.create(technician=user, sheet_technician_name=sheet_name)
+            self.technicians.append(user.id)
+        self.items = [{'spare_id': 'S1', 'qty': 2}, {'spare_id': 'S2', 'qty': 1}, {'spare_id': 'S1', 'qty': 1}]
+
+    def test_fan_out_is_one_planned_batch(self):
+        report = SheetsSync().sync_courier_to_sheets(self.items, self.technicians, source='courier:C1')
+        self.assertEqual(report[0], {
+            'spare_id': 'S1', 'requested': 6,
+            'technicians': [{'technician': 'amal', 'qty': 3}, {'technician': 'arun k', 'qty': 3}],
+        })
+        self.assertEqual(SheetMutation.objects.values('group').distinct().count(), 1)
+
+        self.assertEqual(flush_pending()['applied'], 6)
+        # One batchUpdate for the existing cells, one append for the new rows
+        self.assertEqual(self.sheet.write_calls, 2)
+        self.assertEqual((self.sheet.company('S1'), self.sheet.company('S2')), (4, 3))
+        self.assertEqual((self.sheet.technician('amal', 'S1'), self.sheet.technician('arun k', 'S2')), (4, 1))
+
+    def test_fan_out_the_company_cannot_cover_is_refused_whole(self):
+        SheetsSync().sync_courier_to_sheets(self.items + [{'spare_id': 'S2', 'qty': 2}], self.technicians)
+        self.assertEqual(flush_pending()['conflicts'], 6)
+        self.assertEqual((self.sheet.company('S1'), self.sheet.write_calls), (10, 0))
+
+class LedgerExportTestCase(TestCase):
+    def setUp(self):
+        self.sheet = FakeSheetsHTTP({'S1': 10}, {('amal', 'S1'): 1, ('manual', 'S2'): 7, ('amal', 'S3'): 4})
+        patcher = mock.patch('courier_api.sheets_sync.get_sheets_client', return_value=mock.Mock(http_client=self.sheet))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        StockBalance.objects.create(location=stock_ledger.COMPANY, spare_id='S1', name='Part S1', qty=8)
+        for holder, spare_id, qty in (('amal', 'S1', 3), ('amal', 'S3', 4), ('arun', 'S1', 2)):
+            StockBalance.objects.create(
+                location=stock_ledger.technician_location(holder), spare_id=spare_id,
+                name=f'Part {spare_id}', holder=holder, qty=qty,
+            )
+
+    def test_rows_not_in_the_ledger_stay_in_place(self):
+        with self.assertLogs('courier_api.stock_ledger', 'WARNING') as logs:
+            self.assertEqual(stock_ledger.export_to_sheets(SheetsSync(), force=True), 3)
+        self.assertIn('manual/S2 (row 3)', logs.output[0])
+        self.assertEqual(self.sheet.sheets['Technician Stocks'][1:], [
+            ['Part S1', 'S1', '3', 'amal'],
+            ['Part S2', 'S2', '7', 'manual'],
+            ['Part S3', 'S3', '4', 'amal'],
+            ['Part S1', 'S1', '2', 'arun'],
+        ])
+        self.assertEqual((self.sheet.company('S1'), self.sheet.write_calls), (8, 2))
@@ -5,12 +5,14 @@ import time
 import uuid
 import logging
 import traceback
+from operator import attrgetter
 from django.conf import settings
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
+from django.db import transaction
 from django.utils import timezone
 from django.http import JsonResponse
 from django.contrib.auth.models import User
@@ -22,9 +24,15 @@ from .serializers import (
     CourierTransactionSerializer, CourierCreateSerializer,
     CourierReceiveSerializer, TechnicianStockSerializer
 )
-from .sheets_sync import SheetsSync
+from .sheets_sync import SheetsSync, StockTransferError
+from .stock_ledger import InsufficientStock
+from .technician_names import technician_names
 from .pdf_generator import generate_courier_pdf
 from api.db_retry import database_retry
+from api.services.read_policy import sheets_breaker
+from api.services.complaint_follower import follower_status
+from api.services.sheet_outbox import outbox_stats
+from api.services.sheets_quota import sheets_quota
 
 logger = logging.getLogger(__name__)
 
@@ -63,21 +71,21 @@ def company_stock(request):
             original_count = len(stock_data)
             stock_data = [
                 s for s in stock_data
-                if search in s['name'].lower() or search in s['spare_id'].lower()
+                if search in s.name.lower() or search in s.spare_id.lower()
             ]
             logger.info(f"Search filter '{search}' reduced results from {original_count} to {len(stock_data)} items")
         
         # Sort
         reverse = request.query_params.get('order') == 'desc'
         if sort_by in ['name', 'qty', 'mrp', 'spare_id']:
-            stock_data = sorted(stock_data, key=lambda x: x.get(sort_by, ''), reverse=reverse)
+            stock_data = sorted(stock_data, key=attrgetter(sort_by), reverse=reverse)
             logger.info(f"Sorted by {sort_by} ({'desc' if reverse else 'asc'})")
         
         logger.info(f"Company stock request completed successfully - {len(stock_data)} items returned")
         return Response({
             'success': True,
             'count': len(stock_data),
-            'data': stock_data
+            'data': [s.as_dict() for s in stock_data]
         }, status=status.HTTP_200_OK)
     
     except Exception as e:
@@ -117,9 +125,6 @@ def create_courier(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Validate stock availability
-        company_stock = sheets_sync.get_company_stock()
-        
         # Calculate total qty needed (for all technicians)
         total_qty_needed = {}
         for item in items:
@@ -127,23 +132,21 @@ def create_courier(request):
             qty = item.get('qty')
             total_qty_needed[spare_id] = total_qty_needed.get(spare_id, 0) + (qty * len(technician_ids))
         
+        # Validate stock availability (stock ledger or cached company stock)
+        available = sheets_sync.company_quantities(total_qty_needed)
+        
         # Check stock availability
         for spare_id, total_qty in total_qty_needed.items():
-            stock_item = next(
-                (s for s in company_stock if s['spare_id'] == spare_id), 
-                None
-            )
-            
-            if not stock_item:
+            if spare_id not in available:
                 return Response(
                     {'error': f"Spare ID '{spare_id}' not found in company stock"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            if stock_item['qty'] < total_qty:
+            if available[spare_id] < total_qty:
                 return Response(
                     {
-                        'error': f"Insufficient stock for '{spare_id}'. Available: {stock_item['qty']}, Requested: {total_qty}"
+                        'error': f"Insufficient stock for '{spare_id}'. Available: {available[spare_id]}, Requested: {total_qty}"
                     },
                     status=status.HTTP_400_BAD_REQUEST
                 )
@@ -281,17 +284,17 @@ def my_stock(request):
     Supports search & sort
     """
     try:
-        # Get technician's stock metadata
-        tech_stock = TechnicianStock.objects.filter(technician=request.user).first()
+        # Get technician's sheet name (cached User/TechnicianStock mapping)
+        sheet_technician_name = technician_names().for_user(request.user.id)
         
-        if not tech_stock or not tech_stock.sheet_technician_name:
+        if not sheet_technician_name:
             return Response(
                 {'error': 'No stock data found for this technician'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         # Fetch from Google Sheets "Technician Stocks" tab
-        stock_data = sheets_sync.get_technician_stock(tech_stock.sheet_technician_name)
+        stock_data = sheets_sync.get_technician_stock(sheet_technician_name)
         
         # Apply filters
         search = request.query_params.get('search', '').lower()
@@ -300,18 +303,18 @@ def my_stock(request):
         if search:
             stock_data = [
                 s for s in stock_data
-                if search in s['name'].lower() or search in s['spare_id'].lower()
+                if search in s.name.lower() or search in s.spare_id.lower()
             ]
         
         # Sort
         reverse = request.query_params.get('order') == 'desc'
         if sort_by in ['name', 'qty', 'spare_id']:
-            stock_data = sorted(stock_data, key=lambda x: x.get(sort_by, ''), reverse=reverse)
+            stock_data = sorted(stock_data, key=attrgetter(sort_by), reverse=reverse)
         
         return Response({
             'success': True,
             'count': len(stock_data),
-            'data': stock_data
+            'data': [s.as_dict() for s in stock_data]
         }, status=status.HTTP_200_OK)
     
     except Exception as e:
@@ -418,36 +421,29 @@ def mark_received(request, courier_id):
                 )
         
         # Get technician's sheet name
-        tech_stock = TechnicianStock.objects.filter(technician=request.user).first()
-        if not tech_stock or not tech_stock.sheet_technician_name:
+        technician_name = technician_names().for_user(request.user.id)
+        if not technician_name:
             return Response(
                 {'error': 'Technician stock configuration not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        technician_name = tech_stock.sheet_technician_name
-        
-        # Update Google Sheets
+        # Refuse what the company stock visibly cannot cover (the ledger, or
+        # the cached sheet copy plus changes still queued). The outbox checks
+        # the sheet itself when it applies the transfer, and refuses it
+        # whole (CONFLICT) if it no longer fits - so a Google outage does not
+        # fail the receipt.
         try:
-            for rec_item in received_items:
-                spare_id = rec_item['spare_id']
-                qty = rec_item['qty']
-                
-                # Reduce company stock
-                sheets_sync.update_company_stock(spare_id, qty)
-                logger.info(f"Reduced company stock: {spare_id} by {qty}")
-                
-                # Add to technician stock
-                sheets_sync.update_technician_stock(technician_name, spare_id, qty)
-                logger.info(f"Added {qty} of {spare_id} to {technician_name}'s stock")
-        
-        except Exception as sheets_error:
-            logger.error(f"Sheets update failed: {sheets_error}")
+            shortfall = sheets_sync.find_company_shortfall(received_items)
+        except Exception as stock_error:
+            logger.warning(f"Company stock pre-check skipped for courier {courier.courier_id}: {stock_error}")
+            shortfall = None
+        if shortfall:
             return Response(
-                {'error': f"Failed to update stock: {str(sheets_error)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': f"Failed to update stock: {shortfall}"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        
+
         # Update items with received quantities
         received_qty_map = {item['spare_id']: item['qty'] for item in received_items}
         for item in courier.items:
@@ -459,10 +455,24 @@ def mark_received(request, courier_id):
         # Mark the items field as modified
         courier.items = courier.items
         
-        # Update courier status and save
-        courier.status = 'received'
-        courier.received_time = timezone.now()
-        courier.save()
+        # Courier status and the stock transfer commit together; the Google
+        # Sheets writes are applied from the outbox after the commit, all
+        # of them or none
+        try:
+            with transaction.atomic():
+                courier.status = 'received'
+                courier.received_time = timezone.now()
+                courier.save()
+
+                sheets_sync.sync_courier_to_sheets(
+                    received_items, [request.user.id], source=f"courier:{courier.courier_id}"
+                )
+                logger.info(f"Queued stock transfer of {len(received_items)} items to {technician_name}")
+        except (InsufficientStock, StockTransferError) as stock_error:
+            return Response(
+                {'error': f"Failed to update stock: {stock_error}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         serializer = CourierTransactionSerializer(courier)
         
@@ -809,7 +819,15 @@ def health(request):
         
         # Connection stats
         db_health_monitor.log_connection_stats()
-        
+
+        # Google connectivity probes are opt-in (?sheets=1) - they cost several round trips
+        if request.query_params.get('sheets') == '1':
+            health_data["google_sheets"] = sheets_sync.diagnose()
+        health_data["google_sheets_circuit"] = sheets_breaker.stats()
+        health_data["google_sheets_quota"] = sheets_quota.stats()
+        health_data["sheet_outbox"] = outbox_stats()
+        health_data["complaint_follower"] = follower_status()
+
         # Memory analysis (adjusted for 500MB Render free tier)
         if memory_mb > 250:  # 250MB warning threshold
             logger.warning(f"HIGH MEMORY USAGE: {memory_mb:.1f}MB")
@@ -29,6 +29,7 @@ const API_ENDPOINTS = {
   
   // Complaint Processing
   PROCESS_COMPLAINTS: '/complaints/process/',
+  PROCESSING_JOB: (id) => `/complaints/process/jobs/${id}/`,
   COMPLAINT_PROCESSING_STATUS: '/complaints/processing-status/',
   
   // Product Search
@@ -1,5 +1,5 @@
 // E:\study\techfix\techfix-app\src\screens\AdminDashboardScreen.js
-import React, { useState, useEffect, useContext } from 'react';
+import React, { useState, useEffect, useContext, useRef } from 'react';
 import {
   View,
   Text,
@@ -17,6 +17,14 @@ import API_ENDPOINTS from '../api/endpoints';
 import { AuthContext } from '../context/AuthContext';
 import { COLORS } from '../theme/colors';
 
+// Processing job polling: the interval doubles after a failed poll, and
+// the screen stops waiting after POLL_TIMEOUT_MS (the job keeps running)
+const POLL_INTERVAL_MS = 2000;
+const MAX_POLL_INTERVAL_MS = 30000;
+const POLL_TIMEOUT_MS = 10 * 60 * 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
 export default function AdminDashboardScreen({ navigation }) {
   const insets = useSafeAreaInsets();
   const [stats, setStats] = useState(null);
@@ -25,9 +33,13 @@ export default function AdminDashboardScreen({ navigation }) {
   const [processingComplaints, setProcessingComplaints] = useState(false);
   const { signOut, state } = useContext(AuthContext);
   const isSpareAdmin = state?.user?.username === 'SpareAdmin';
+  const mountedRef = useRef(true);
 
   useEffect(() => {
     fetchDashboardStats();
+    return () => {
+      mountedRef.current = false;
+    };
   }, []);
 
   const fetchDashboardStats = async () => {
@@ -75,22 +87,50 @@ export default function AdminDashboardScreen({ navigation }) {
                 technician_filter: null // Process all technicians
               });
 
-              const result = response.data;
+              // Processing runs as a background job - poll until it finishes
+              let result = response.data;
+              let delay = POLL_INTERVAL_MS;
+              const deadline = Date.now() + POLL_TIMEOUT_MS;
+              while (result.status === 'QUEUED' || result.status === 'RUNNING') {
+                if (Date.now() > deadline) {
+                  Alert.alert(
+                    'Still Running',
+                    `Processing is still running in the background (${result.progress_percent ?? 0}% done). ` +
+                      'Check back later before starting it again.'
+                  );
+                  return;
+                }
+                await sleep(delay);
+                if (!mountedRef.current) {
+                  return;
+                }
+                try {
+                  const jobResponse = await client.get(API_ENDPOINTS.PROCESSING_JOB(result.job_id));
+                  result = jobResponse.data;
+                  delay = POLL_INTERVAL_MS;
+                } catch (pollError) {
+                  // A missing job or a refused request will not get better
+                  if (pollError.response && pollError.response.status < 500 && pollError.response.status !== 429) {
+                    throw pollError;
+                  }
+                  delay = Math.min(delay * 2, MAX_POLL_INTERVAL_MS);
+                }
+              }
               
               if (result.success) {
                 let message = `Successfully processed ${result.processed_count} complaints.`;
                 
-                if (result.errors && result.errors.length > 0) {
-                  message += `\n\nErrors: ${result.errors.length} items failed.`;
+                if (result.error_count > 0) {
+                  message += `\n\nErrors: ${result.error_count} items failed.`;
                 }
 
-                if (result.stock_reductions && result.stock_reductions.length > 0) {
-                  message += `\n\nStock reduced for ${result.stock_reductions.length} items.`;
+                if (result.stock_reduced_count > 0) {
+                  message += `\n\nStock reduced for ${result.stock_reduced_count} items.`;
                 }
 
                 Alert.alert('Success', message);
               } else {
-                Alert.alert('Error', result.error || 'Failed to process complaints');
+                Alert.alert('Error', result.last_error || result.error || 'Failed to process complaints');
               }
             } catch (error) {
               console.error('Complaint processing error:', error);
@@ -99,7 +139,9 @@ export default function AdminDashboardScreen({ navigation }) {
                 error.response?.data?.error || 'Failed to process complaints. Please try again.'
               );
             } finally {
-              setProcessingComplaints(false);
+              if (mountedRef.current) {
+                setProcessingComplaints(false);
+              }
             }
           },
         },